@@ -0,0 +1,491 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+import base64
+import hashlib
+import json
+import uuid
+
+from app.config import settings
+from app.database import ReadSessionLocal, get_async_db, get_async_read_db, serialized_writes
+from app.metrics import count_downloaded
+from app.models.project import Branch, Commit, Project
+from app.responses import encoded_response
+from app.schemas.project import (
+    AncestryResponse, CommitDiffResponse, CommitGraphResponse, CommitPageResponse, CommitRangeResponse,
+    FileChange, ImpactedDocument, ImpactResponse, MergeBaseResponse, ProjectUpload, ReferenceListResponse,
+    SyncRequest, SyncResponse, UploadResponse
+)
+from app.services.ancestry import AncestryIndex
+from app.services.archive import ARCHIVE_FORMATS, commit_entries, stream_archive
+from app.services.commit_service import CommitService, MissingContentError
+from app.services.events import broadcaster
+from app.services.graph_layout import GraphLayout
+from app.services.jobs import JobQueue, notify_workers
+from app.services.previews import queue_previews
+from app.services.references import ReferenceIndex, scan_manifest_references
+from app.services.sync import SyncService
+from app.services.tree_store import TreeStore, normalize_path
+from app.services.verification import verify_manifest
+
+router = APIRouter()
+
+async def _project_exists(db: AsyncSession, project_id: uuid.UUID) -> bool:
+    return (await db.execute(select(Project.id).where(Project.id == project_id))).first() is not None
+
+async def _resolve_ref(db: AsyncSession, project_id: uuid.UUID, ref: str) -> Commit:
+    """Look up a commit by id, or the head commit of a branch by name"""
+    try:
+        commit_id = uuid.UUID(ref)
+    except ValueError:
+        query = select(Commit).join(Branch, Branch.head_commit_id == Commit.id).where(
+            Branch.project_id == project_id,
+            Branch.name == ref
+        )
+    else:
+        query = select(Commit).where(
+            Commit.id == commit_id,
+            Commit.project_id == project_id
+        )
+    commit = (await db.execute(query)).scalars().first()
+
+    if not commit:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Commit or branch '{ref}' not found"
+        )
+    return commit
+
+@router.post("/projects/{project_id}/commits", response_model=UploadResponse)
+async def create_commit(
+    project_id: uuid.UUID,
+    upload: ProjectUpload,
+    full_verify: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Record a commit from an uploaded manifest"""
+    try:
+        if not await _project_exists(db, project_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Project not found"
+            )
+
+        verification = None
+        if settings.verify_commits and not settings.verify_in_background:
+            # Hashing fans out to the process pool; wait for it off the event loop
+            verification = await run_in_threadpool(verify_manifest, upload.files, full_verify)
+            if verification["failed"]:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail={
+                        "message": f"{verification['failed']} file(s) failed verification",
+                        "verification": verification
+                    }
+                )
+
+        # Content stored without a reference scan (e.g. imported) is scanned once, here
+        await run_in_threadpool(scan_manifest_references, upload.files)
+
+        def record(session):
+            commit, files = CommitService(session).create_commit(project_id, upload)
+            # Queued in the commit's own transaction, so neither exists without the other
+            jobs = JobQueue(session)
+            payload = {"commit_id": str(commit.id)}
+            queued = [jobs.enqueue("index_commit", payload, idempotency_key=f"index_commit:{commit.id}")]
+            if settings.verify_commits and settings.verify_in_background:
+                queued.append(jobs.enqueue(
+                    "verify_commit", {**payload, "full": full_verify}, idempotency_key=f"verify_commit:{commit.id}"
+                ))
+            if settings.delta_storage_enabled and commit.parent_commit_id:
+                queued.append(jobs.enqueue("encode_deltas", payload, idempotency_key=f"encode_deltas:{commit.id}"))
+            queue_previews(session, [(f.content_hash, f.filename) for f in files])
+            return commit, files, [job.id for job in queued]
+
+        async with serialized_writes():
+            commit, files, job_ids = await db.run_sync(record)
+            await db.commit()
+        notify_workers()
+        broadcaster.notify()
+
+        return UploadResponse(
+            commit_id=commit.id,
+            message="Commit created successfully",
+            files_uploaded=len(files),
+            total_size=sum(f.file_size or 0 for f in files),
+            verification=verification,
+            job_ids=job_ids
+        )
+
+    except HTTPException:
+        raise
+    except MissingContentError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "missing": e.missing}
+        )
+    except ValueError as e:
+        # Manifest paths that cannot form a tree, or parents from another project
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating commit: {str(e)}"
+        )
+
+@router.get("/projects/{project_id}/graph", response_model=CommitGraphResponse)
+async def get_commit_graph(
+    project_id: uuid.UUID,
+    request: Request,
+    from_generation: Optional[int] = None,
+    to_generation: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Laid-out commit graph, optionally limited to a range of columns"""
+    try:
+        if not await _project_exists(db, project_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Project not found"
+            )
+
+        graph = await db.run_sync(
+            lambda session: GraphLayout(session).project_graph(project_id, from_generation, to_generation)
+        )
+        # Nodes come from the layout cache already shaped as GraphNode
+        return await encoded_response(request, graph)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error building commit graph: {str(e)}"
+        )
+
+@router.get("/projects/{project_id}/ancestry", response_model=AncestryResponse)
+async def check_ancestry(
+    project_id: uuid.UUID,
+    ancestor: str,
+    descendant: str,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Whether one commit or branch head is an ancestor of another"""
+    a = await _resolve_ref(db, project_id, ancestor)
+    d = await _resolve_ref(db, project_id, descendant)
+    is_ancestor = await db.run_sync(lambda session: AncestryIndex(session).is_ancestor(a, d))
+    return AncestryResponse(ancestor=a.id, descendant=d.id, is_ancestor=is_ancestor)
+
+@router.get("/projects/{project_id}/merge-base", response_model=MergeBaseResponse)
+async def get_merge_base(
+    project_id: uuid.UUID,
+    a: str,
+    b: str,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Best common ancestors of two commits or branches"""
+    first = await _resolve_ref(db, project_id, a)
+    second = await _resolve_ref(db, project_id, b)
+    merge_bases = await db.run_sync(lambda session: AncestryIndex(session).merge_bases(first, second))
+    return MergeBaseResponse(merge_bases=merge_bases)
+
+@router.get("/projects/{project_id}/compare", response_model=CommitRangeResponse)
+async def compare_commits(
+    project_id: uuid.UUID,
+    head: str,
+    base: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Commits reachable from ``head`` but not from ``base``, newest first"""
+    head_commit = await _resolve_ref(db, project_id, head)
+    base_commit = await _resolve_ref(db, project_id, base) if base else None
+
+    def page(session):
+        query = AncestryIndex(session).range_query(base_commit, head_commit)
+        return query.order_by(None).count(), query.offset(offset).limit(limit).all()
+
+    total, commits = await db.run_sync(page)
+    return CommitRangeResponse(
+        base=base_commit.id if base_commit else None,
+        head=head_commit.id,
+        total=total,
+        commits=commits
+    )
+
+@router.get("/projects/{project_id}/diff", response_model=CommitDiffResponse)
+async def diff_commits(
+    project_id: uuid.UUID,
+    base: str,
+    head: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Files added, deleted or modified between two commits or branches"""
+    base_commit = await _resolve_ref(db, project_id, base)
+    head_commit = await _resolve_ref(db, project_id, head)
+
+    def diff(session):
+        trees = TreeStore(session)
+        # Commits from before trees existed get theirs built once, here
+        return trees.diff(trees.ensure_tree(base_commit), trees.ensure_tree(head_commit))
+
+    try:
+        async with serialized_writes():
+            changes, compared = await db.run_sync(diff)
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error diffing commits: {str(e)}"
+        )
+
+    return CommitDiffResponse(
+        base=base_commit.id,
+        head=head_commit.id,
+        changes=[
+            FileChange(
+                path=change.path,
+                status=change.status,
+                old_file_id=change.old.file_id if change.old else None,
+                new_file_id=change.new.file_id if change.new else None,
+                old_hash=change.old.content_hash if change.old else None,
+                new_hash=change.new.content_hash if change.new else None
+            )
+            for change in changes
+        ],
+        trees_compared=compared
+    )
+
+@router.post("/projects/{project_id}/sync", response_model=SyncResponse)
+async def sync_working_folder(
+    project_id: uuid.UUID,
+    sync: SyncRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """What to change and download to check out ``want``.
+
+    ``have`` lists the commits whose files the client already has, such as
+    the one its working folder was last synced to. ``changes`` are relative
+    to the nearest of them (``base``); ``files`` are only the bodies none
+    of them hold.
+    """
+    want = await _resolve_ref(db, project_id, sync.want)
+    try:
+        async with serialized_writes():
+            manifest = await db.run_sync(lambda session: SyncService(session).negotiate(want, sync.have))
+            await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error negotiating sync: {str(e)}"
+        )
+    return await encoded_response(request, manifest)
+
+async def _reference_graph(db: AsyncSession, project_id: uuid.UUID, ref: str):
+    commit = await _resolve_ref(db, project_id, ref)
+    if commit.reference_graph_hash is None:
+        async with serialized_writes():
+            await db.run_sync(lambda session: ReferenceIndex(session).ensure_graph(commit))
+            await db.commit()
+    return commit
+
+@router.get("/projects/{project_id}/commits/{ref}/references", response_model=ReferenceListResponse)
+async def get_references(
+    project_id: uuid.UUID,
+    ref: str,
+    path: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Documents the given path uses directly"""
+    commit = await _reference_graph(db, project_id, ref)
+    path = normalize_path(path)
+    paths = await db.run_sync(lambda session: ReferenceIndex(session).uses(commit.reference_graph_hash, path))
+    return ReferenceListResponse(commit_id=commit.id, path=path, paths=paths)
+
+@router.get("/projects/{project_id}/commits/{ref}/where-used", response_model=ReferenceListResponse)
+async def get_where_used(
+    project_id: uuid.UUID,
+    ref: str,
+    path: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Assemblies and drawings that use the given path directly"""
+    commit = await _reference_graph(db, project_id, ref)
+    path = normalize_path(path)
+    paths = await db.run_sync(lambda session: ReferenceIndex(session).where_used(commit.reference_graph_hash, path))
+    return ReferenceListResponse(commit_id=commit.id, path=path, paths=paths)
+
+@router.get("/projects/{project_id}/commits/{ref}/impact", response_model=ImpactResponse)
+async def get_impact(
+    project_id: uuid.UUID,
+    ref: str,
+    path: str,
+    max_depth: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Everything that transitively uses the given path, nearest first"""
+    commit = await _reference_graph(db, project_id, ref)
+    path = normalize_path(path)
+    depths = await db.run_sync(
+        lambda session: ReferenceIndex(session).impact(commit.reference_graph_hash, path, max_depth)
+    )
+    return ImpactResponse(
+        commit_id=commit.id,
+        path=path,
+        impacted=[
+            ImpactedDocument(path=p, depth=d)
+            for p, d in sorted(depths.items(), key=lambda item: (item[1], item[0]))
+        ]
+    )
+
+@router.get("/projects/{project_id}/commits/{ref}/archive")
+async def download_commit_archive(
+    project_id: uuid.UUID,
+    ref: str,
+    format: str = "zip",
+    level: int = Query(6, ge=0, le=9),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Stream the commit's whole file tree as a zip, tar or tar.gz archive"""
+    if format not in ARCHIVE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported archive format '{format}', expected one of: {', '.join(ARCHIVE_FORMATS)}"
+        )
+    commit = await _resolve_ref(db, project_id, ref)
+    filename = f"{commit.branch_name}-{str(commit.id)[:8]}.{format}"
+
+    return StreamingResponse(
+        count_downloaded(_archive_stream(commit.id, format, level), "archive"),
+        media_type=ARCHIVE_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _archive_stream(commit_id: uuid.UUID, archive_format: str, level: int):
+    # A sync generator: Starlette iterates it in the threadpool, so reading
+    # and compressing never blocks the event loop
+    db = ReadSessionLocal()
+    try:
+        commit = db.get(Commit, commit_id)
+        mtime = commit.created_at.timestamp() if commit.created_at else None
+        yield from stream_archive(db, commit_entries(db, commit), archive_format, level, mtime)
+    finally:
+        db.close()
+
+# The fields of CommitResponse
+_COMMIT_COLUMNS = (
+    Commit.message, Commit.author, Commit.branch_name, Commit.id, Commit.project_id, Commit.parent_commit_id,
+    Commit.graph_x, Commit.graph_y, Commit.generation, Commit.tree_hash, Commit.created_at
+)
+
+def _encode_cursor(commit: Commit) -> str:
+    raw = json.dumps({"t": commit.created_at.isoformat(), "id": str(commit.id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/projects/{project_id}/commits", response_model=CommitPageResponse)
+async def list_commits(
+    project_id: uuid.UUID,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    branch: Optional[str] = None,
+    author: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Commit history, newest first, paginated by cursor"""
+    project = (await db.execute(
+        select(Project.commit_count, Project.last_commit_at, Project.created_at).where(Project.id == project_id)
+    )).first()
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    # History is append-only, so the project's commit rollup identifies the
+    # state of every page; unchanged polls are answered without the page query.
+    last_modified = project.last_commit_at or project.created_at
+    etag = 'W/"%s"' % hashlib.sha1(
+        f"{project_id}:{project.commit_count}:{last_modified}:{request.url.query}".encode()
+    ).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Plain rows rather than Commit objects: the page is encoded straight
+    # from them, without building ORM instances or Pydantic models
+    query = select(*_COMMIT_COLUMNS).where(Commit.project_id == project_id)
+    if branch:
+        query = query.where(Commit.branch_name == branch)
+    if author:
+        query = query.where(Commit.author == author)
+    if since:
+        query = query.where(Commit.created_at >= since)
+    if until:
+        query = query.where(Commit.created_at < until)
+    if cursor:
+        after_time, after_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Commit.created_at < after_time,
+            and_(Commit.created_at == after_time, Commit.id < after_id)
+        ))
+
+    commits = (await db.execute(
+        query.order_by(Commit.created_at.desc(), Commit.id.desc()).limit(limit + 1)
+    )).all()
+    next_cursor = _encode_cursor(commits[limit - 1]) if len(commits) > limit else None
+
+    return await encoded_response(request, {
+        "commits": [dict(row._mapping) for row in commits[:limit]],
+        "next_cursor": next_cursor,
+        "limit": limit,
+    }, headers=headers)
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have second resolution
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Optional
+import uuid
+
+from app.database import AsyncReadSessionLocal
+from app.models.project import Project
+from app.services.events import event_stream
+
+router = APIRouter()
+
+_STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Stop nginx from buffering the stream
+}
+
+def _resume_from(header: Optional[str], query: Optional[int]) -> Optional[int]:
+    """Where to resume: EventSource sends Last-Event-ID itself on reconnect"""
+    if header:
+        try:
+            return int(header)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Last-Event-ID must be an event id"
+            )
+    return query
+
+def _stream(project_id: Optional[uuid.UUID], after: Optional[int]) -> StreamingResponse:
+    return StreamingResponse(
+        event_stream(project_id, after),
+        media_type="text/event-stream",
+        headers=_STREAM_HEADERS
+    )
+
+@router.get("/projects/{project_id}/events")
+async def project_events(
+    project_id: uuid.UUID,
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events for one project: commit.created, branch.created,
+    branch.updated and project.deleted.
+
+    Pass the id of the last event seen (``Last-Event-ID`` or
+    ``last_event_id``) to be sent what happened since; a ``reset`` event
+    means too much was missed and the client should reload.
+    """
+    # A short session of its own: the stream may stay open for hours
+    async with AsyncReadSessionLocal() as db:
+        exists = (await db.execute(select(Project.id).where(Project.id == project_id))).first()
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return _stream(project_id, _resume_from(last_event_id_header, last_event_id))
+
+@router.get("/events")
+async def all_events(
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events for every project, including project.created"""
+    return _stream(None, _resume_from(last_event_id_header, last_event_id))
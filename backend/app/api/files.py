@@ -0,0 +1,183 @@
+from typing import Optional, Tuple
+from urllib.parse import quote
+import os
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ReadSessionLocal, get_async_read_db
+from app.models.project import File, FilePreview
+from app.responses import SegmentResponse
+from app.services.previews import best_size, preview_path
+from app.services.storage import Segment, file_segments
+
+router = APIRouter()
+
+# A File's content never changes once stored, so its hash is a strong validator
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _etag(file: File) -> str:
+    return f'"{file.content_hash}"' if file.content_hash else f'"{file.id}"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return any(tag.strip() in ("*", etag) for tag in header.split(","))
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range from a Range header as ``[start, end)``.
+
+    Returns None when the header should be ignored (other units, several
+    ranges or bad syntax); raises 416 when the range lies past the end.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if start < 0 or (last and end <= start):
+                return None
+        else:
+            # Suffix range: the final N bytes; the final 0 bytes are not satisfiable
+            suffix = int(last)
+            if suffix < 0:
+                return None
+            start, end = (max(size - suffix, 0) if suffix else size), size
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size)
+
+def _resolve_segments(file_id: uuid.UUID, start: int, end: int):
+    # Delta reconstruction is CPU bound, so segments are resolved off the event loop
+    db = ReadSessionLocal()
+    try:
+        return file_segments(db, db.get(File, file_id), start, end)
+    finally:
+        db.close()
+
+async def _serve(file: Optional[File], request: Request) -> Response:
+    if file is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    size = file.file_size or 0
+    etag = _etag(file)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": _IMMUTABLE,
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file.filename)}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+
+    start, end = byte_range or (0, size)
+    try:
+        segments = await run_in_threadpool(_resolve_segments, file.id, start, end)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reading file content: {str(e)}"
+        )
+
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        return SegmentResponse(
+            segments,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            headers=headers,
+            media_type="application/octet-stream"
+        )
+    return SegmentResponse(segments, headers=headers, media_type="application/octet-stream")
+
+@router.api_route("/files/{file_id}/content", methods=["GET", "HEAD"])
+async def download_file(file_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """Stream a stored file, honouring Range and If-None-Match"""
+    return await _serve(await db.get(File, file_id), request)
+
+@router.api_route("/files/by-hash/{content_hash}/content", methods=["GET", "HEAD"])
+async def download_file_by_hash(content_hash: str, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """Stream a stored file addressed by its SHA256"""
+    file = (await db.execute(select(File).where(File.content_hash == content_hash))).scalars().first()
+    return await _serve(file, request)
+
+async def _serve_preview(db: AsyncSession, content_hash: Optional[str], size: int, request: Request) -> Response:
+    preview = await db.get(FilePreview, content_hash) if content_hash else None
+    if preview is None or preview.status in ("pending", "processing"):
+        # Extraction runs after the commit lands; ask the client to come back
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Preview not available yet" if preview else "Preview not found",
+            headers={"Retry-After": "5"} if preview else None
+        )
+    rendered = best_size(preview.sizes, size) if preview.status == "ready" else None
+    if rendered is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File has no preview"
+        )
+
+    # Previews are keyed by content, so they never change either
+    etag = f'"{content_hash}-{rendered}"'
+    headers = {"ETag": etag, "Cache-Control": _IMMUTABLE}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = preview_path(content_hash, rendered)
+    try:
+        length = await run_in_threadpool(os.path.getsize, path)
+    except OSError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Preview not found"
+        )
+    return SegmentResponse([Segment(path, 0, length)], headers=headers, media_type="image/png")
+
+@router.get("/files/{file_id}/preview")
+async def get_file_preview(
+    file_id: uuid.UUID,
+    request: Request,
+    size: int = Query(256, ge=1, le=4096),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Preview image of a stored file, at the smallest rendered size covering ``size``"""
+    file = await db.get(File, file_id)
+    if file is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    return await _serve_preview(db, file.content_hash, size, request)
+
+@router.get("/files/by-hash/{content_hash}/preview")
+async def get_preview_by_hash(
+    content_hash: str,
+    request: Request,
+    size: int = Query(256, ge=1, le=4096),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Preview image of the content with this SHA256"""
+    return await _serve_preview(db, content_hash, size, request)
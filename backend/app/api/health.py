@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter
+from sqlalchemy import text
 from datetime import datetime
+import asyncio
 import psutil
 import os
+import time
 
-from app.database import get_db
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import metrics_response
 
 router = APIRouter()
 
-@router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    """Health check endpoint for monitoring"""
+# Last health check and when it stops being served; probes inside the
+# window are answered from here without touching the database or psutil
+_health_cache = {"expires": 0.0, "result": None}
+_health_lock = asyncio.Lock()
+
+async def _check_health() -> dict:
     try:
         # Test database connection
-        db.execute("SELECT 1")
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
@@ -30,10 +38,27 @@ async def health_check(db: Session = Depends(get_db)):
         "system": {
             "memory_usage_percent": memory.percent,
             "disk_usage_percent": disk.percent,
-            "storage_path_exists": os.path.exists("app/storage")
+            "storage_path_exists": os.path.exists(settings.storage_path)
         }
     }
 
+@router.get("/health")
+async def health_check():
+    """Health check endpoint for monitoring, cached for ``health_cache_seconds``"""
+    if time.monotonic() < _health_cache["expires"]:
+        return _health_cache["result"]
+    async with _health_lock:
+        # Concurrent probes wait for one check instead of each running their own
+        if time.monotonic() >= _health_cache["expires"]:
+            _health_cache["result"] = await _check_health()
+            _health_cache["expires"] = time.monotonic() + settings.health_cache_seconds
+    return _health_cache["result"]
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics for requests, SQL, pools and transferred bytes"""
+    return metrics_response()
+
 @router.get("/info")
 async def api_info():
     """Basic API information"""
@@ -45,7 +70,9 @@ async def api_info():
             "projects": "/api/v1/projects",
             "commits": "/api/v1/commits",
             "files": "/api/v1/files",
+            "events": "/api/v1/events",
             "health": "/api/v1/health",
+            "metrics": "/api/v1/metrics",
             "docs": "/docs"
         }
     }
\ No newline at end of file
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from app.database import get_async_db, get_async_read_db, serialized_writes
+from app.models.project import Job
+from app.schemas.jobs import JobListResponse, JobResponse
+from app.services.jobs import HANDLERS, STATUSES, JobQueue, notify_workers
+
+router = APIRouter()
+
+async def _get_job(db: AsyncSession, job_id: int) -> Job:
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Background jobs, newest first, optionally of one status or kind"""
+    if status_filter is not None and status_filter not in STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown status '{status_filter}'"
+        )
+    if kind is not None and kind not in HANDLERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job kind '{kind}'"
+        )
+
+    def page(session):
+        query = session.query(Job)
+        if status_filter is not None:
+            query = query.filter(Job.status == status_filter)
+        if kind is not None:
+            query = query.filter(Job.kind == kind)
+        jobs = query.order_by(Job.id.desc()).offset(offset).limit(limit + 1).all()
+        return jobs, JobQueue(session).counts()
+
+    try:
+        jobs, counts = await db.run_sync(page)
+        return JobListResponse(
+            jobs=jobs[:limit],
+            counts=counts,
+            next_offset=offset + limit if len(jobs) > limit else None
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error listing jobs: {str(e)}"
+        )
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """Status, attempts and outcome of one background job"""
+    return await _get_job(db, job_id)
+
+@router.post("/jobs/{job_id}/retry", response_model=JobResponse)
+async def retry_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Queue a failed job again"""
+    job = await _get_job(db, job_id)
+    try:
+        async with serialized_writes():
+            job = await db.run_sync(lambda session: JobQueue(session).retry(job))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    notify_workers()
+    return job
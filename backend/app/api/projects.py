@@ -1,48 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from app.database import get_db
-from app.models.project import Project, Branch, Commit
+from app.database import get_async_db, get_async_read_db, serialized_writes
+from app.models.project import Project, Branch
+from app.responses import encoded_response
 from app.schemas.project import ProjectCreate, ProjectResponse, ProjectListResponse
+from app.services.events import EventLog, broadcaster
 from app.services.project_service import ProjectService
 
 router = APIRouter()
 
 @router.get("/projects", response_model=List[ProjectListResponse])
-async def get_projects(db: Session = Depends(get_db)):
+async def get_projects(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """Get all projects for the user"""
     try:
-        projects = db.query(Project).all()
-        
-        result = []
-        for project in projects:
-            # Get branch info
-            branches = db.query(Branch).filter(Branch.project_id == project.id).all()
-            
-            # Get commit count and last modified
-            commits = db.query(Commit).filter(Commit.project_id == project.id).all()
-            
-            # Get unique contributors
-            contributors = list(set([commit.author for commit in commits]))
-            
-            result.append(ProjectListResponse(
-                id=project.id,
-                name=project.name,
-                description=project.description,
-                lastModified=commits[-1].created_at if commits else project.created_at,
-                branches=[{
-                    "id": branch.id,
-                    "name": branch.name,
-                    "commitCount": len([c for c in commits if c.branch_name == branch.name]),
-                    "color": branch.color
-                } for branch in branches],
-                totalCommits=len(commits),
-                contributors=contributors
-            ))
-        
-        return result
+        projects = await db.run_sync(lambda session: ProjectService(session).list_projects())
+        # list_projects already returns ProjectListResponse's fields
+        return await encoded_response(request, projects)
     
     except Exception as e:
         raise HTTPException(
@@ -53,28 +30,31 @@ async def get_projects(db: Session = Depends(get_db)):
 @router.post("/projects", response_model=ProjectResponse)
 async def create_project(
     project_data: ProjectCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new project"""
     try:
-        # Create project
-        project = Project(
-            name=project_data.name,
-            description=project_data.description
-        )
-        db.add(project)
-        db.flush()  # Get the ID
-        
-        # Create main branch
-        main_branch = Branch(
-            name="main",
-            color="#3b82f6",
-            project_id=project.id
-        )
-        db.add(main_branch)
-        
-        db.commit()
-        db.refresh(project)
+        async with serialized_writes():
+            # Create project
+            project = Project(
+                name=project_data.name,
+                description=project_data.description
+            )
+            db.add(project)
+            await db.flush()  # Get the ID
+            
+            # Create main branch
+            main_branch = Branch(
+                name="main",
+                color="#3b82f6",
+                project_id=project.id
+            )
+            db.add(main_branch)
+            await db.run_sync(lambda session: EventLog(session).project_created(project, [main_branch]))
+            
+            await db.commit()
+        await db.refresh(project)
+        broadcaster.notify()
         
         return ProjectResponse(
             id=project.id,
@@ -84,23 +64,25 @@ async def create_project(
                 "id": main_branch.id,
                 "name": main_branch.name,
                 "commitCount": 0,
+                "contributorCount": 0,
+                "lastModified": None,
                 "color": main_branch.color
             }],
             created_at=project.created_at
         )
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating project: {str(e)}"
         )
 
 @router.get("/projects/{project_id}", response_model=ProjectResponse)
-async def get_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_project(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_read_db)):
     """Get a specific project by ID"""
     try:
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = await db.run_sync(lambda session: ProjectService(session).get_project(project_id))
         
         if not project:
             raise HTTPException(
@@ -108,22 +90,7 @@ async def get_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
                 detail="Project not found"
             )
         
-        # Get branches and commits
-        branches = db.query(Branch).filter(Branch.project_id == project.id).all()
-        commits = db.query(Commit).filter(Commit.project_id == project.id).all()
-        
-        return ProjectResponse(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            branches=[{
-                "id": branch.id,
-                "name": branch.name,
-                "commitCount": len([c for c in commits if c.branch_name == branch.name]),
-                "color": branch.color
-            } for branch in branches],
-            created_at=project.created_at
-        )
+        return ProjectResponse(**project)
     
     except HTTPException:
         raise
@@ -134,10 +101,12 @@ async def get_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
         )
 
 @router.delete("/projects/{project_id}")
-async def delete_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_project(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Delete a project and all its data"""
     try:
-        project = db.query(Project).filter(Project.id == project_id).first()
+        project = (await db.execute(
+            select(Project).where(Project.id == project_id)
+        )).scalar_one_or_none()
         
         if not project:
             raise HTTPException(
@@ -145,15 +114,18 @@ async def delete_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
                 detail="Project not found"
             )
         
-        db.delete(project)
-        db.commit()
+        async with serialized_writes():
+            await db.delete(project)
+            await db.run_sync(lambda session: EventLog(session).project_deleted(project_id))
+            await db.commit()
+        broadcaster.notify()
         
         return {"message": "Project deleted successfully"}
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting project: {str(e)}"
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import uuid
+
+from app.database import get_async_read_db
+from app.schemas.project import SearchBackfillResponse, SearchHitResponse, SearchResponse
+from app.services.search_index import SearchIndex, backfill_search_index
+
+router = APIRouter()
+
+@router.get("/search", response_model=SearchResponse)
+async def search_commits(
+    q: str = Query(..., min_length=1, max_length=500),
+    project_id: Optional[uuid.UUID] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Commits whose message, author or changed paths match ``q``, best first.
+
+    Words match as prefixes and must all occur; ``author:``, ``message:``
+    and ``path:`` limit a word to one field.
+    """
+    try:
+        hits = await db.run_sync(
+            lambda session: SearchIndex(session).search(q, project_id, limit + 1, offset)
+        )
+        return SearchResponse(
+            query=q,
+            results=[
+                SearchHitResponse(commit=hit.commit, rank=hit.rank, matched_paths=hit.matched_paths)
+                for hit in hits[:limit]
+            ],
+            next_offset=offset + limit if len(hits) > limit else None,
+            limit=limit
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching commits: {str(e)}"
+        )
+
+@router.post("/search/backfill", response_model=SearchBackfillResponse)
+async def backfill_search(limit: Optional[int] = Query(None, ge=1)):
+    """Index commits recorded before search was available"""
+    try:
+        return SearchBackfillResponse(indexed=await run_in_threadpool(backfill_search_index, limit))
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error indexing commits: {str(e)}"
+        )
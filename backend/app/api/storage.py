@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_read_db
+from app.schemas.storage import GarbageCollectionResponse, StorageStatsResponse
+from app.services.chunk_store import ChunkStore
+from app.services.gc import collect_garbage
+
+router = APIRouter()
+
+@router.get("/storage/stats", response_model=StorageStatsResponse)
+async def get_storage_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """Chunk store usage and deduplication savings"""
+    try:
+        stats = await db.run_sync(ChunkStore().dedup_stats)
+        return StorageStatsResponse(**stats)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error computing storage stats: {str(e)}"
+        )
+
+@router.post("/storage/gc", response_model=GarbageCollectionResponse)
+async def run_garbage_collection(dry_run: bool = False, scan_disk: bool = False):
+    """Remove files, chunks and trees no commit references any more.
+
+    Deletes in small batches, so uploads and commits continue meanwhile.
+    ``dry_run`` only reports; ``scan_disk`` also removes stray blobs on disk.
+    """
+    try:
+        report = await run_in_threadpool(collect_garbage, dry_run, scan_disk)
+        return GarbageCollectionResponse(**report)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error collecting garbage: {str(e)}"
+        )
@@ -0,0 +1,196 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+from typing import Optional, Union
+import uuid
+
+from app.database import get_async_db, get_async_read_db, serialized_writes
+from app.metrics import UPLOAD_BYTES
+from app.models.project import File, Job, Project, UploadSession
+from app.schemas.project import (
+    FileResponse, ProjectUpload, UploadNegotiateResponse,
+    UploadSessionCreate, UploadSessionResponse
+)
+from app.services.jobs import notify_workers
+from app.services.upload_service import (
+    UploadService, UploadError, UploadOffsetMismatch, UploadTooLarge, UploadHashMismatch,
+    ingest_job_key, receive_body
+)
+
+router = APIRouter()
+
+def _session_response(session, job_id: Optional[int] = None) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session.id,
+        status=session.status,
+        received_bytes=session.received_bytes,
+        expected_size=session.expected_size,
+        file_id=session.file_id,
+        job_id=job_id
+    )
+
+async def _get_session(db: AsyncSession, upload_id: uuid.UUID) -> UploadSession:
+    session = await db.get(UploadSession, upload_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return session
+
+async def _counted(body):
+    async for chunk in body:
+        UPLOAD_BYTES.inc(len(chunk))
+        yield chunk
+
+def _upload_error(e: UploadError) -> HTTPException:
+    if isinstance(e, UploadOffsetMismatch):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Upload-Offset": str(e.expected)}
+        )
+    if isinstance(e, UploadTooLarge):
+        return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    if isinstance(e, UploadHashMismatch):
+        return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.post("/projects/{project_id}/uploads/negotiate", response_model=UploadNegotiateResponse)
+async def negotiate_upload(
+    project_id: uuid.UUID,
+    upload: ProjectUpload,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Report which manifest files still need their bodies sent"""
+    missing, present = await db.run_sync(
+        lambda session: UploadService(session).negotiate(upload.files)
+    )
+    return UploadNegotiateResponse(missing=missing, present=present)
+
+@router.post("/projects/{project_id}/uploads", response_model=UploadSessionResponse)
+async def start_upload(
+    project_id: uuid.UUID,
+    upload: UploadSessionCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Open a resumable upload for one file body"""
+    if not (await db.execute(select(Project.id).where(Project.id == project_id))).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    try:
+        async with serialized_writes():
+            session, existing = await db.run_sync(lambda sync_db: UploadService(sync_db).start(
+                project_id,
+                upload.filename,
+                upload.file_path,
+                upload.file_size,
+                upload.content_hash,
+                upload.file_type,
+                upload.client_id
+            ))
+    except UploadError as e:
+        raise _upload_error(e)
+
+    if existing:
+        return UploadSessionResponse(
+            status="complete",
+            received_bytes=existing.file_size,
+            expected_size=existing.file_size,
+            file_id=existing.id
+        )
+    return _session_response(session)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(upload_id: uuid.UUID, db: AsyncSession = Depends(get_async_read_db)):
+    """Current confirmed offset of an upload, used to resume it"""
+    session = await _get_session(db, upload_id)
+    job_id = None
+    if session.status == "processing":
+        job_id = (await db.execute(
+            select(Job.id).where(Job.idempotency_key == ingest_job_key(session.id))
+        )).scalar()
+    return _session_response(session, job_id)
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def append_upload(
+    upload_id: uuid.UUID,
+    request: Request,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream body bytes into an upload starting at ``offset``"""
+    session = await _get_session(db, upload_id)
+
+    async def confirm(expected: int, position: int) -> bool:
+        # Conditional, so a request in another process writing the same
+        # upload is noticed instead of both moving the offset
+        async with serialized_writes():
+            result = await db.execute(
+                update(UploadSession)
+                .where(UploadSession.id == upload_id, UploadSession.received_bytes == expected)
+                .values(received_bytes=position)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            return False
+        session.received_bytes = position
+        return True
+
+    try:
+        await receive_body(session, offset, _counted(request.stream()), confirm)
+    except ClientDisconnect:
+        # Progress up to the disconnect is already confirmed
+        pass
+    except UploadError as e:
+        raise _upload_error(e)
+
+    return _session_response(session)
+
+@router.post("/uploads/{upload_id}/complete", response_model=Union[FileResponse, UploadSessionResponse])
+async def complete_upload(
+    upload_id: uuid.UUID,
+    response: Response,
+    wait: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Verify the received body and store it.
+
+    With ``wait=false`` the response is sent as soon as the body is known
+    to be on disk: 202 with the session, now ``processing``, and the id of
+    the job storing it. Poll the upload or the job for the File.
+    """
+    session = await _get_session(db, upload_id)
+
+    if session.status == "complete" and session.file_id:
+        return await db.get(File, session.file_id)
+
+    try:
+        if not wait or session.status == "processing":
+            async with serialized_writes():
+                job = await db.run_sync(lambda sync_db: UploadService(sync_db).defer(session))
+            notify_workers()
+            response.status_code = status.HTTP_202_ACCEPTED
+            return _session_response(session, job.id)
+
+        # Chunking is CPU and disk bound, keep it off the event loop
+        blob, references = await run_in_threadpool(UploadService(None).ingest, session)
+        async with serialized_writes():
+            return await db.run_sync(lambda sync_db: UploadService(sync_db).record(session, blob, references))
+    except UploadHashMismatch as e:
+        async with serialized_writes():
+            await db.run_sync(lambda sync_db: UploadService(sync_db).fail(session))
+        raise _upload_error(e)
+    except UploadError as e:
+        raise _upload_error(e)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error completing upload: {str(e)}"
+        )
@@ -0,0 +1,54 @@
+# app/application.py - The database-backed API
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.api import commits, events, files, health, jobs, projects, search, storage, uploads
+from app.config import settings
+from app.database import Base, engine
+from app.metrics import MetricsMiddleware
+from app.services.jobs import start_workers, stop_workers
+
+API_PREFIX = "/api/v1"
+
+
+def create_app() -> FastAPI:
+    """The API with every router mounted under ``/api/v1``
+
+    Serve with ``uvicorn app.application:app``. Tables missing from the
+    database are created and the job workers started at startup.
+    """
+    app = FastAPI(title=settings.api_title, version=settings.api_version)
+
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.allowed_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Request latency and status metrics
+    app.add_middleware(MetricsMiddleware)
+
+    for module in (health, projects, commits, uploads, files, storage, jobs, search, events):
+        app.include_router(module.router, prefix=API_PREFIX)
+
+    @app.on_event("startup")
+    def create_tables():
+        Base.metadata.create_all(engine)
+
+    @app.on_event("startup")
+    def start_job_workers():
+        # Jobs left by an earlier run are picked up without waiting for a new one
+        start_workers()
+
+    @app.on_event("shutdown")
+    def stop_job_workers():
+        # A job still running when this returns is requeued once its lease expires
+        stop_workers(timeout=settings.job_poll_seconds * 5)
+
+    return app
+
+
+app = create_app()
@@ -10,12 +10,97 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./solidworks_pdm.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30  # Seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # Seconds before a connection is replaced
+    db_pool_pre_ping: bool = True
+    db_statement_timeout_ms: int = 30000  # PostgreSQL only, 0 disables
+    
+    # SQLite production profile: WAL, serialized API writes and a read-only pool
+    sqlite_wal: bool = True  # False keeps SQLite's rollback journal and SQLAlchemy's default pools
+    sqlite_synchronous: str = "NORMAL"  # With WAL, NORMAL survives application crashes; FULL also power loss
+    sqlite_busy_timeout_ms: int = 5000  # Wait this long for another connection's write lock
+    sqlite_cache_size_kb: int = 64 * 1024  # Page cache per connection
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # Bytes of the database read through memory mapping
+    sqlite_read_pool_size: int = 8  # Read-only connections for read endpoints
     
     # File Storage
     storage_path: str = "./app/storage"
     max_file_size: int = 100 * 1024 * 1024  # 100MB per file
+    upload_confirm_interval: int = 8 * 1024 * 1024  # Persist resume offset every 8MB
     allowed_extensions: List[str] = [".sldprt", ".sldasm", ".slddrw", ".step", ".iges"]
     
+    # Content-defined chunking (bytes)
+    chunk_min_size: int = 16 * 1024
+    chunk_avg_size: int = 64 * 1024
+    chunk_max_size: int = 256 * 1024
+    
+    # Delta storage between successive versions of the same file_path
+    delta_storage_enabled: bool = False
+    delta_keyframe_interval: int = 16  # Store a full version after this many deltas
+    delta_min_savings: float = 0.5  # Keep a delta only if it saves at least this fraction
+    delta_block_size: int = 32
+    delta_index_blocks: int = 256 * 1024  # Base blocks indexed per encode; larger bases are sampled evenly
+    delta_cache_bytes: int = 256 * 1024 * 1024  # Recently rebuilt versions kept in memory
+    delta_cache_entry_bytes: int = 32 * 1024 * 1024  # Larger versions are rebuilt to disk instead
+    delta_spill_bytes: int = 4 * 1024 * 1024 * 1024  # Disk kept for those, least recently used removed first
+    
+    # Content verification before commits are recorded
+    verify_commits: bool = True
+    verify_in_background: bool = False  # Record first and verify in a job; failures flag files corrupt
+    hash_workers: int = 0  # Hashing processes, 0 uses one per CPU
+    
+    # Garbage collection of unreferenced files, chunks and trees
+    gc_grace_seconds: int = 24 * 60 * 60  # Never collect anything written or reused more recently
+    gc_batch_size: int = 500  # Rows deleted per transaction
+    upload_session_ttl_seconds: int = 7 * 24 * 60 * 60  # Pending uploads idle longer than this expire
+    
+    # Preview images extracted from uploaded documents
+    preview_extensions: List[str] = [".sldprt", ".sldasm", ".slddrw"]
+    preview_sizes: List[int] = [64, 256, 512]  # Longest side in pixels
+    
+    # Background jobs (verification, indexing, deltas, previews, deferred uploads)
+    job_workers: int = 2  # Worker threads per API process, 0 leaves jobs to `python -m app.services.jobs`
+    job_poll_seconds: float = 2.0  # Idle workers look for due jobs this often
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 5.0  # Backoff doubles from this after each failed attempt
+    job_retry_max_seconds: float = 60 * 60
+    job_lease_seconds: int = 5 * 60  # A running job not renewed for this long belongs to a dead worker
+    job_heartbeat_seconds: float = 60.0  # Running jobs renew their lease this often
+    job_retention_seconds: int = 7 * 24 * 60 * 60  # Finished jobs are kept this long
+    
+    # Live updates over Server-Sent Events
+    event_poll_seconds: float = 1.0  # How often each process looks for events written elsewhere
+    event_keepalive_seconds: float = 15.0  # Comment sent on idle streams so proxies keep them open
+    event_retry_ms: int = 3000  # Reconnect delay suggested to clients
+    event_replay_limit: int = 1000  # Missed events replayed on resume before asking for a reload
+    event_queue_size: int = 1000  # Events buffered for a slow subscriber before it is disconnected
+    event_retention_seconds: int = 7 * 24 * 60 * 60
+    
+    # Bulk vault import (python -m app.services.importer)
+    import_batch_size: int = 1000  # Revisions per transaction; an interrupted import resumes after the last one
+    import_workers: int = 0  # Processes hashing and chunking content, 0 uses one per CPU
+    
+    # Working folder sync (POST /projects/{id}/sync)
+    sync_max_haves: int = 32  # Held commits compared against the wanted one, nearest first
+    
+    # Encoded API responses (commit graph, history and project list)
+    response_compress_min_bytes: int = 1024  # Smaller bodies are sent uncompressed
+    response_gzip_level: int = 6
+    response_brotli_quality: int = 4  # 0-11; higher levels cost far more CPU for a few percent on JSON
+    
+    # Full-text search
+    search_max_paths: int = 10000  # Changed paths indexed per commit
+    
+    # Monitoring
+    health_cache_seconds: float = 5.0  # Health probes within this window reuse the last check
+    
+    # Prototype API (app/main.py) persistence
+    prototype_data_path: str = "./app/storage/prototype"
+    prototype_snapshot_every: int = 1000  # Journal records between snapshots
+    prototype_fsync: bool = True  # fsync each journal record before answering
+    
     # CORS
     allowed_origins: List[str] = [
         "http://localhost:3000",
@@ -1,9 +1,10 @@
 # app/main.py - Ultra Simple Version
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import json
-import os
-from datetime import datetime
+
+from app.config import settings
+from app.metrics import MetricsMiddleware, metrics_response
+from app.prototype_store import PrototypeStore
 
 app = FastAPI(title="SolidWorks PDM API", version="1.0.0")
 
@@ -16,8 +17,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Simple data storage
-projects_data = [
+# Request latency and status metrics
+app.add_middleware(MetricsMiddleware)
+
+# Sample data, stored on first start
+seed_projects = [
     {
         "id": "proj-1",
         "name": "Robotic Arm Assembly",
@@ -56,7 +60,7 @@ projects_data = [
     }
 ]
 
-commits_data = {
+seed_commits = {
     "proj-1": [
         {
             "id": "commit-1",
@@ -161,32 +165,53 @@ commits_data = {
     ]
 }
 
+# Journaled to disk; survives restarts
+store = PrototypeStore(
+    settings.prototype_data_path,
+    seed_projects,
+    seed_commits,
+    snapshot_every=settings.prototype_snapshot_every,
+    fsync=settings.prototype_fsync
+)
+
+@app.on_event("shutdown")
+def close_store():
+    # A final snapshot keeps the next startup from replaying the journal
+    store.close()
+
 @app.get("/")
 def root():
     return {"message": "SolidWorks PDM API", "status": "running"}
 
 @app.get("/api/v1/health")
 def health():
-    return {"status": "healthy", "projects": len(projects_data)}
+    return {"status": "healthy", "projects": len(store)}
+
+@app.get("/api/v1/metrics")
+def metrics():
+    return metrics_response()
 
 @app.get("/api/v1/projects")
 def get_projects():
-    return projects_data
+    return store.list_projects()
+
+@app.get("/api/v1/projects/{project_id}")
+def get_project(project_id: str):
+    project = store.get_project(project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
 
 @app.get("/api/v1/projects/{project_id}/commits")
 def get_commits(project_id: str):
-    return commits_data.get(project_id, [])
+    return store.list_commits(project_id)
 
 @app.post("/api/v1/projects")
 def create_project(project: dict):
-    new_project = {
-        "id": f"proj-{len(projects_data) + 1}",
-        "name": project.get("name", "New Project"),
-        "description": project.get("description", ""),
-        "lastModified": datetime.utcnow().isoformat(),
-        "branches": [{"id": "main", "name": "main", "commitCount": 0, "color": "#3b82f6"}],
-        "totalCommits": 0,
-        "contributors": []
-    }
-    projects_data.append(new_project)
-    return new_project
\ No newline at end of file
+    return store.create_project(project.get("name", "New Project"), project.get("description", ""))
+
+@app.delete("/api/v1/projects/{project_id}")
+def delete_project(project_id: str):
+    if not store.delete_project(project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"message": "Project deleted successfully"}
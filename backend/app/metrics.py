@@ -0,0 +1,191 @@
+"""Prometheus instrumentation for the API.
+
+``MetricsMiddleware`` times every request against its route template and
+counts responses by status. SQL statements are counted and timed through
+engine events and attributed to the request that issued them, including
+statements run from the threadpool or ``AsyncSession.run_sync``: both copy
+the request's context, so they share its ``RequestStats``. Pool gauges are
+read when the endpoint is scraped, so idle processes do no work for them.
+"""
+from contextvars import ContextVar
+from typing import Iterable, Iterator, List, Optional, Tuple
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+HTTP_REQUESTS = Counter(
+    "pdm_http_requests_total", "HTTP responses by route and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "pdm_http_request_duration_seconds", "Time until the last body byte was sent",
+    ["method", "route"], buckets=_LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge("pdm_http_requests_in_progress", "Requests being served")
+
+REQUEST_QUERIES = Histogram(
+    "pdm_db_queries_per_request", "SQL statements issued while serving one request",
+    ["route"], buckets=_QUERY_COUNT_BUCKETS
+)
+REQUEST_QUERY_TIME = Histogram(
+    "pdm_db_query_seconds_per_request", "Time spent in SQL while serving one request",
+    ["route"], buckets=_LATENCY_BUCKETS
+)
+DB_QUERIES = Counter("pdm_db_queries_total", "SQL statements executed", ["engine"])
+DB_QUERY_LATENCY = Histogram(
+    "pdm_db_query_duration_seconds", "SQL statement execution time", ["engine"], buckets=_LATENCY_BUCKETS
+)
+
+UPLOAD_BYTES = Counter("pdm_upload_bytes_total", "File body bytes received by uploads")
+DOWNLOAD_BYTES = Counter("pdm_download_bytes_total", "Content bytes sent", ["kind"])  # file, archive
+
+EVENT_SUBSCRIBERS = Gauge("pdm_event_subscribers", "Open live update streams")
+EVENTS_SENT = Counter("pdm_events_sent_total", "Live update events written to streams")
+
+JOB_RUNS = Counter("pdm_job_runs_total", "Background job attempts by outcome", ["kind", "outcome"])
+JOB_DURATION = Histogram(
+    "pdm_job_duration_seconds", "Background job attempt duration", ["kind"], buckets=_LATENCY_BUCKETS
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("pdm_request_stats", default=None)
+
+
+def _route_template(scope: Scope) -> str:
+    # The template, not the raw path, so ids do not create a series each
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return scope.get("root_path", "") + path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to their last byte"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+            route = _route_template(scope)
+            method = scope.get("method", "")
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_TIME.labels(route).observe(stats.query_seconds)
+
+
+# -- SQL accounting ------------------------------------------------------
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement ``engine`` (a sync Engine) executes"""
+    queries = DB_QUERIES.labels(name)
+    latency = DB_QUERY_LATENCY.labels(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("pdm_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["pdm_query_started"].pop()
+        elapsed = time.perf_counter() - started
+        queries.inc()
+        latency.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # The statement failed, so after_cursor_execute never runs
+        conn = context.connection
+        if conn is not None and conn.info.get("pdm_query_started"):
+            conn.info["pdm_query_started"].pop()
+
+
+class PoolCollector:
+    """Connection pool gauges, read from the pools at scrape time"""
+
+    def __init__(self, engines: Iterable[Tuple[str, object]]):
+        self.engines = list(engines)
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        families = {
+            "size": GaugeMetricFamily("pdm_db_pool_size", "Configured pool size", labels=["engine"]),
+            "checkedout": GaugeMetricFamily("pdm_db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "checkedin": GaugeMetricFamily("pdm_db_pool_checked_in", "Idle pooled connections", labels=["engine"]),
+            "overflow": GaugeMetricFamily("pdm_db_pool_overflow", "Connections beyond the pool size", labels=["engine"]),
+        }
+        for name, engine in self.engines:
+            pool = engine.pool
+            for attribute, family in families.items():
+                # Only QueuePool reports all of these; others are skipped
+                reader = getattr(pool, attribute, None)
+                if reader is not None:
+                    family.add_metric([name], reader())
+        yield from families.values()
+
+    def describe(self) -> List:
+        return []
+
+
+_pool_collector: Optional[PoolCollector] = None
+
+
+def register_pools(engines: Iterable[Tuple[str, object]]) -> None:
+    global _pool_collector
+    if _pool_collector is not None:
+        REGISTRY.unregister(_pool_collector)
+    _pool_collector = PoolCollector(engines)
+    REGISTRY.register(_pool_collector)
+
+
+# -- Byte counters -------------------------------------------------------
+
+def count_downloaded(pieces: Iterable[bytes], kind: str) -> Iterator[bytes]:
+    """Pass a response body through, counting what was sent"""
+    counter = DOWNLOAD_BYTES.labels(kind)
+    for piece in pieces:
+        yield piece
+        counter.inc(len(piece))
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,15 @@
-from sqlalchemy import Column, String, DateTime, Integer, Text, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, DDL, String, DateTime, Integer, Text, ForeignKey, JSON, Boolean, Index, UniqueConstraint, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 import uuid
 
 from app.database import Base
 
+def _utcnow():
+    return datetime.now(timezone.utc)
+
 class Project(Base):
     __tablename__ = "projects"
     
@@ -15,9 +19,18 @@ class Project(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Rollups maintained incrementally by ProjectService.record_commit
+    commit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    contributor_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_commit_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Relationships
     commits = relationship("Commit", back_populates="project", cascade="all, delete-orphan")
     branches = relationship("Branch", back_populates="project", cascade="all, delete-orphan")
+    chains = relationship("CommitChain", cascade="all, delete-orphan")
+    chain_links = relationship("ChainLink", cascade="all, delete-orphan")
+    contributors = relationship("Contributor", back_populates="project", cascade="all, delete-orphan")
+    imports = relationship("VaultImport", cascade="all, delete-orphan")
 
 class Branch(Base):
     __tablename__ = "branches"
@@ -27,11 +40,21 @@ class Branch(Base):
     color = Column(String, default="#3b82f6")  # Hex color for UI
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"))
     head_commit_id = Column(UUID(as_uuid=True), ForeignKey("commits.id"), nullable=True)
+    graph_lane = Column(Integer, nullable=True)  # Row of the commit graph, assigned on first commit
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Rollups maintained incrementally by ProjectService.record_commit
+    commit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    contributor_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_commit_at = Column(DateTime(timezone=True), nullable=True)
+    
     # Relationships
     project = relationship("Project", back_populates="branches")
     head_commit = relationship("Commit", foreign_keys=[head_commit_id])
+    
+    __table_args__ = (
+        Index("ix_branches_project_name", "project_id", "name"),
+    )
 
 class Commit(Base):
     __tablename__ = "commits"
@@ -43,16 +66,85 @@ class Commit(Base):
     branch_name = Column(String, nullable=False)
     parent_commit_id = Column(UUID(as_uuid=True), ForeignKey("commits.id"), nullable=True)
     
-    # Git-like graph positioning for frontend
+    # Git-like graph positioning for frontend, computed by GraphLayout
     graph_x = Column(Integer, default=0)
     graph_y = Column(Integer, default=0)
+    generation = Column(Integer, nullable=False, default=0, server_default="0")  # Longest path from a root
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Ancestry index: position along a first-parent chain, see AncestryIndex
+    chain_id = Column(Integer, ForeignKey("commit_chains.id"), nullable=True)
+    chain_pos = Column(Integer, nullable=True)
+    
+    # Root of the commit's file tree, see TreeStore; NULL for commits only described by CommitFile rows
+    tree_hash = Column(String, ForeignKey("trees.hash"), nullable=True)
+    # Who-uses-what between the commit's documents, see ReferenceIndex
+    reference_graph_hash = Column(String, ForeignKey("reference_graphs.hash"), nullable=True)
+    
+    # Set client side so every row carries the same microsecond precision,
+    # which keyset pagination on (created_at, id) relies on
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now())
     
     # Relationships
     project = relationship("Project", back_populates="commits")
     parent_commit = relationship("Commit", remote_side=[id])
+    parents = relationship("CommitParent", foreign_keys="CommitParent.commit_id",
+                           cascade="all, delete-orphan", order_by="CommitParent.position")
     files = relationship("CommitFile", back_populates="commit", cascade="all, delete-orphan")
+    search_document = relationship("CommitSearch", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Keyset pagination: newest first within a project, optionally per branch or author
+        Index("ix_commits_project_created", "project_id", "created_at", "id"),
+        Index("ix_commits_project_branch", "project_id", "branch_name", "created_at", "id"),
+        Index("ix_commits_project_author", "project_id", "author", "created_at", "id"),
+        Index("ix_commits_chain_pos", "chain_id", "chain_pos", unique=True),
+    )
+
+class CommitParent(Base):
+    """Every parent of a commit; position 0 is the first parent, later ones are merged in"""
+    __tablename__ = "commit_parents"
+    
+    commit_id = Column(UUID(as_uuid=True), ForeignKey("commits.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    parent_id = Column(UUID(as_uuid=True), ForeignKey("commits.id"), nullable=False, index=True)
+
+class CommitChain(Base):
+    """A run of commits where each one's first parent is the previous one"""
+    __tablename__ = "commit_chains"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
+    length = Column(Integer, nullable=False, default=0)
+
+class ChainLink(Base):
+    """Edge from a chain position to a parent on another chain (branch point or merge)"""
+    __tablename__ = "chain_links"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
+    chain_id = Column(Integer, ForeignKey("commit_chains.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    parent_chain_id = Column(Integer, ForeignKey("commit_chains.id"), nullable=False)
+    parent_position = Column(Integer, nullable=False)
+
+class Contributor(Base):
+    """Distinct authors per project branch, kept alongside the Project/Branch rollups"""
+    __tablename__ = "project_contributors"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    branch_name = Column(String, nullable=False)
+    author = Column(String, nullable=False)
+    commit_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_commit_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Relationships
+    project = relationship("Project", back_populates="contributors")
+    
+    __table_args__ = (
+        UniqueConstraint("project_id", "branch_name", "author", name="uq_contributor_branch_author"),
+        Index("ix_contributors_project_author", "project_id", "author"),
+    )
 
 class File(Base):
     __tablename__ = "files"
@@ -64,10 +156,17 @@ class File(Base):
     file_type = Column(String)  # .SLDPRT, .SLDASM, .SLDDRW
     content_hash = Column(String, unique=True)  # SHA256 for deduplication
     storage_path = Column(String, nullable=False)  # Where file is stored on disk
+    verified_at = Column(DateTime(timezone=True))  # Last time stored content matched content_hash
+    is_corrupt = Column(Boolean, default=False, nullable=False)
+    references_scanned = Column(Boolean, default=False, nullable=False)  # FileReference rows are complete
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     commit_files = relationship("CommitFile", back_populates="file")
+    chunks = relationship("FileChunk", back_populates="file", cascade="all, delete-orphan",
+                          order_by="FileChunk.sequence")
+    delta = relationship("FileDelta", back_populates="file", uselist=False, cascade="all, delete-orphan",
+                         foreign_keys="FileDelta.file_id")
 
 class CommitFile(Base):
     """Junction table linking commits to files"""
@@ -81,4 +180,254 @@ class CommitFile(Base):
     
     # Relationships
     commit = relationship("Commit", back_populates="files")
-    file = relationship("File", back_populates="commit_files")
\ No newline at end of file
+    file = relationship("File", back_populates="commit_files")
+
+class Tree(Base):
+    """Content-addressed directory listing, shared by every commit that contains it"""
+    __tablename__ = "trees"
+    
+    hash = Column(String, primary_key=True)  # SHA256 of the canonical entry list
+    entry_count = Column(Integer, nullable=False)
+    touched_at = Column(DateTime(timezone=True), default=_utcnow)  # Last written or reused, guards against GC
+    
+    # Relationships
+    entries = relationship("TreeEntry", cascade="all, delete-orphan", order_by="TreeEntry.name")
+
+class TreeEntry(Base):
+    """One name in a Tree: a subdirectory (another Tree) or a stored File"""
+    __tablename__ = "tree_entries"
+    
+    tree_hash = Column(String, ForeignKey("trees.hash"), primary_key=True)
+    name = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)  # tree, blob
+    object_hash = Column(String, nullable=False)  # Child Tree.hash, or File.content_hash
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), nullable=True, index=True)
+    is_main_assembly = Column(Boolean, nullable=False, default=False)
+
+class FileReference(Base):
+    """Another document named inside a stored File's content (assembly component, drawing view)"""
+    __tablename__ = "file_references"
+    
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), primary_key=True)
+    ref_name = Column(String, primary_key=True)  # Lowercased file name, e.g. bracket.sldprt
+
+class ReferenceGraph(Base):
+    """Content-addressed set of reference edges, shared by commits with the same structure"""
+    __tablename__ = "reference_graphs"
+    
+    hash = Column(String, primary_key=True)  # SHA256 of the sorted edge list
+    edge_count = Column(Integer, nullable=False)
+    touched_at = Column(DateTime(timezone=True), default=_utcnow)  # Last written or reused, guards against GC
+
+class ReferenceEdge(Base):
+    """source_path uses target_path, both paths within the commit's tree"""
+    __tablename__ = "reference_edges"
+    
+    graph_hash = Column(String, ForeignKey("reference_graphs.hash"), primary_key=True)
+    source_path = Column(String, primary_key=True)
+    target_path = Column(String, primary_key=True)
+    
+    __table_args__ = (
+        # Where-used: every document referencing a given path
+        Index("ix_reference_edges_target", "graph_hash", "target_path"),
+    )
+
+class Chunk(Base):
+    """Content-defined chunk stored once on disk, shared by every file containing it"""
+    __tablename__ = "chunks"
+    
+    hash = Column(String, primary_key=True)  # SHA256 of the chunk bytes
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class FileChunk(Base):
+    """Ordered chunk list making up a chunked File"""
+    __tablename__ = "file_chunks"
+    
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), primary_key=True)
+    sequence = Column(Integer, primary_key=True)
+    chunk_hash = Column(String, ForeignKey("chunks.hash"), nullable=False, index=True)
+    offset = Column(Integer, nullable=False)  # Byte offset of the chunk within the file
+    
+    # Relationships
+    file = relationship("File", back_populates="chunks")
+    chunk = relationship("Chunk")
+
+class FileDelta(Base):
+    """File stored as a binary delta against an earlier version of the same path"""
+    __tablename__ = "file_deltas"
+    
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), primary_key=True)
+    base_file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), nullable=False, index=True)
+    depth = Column(Integer, nullable=False)  # Deltas between this file and its keyframe
+    delta_hash = Column(String, nullable=False)  # SHA256 of the stored delta blob
+    delta_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    file = relationship("File", back_populates="delta", foreign_keys=[file_id])
+    base_file = relationship("File", foreign_keys=[base_file_id])
+
+class UploadSession(Base):
+    """Resumable upload of one file body, confirmed up to received_bytes"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=True)
+    filename = Column(String, nullable=False)
+    file_path = Column(String, nullable=False)
+    file_type = Column(String)
+    expected_size = Column(Integer, nullable=False)
+    expected_hash = Column(String, nullable=True, index=True)  # SHA256 announced by the client
+    client_id = Column(String, nullable=True)  # Opaque id of the client that opened the session
+    received_bytes = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="pending")  # pending, complete, failed, expired
+    file_id = Column(UUID(as_uuid=True), ForeignKey("files.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Relationships
+    file = relationship("File")
+
+class FilePreview(Base):
+    """Embedded preview image of some content, extracted once per content hash"""
+    __tablename__ = "file_previews"
+    
+    content_hash = Column(String, primary_key=True)  # File.content_hash the preview was taken from
+    status = Column(String, nullable=False, default="pending")  # pending, ready, none, failed
+    sizes = Column(JSON, nullable=True)  # Pixel sizes rendered, e.g. [64, 256, 512]
+    width = Column(Integer, nullable=True)  # Of the embedded image
+    height = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
+
+class CommitSearch(Base):
+    """Searchable text of one commit, written once when the commit is recorded.
+
+    The full-text index over it is dialect specific and created with the
+    table: an external-content FTS5 table kept in sync by triggers on
+    SQLite, a generated tsvector column with a GIN index on PostgreSQL.
+    """
+    __tablename__ = "commit_search"
+    
+    # Integer key: FTS5 addresses content rows by a rowid that must never change
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    commit_id = Column(UUID(as_uuid=True), ForeignKey("commits.id"), nullable=False, unique=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
+    message = Column(Text, nullable=False)
+    author = Column(String, nullable=False)
+    paths = Column(Text, nullable=False, default="")  # Paths the commit added, changed or deleted, one per line
+    filenames = Column(Text, nullable=False, default="")  # Original names of those files
+
+_FTS_COLUMNS = "message, author, paths, filenames"
+
+for statement in (
+    f"""CREATE VIRTUAL TABLE commit_search_fts USING fts5(
+        {_FTS_COLUMNS}, content='commit_search', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER commit_search_ai AFTER INSERT ON commit_search BEGIN
+        INSERT INTO commit_search_fts(rowid, {_FTS_COLUMNS})
+        VALUES (new.id, new.message, new.author, new.paths, new.filenames);
+    END""",
+    f"""CREATE TRIGGER commit_search_ad AFTER DELETE ON commit_search BEGIN
+        INSERT INTO commit_search_fts(commit_search_fts, rowid, {_FTS_COLUMNS})
+        VALUES ('delete', old.id, old.message, old.author, old.paths, old.filenames);
+    END""",
+    f"""CREATE TRIGGER commit_search_au AFTER UPDATE ON commit_search BEGIN
+        INSERT INTO commit_search_fts(commit_search_fts, rowid, {_FTS_COLUMNS})
+        VALUES ('delete', old.id, old.message, old.author, old.paths, old.filenames);
+        INSERT INTO commit_search_fts(rowid, {_FTS_COLUMNS})
+        VALUES (new.id, new.message, new.author, new.paths, new.filenames);
+    END""",
+):
+    event.listen(CommitSearch.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(
+    CommitSearch.__table__, "before_drop", DDL("DROP TABLE IF EXISTS commit_search_fts").execute_if(dialect="sqlite")
+)
+
+# Weights match SearchIndex's field prefixes: A message, B author, C paths and file names.
+# Path separators become spaces so each directory and name part is its own lexeme.
+for statement in (
+    """ALTER TABLE commit_search ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', message), 'A') ||
+        setweight(to_tsvector('simple', author), 'B') ||
+        setweight(to_tsvector('simple', regexp_replace(paths || ' ' || filenames, '[^[:alnum:]]+', ' ', 'g')), 'C')
+    ) STORED""",
+    "CREATE INDEX ix_commit_search_document ON commit_search USING GIN (document)",
+):
+    event.listen(CommitSearch.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+class Job(Base):
+    """Unit of background work, persisted so it survives restarts.
+
+    Workers claim queued jobs whose ``run_after`` has passed, highest
+    priority first. A job with an ``idempotency_key`` is enqueued at most
+    once however often it is requested.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # The claim query: queued jobs by priority and due time
+        Index("ix_jobs_claim", "status", "priority", "run_after"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False, index=True)  # Handler name, see app.services.jobs.HANDLERS
+    payload = Column(JSON, nullable=False, default=dict)  # Keyword arguments for the handler
+    idempotency_key = Column(String, nullable=True, unique=True)
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime(timezone=True), nullable=False, default=_utcnow)
+    locked_by = Column(String, nullable=True)  # Worker running it
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    result = Column(JSON, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class ProjectEvent(Base):
+    """Something that changed in a project, in the order it was committed.
+
+    Written in the transaction that made the change; the id doubles as the
+    Server-Sent Events id clients resume from. No foreign key, so the
+    deletion of a project can itself be an event.
+    """
+    __tablename__ = "project_events"
+    __table_args__ = (
+        Index("ix_project_events_project", "project_id", "id"),
+        # Never reuse ids on SQLite, even after the newest events are trimmed
+        {"sqlite_autoincrement": True},
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(UUID(as_uuid=True), nullable=False)
+    type = Column(String, nullable=False)  # commit.created, branch.updated, project.created, ...
+    data = Column(JSON, nullable=False, default=dict)
+    created_at = Column(DateTime(timezone=True), default=_utcnow, index=True)
+
+class VaultImport(Base):
+    """A vault imported by ``python -m app.services.importer``, and how far it got"""
+    __tablename__ = "vault_imports"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String, nullable=False, unique=True)  # e.g. git:/srv/vaults/arm
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    status = Column(String, nullable=False, default="running")  # running, complete
+    revisions = Column(Integer, nullable=False, default=0)  # Imported so far
+    created_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), default=_utcnow, onupdate=_utcnow)
+    
+    # Relationships
+    imported = relationship("ImportedRevision", cascade="all, delete-orphan")
+
+class ImportedRevision(Base):
+    """Commit recorded for one source revision; written in the batch that recorded it"""
+    __tablename__ = "imported_revisions"
+    
+    import_id = Column(Integer, ForeignKey("vault_imports.id"), primary_key=True)
+    revision = Column(String, primary_key=True)  # Git commit id, or revision directory name
+    # Not a foreign key: the commit goes when its project is deleted, before this row does
+    commit_id = Column(UUID(as_uuid=True), nullable=False)
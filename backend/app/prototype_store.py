@@ -0,0 +1,223 @@
+"""Persistent store behind the prototype API in ``app/main.py``.
+
+Projects and their commits live in dicts keyed by id, so lookups and
+deletes are O(1) and the project list keeps creation order. Every change
+is appended to a journal as one JSON line and fsynced before the call
+returns. Every ``snapshot_every`` changes the whole state is written to
+a snapshot (atomically, via rename) and the journal starts over, so
+startup loads the snapshot and replays only what was journaled after it.
+
+Journal records carry a sequence number and the snapshot records the
+last one it includes: a crash between writing a snapshot and truncating
+the journal replays nothing twice. A torn final line, from a crash in
+the middle of an append, is discarded.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import copy
+import json
+import os
+import threading
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.log"
+
+
+class PrototypeStore:
+    def __init__(
+        self,
+        path: str,
+        seed_projects: Optional[List[dict]] = None,
+        seed_commits: Optional[Dict[str, List[dict]]] = None,
+        snapshot_every: int = 1000,
+        fsync: bool = True
+    ):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.projects: Dict[str, dict] = {}
+        self.commits: Dict[str, Dict[str, dict]] = {}
+        self.next_id = 1
+        self.seq = 0
+        self.journaled = 0  # Records in the journal since the last snapshot
+        self.journal = None
+
+        os.makedirs(path, exist_ok=True)
+        if not self._load():
+            # First start: the seed data becomes the first snapshot
+            for project in seed_projects or []:
+                self._apply({"op": "put_project", "project": project})
+            for project_id, commits in (seed_commits or {}).items():
+                for commit in commits:
+                    self._apply({"op": "put_commit", "project_id": project_id, "commit": commit})
+            self.snapshot()
+        self.journal = open(self._file(JOURNAL_FILE), "ab")
+
+    # -- Reads -----------------------------------------------------------
+
+    def list_projects(self) -> List[dict]:
+        with self.lock:
+            return list(self.projects.values())
+
+    def get_project(self, project_id: str) -> Optional[dict]:
+        return self.projects.get(project_id)
+
+    def list_commits(self, project_id: str) -> List[dict]:
+        with self.lock:
+            return list(self.commits.get(project_id, {}).values())
+
+    def __len__(self) -> int:
+        return len(self.projects)
+
+    # -- Writes ----------------------------------------------------------
+
+    def create_project(self, name: str, description: str = "") -> dict:
+        """Add a project under a newly allocated id, never reused even after deletes"""
+        with self.lock:
+            project = {
+                "id": f"proj-{self.next_id}",
+                "name": name,
+                "description": description,
+                "lastModified": datetime.now(timezone.utc).isoformat(),
+                "branches": [{"id": "main", "name": "main", "commitCount": 0, "color": "#3b82f6"}],
+                "totalCommits": 0,
+                "contributors": []
+            }
+            self._commit({"op": "put_project", "project": project})
+            return project
+
+    def delete_project(self, project_id: str) -> bool:
+        with self.lock:
+            if project_id not in self.projects:
+                return False
+            self._commit({"op": "delete_project", "project_id": project_id})
+            return True
+
+    def snapshot(self) -> None:
+        """Write the whole state out and start an empty journal"""
+        state = {
+            "seq": self.seq,
+            "next_id": self.next_id,
+            "projects": list(self.projects.values()),
+            "commits": {project_id: list(commits.values()) for project_id, commits in self.commits.items()},
+        }
+        target = self._file(SNAPSHOT_FILE)
+        tmp = target + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        self._sync_directory()
+        # Everything journaled so far is in the snapshot now
+        if self.journal is not None:
+            self.journal.truncate(0)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        else:
+            open(self._file(JOURNAL_FILE), "wb").close()
+        self.journaled = 0
+
+    def close(self) -> None:
+        with self.lock:
+            if self.journaled:
+                self.snapshot()
+            self.journal.close()
+
+    # -- Internals -------------------------------------------------------
+
+    def _commit(self, record: dict) -> None:
+        """Journal a change, then apply it; the caller holds the lock"""
+        record = {"seq": self.seq + 1, **record}
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        end = self.journal.tell()
+        try:
+            self.journal.write(line)
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+        except BaseException:
+            # Leave no partial line for later records to follow
+            self.journal.truncate(end)
+            raise
+        self._apply(record)
+        self.journaled += 1
+        if self.journaled >= self.snapshot_every:
+            self.snapshot()
+
+    def _apply(self, record: dict) -> None:
+        self.seq = record.get("seq", self.seq)
+        op = record["op"]
+        if op == "put_project":
+            project = copy.deepcopy(record["project"])
+            self.projects[project["id"]] = project
+            self._reserve(project["id"])
+        elif op == "delete_project":
+            self.projects.pop(record["project_id"], None)
+            self.commits.pop(record["project_id"], None)
+        elif op == "put_commit":
+            commit = copy.deepcopy(record["commit"])
+            self.commits.setdefault(record["project_id"], {})[commit["id"]] = commit
+        else:
+            raise ValueError(f"Unknown journal operation '{op}'")
+
+    def _reserve(self, project_id: str) -> None:
+        # Ids from seed data or older journals must never be handed out again
+        prefix, _, number = project_id.rpartition("-")
+        if prefix == "proj" and number.isdigit():
+            self.next_id = max(self.next_id, int(number) + 1)
+
+    def _load(self) -> bool:
+        """Restore the snapshot and replay the journal after it; False if there is neither"""
+        snapshot_path = self._file(SNAPSHOT_FILE)
+        journal_path = self._file(JOURNAL_FILE)
+        if not os.path.exists(snapshot_path) and not os.path.exists(journal_path):
+            return False
+
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            for project in state["projects"]:
+                self._apply({"op": "put_project", "project": project})
+            for project_id, commits in state["commits"].items():
+                for commit in commits:
+                    self._apply({"op": "put_commit", "project_id": project_id, "commit": commit})
+            self.seq = state["seq"]
+            self.next_id = max(self.next_id, state["next_id"])
+
+        if os.path.exists(journal_path):
+            valid = 0
+            with open(journal_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Torn write from a crash
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    valid += len(line)
+                    if record["seq"] <= self.seq:
+                        continue  # Already in the snapshot
+                    self._apply(record)
+                    self.journaled += 1
+            if valid != os.path.getsize(journal_path):
+                with open(journal_path, "r+b") as f:
+                    f.truncate(valid)
+        return True
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _sync_directory(self) -> None:
+        # Make the rename itself durable; not possible on every platform
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
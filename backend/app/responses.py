@@ -0,0 +1,213 @@
+"""Response classes for serving stored file content and encoded API payloads"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+import gzip
+import json
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+from app.metrics import DOWNLOAD_BYTES
+from app.services.storage import Segment
+
+# Faster encoders and brotli are used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+_SEND_SIZE = 1024 * 1024
+
+
+def _read_at(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+class SegmentResponse(Response):
+    """Send a body assembled from file segments without buffering it.
+
+    When the server advertises the ASGI zero-copy extension each on-disk
+    segment is handed over as a file descriptor and sent with sendfile();
+    otherwise it is read in bounded pieces off the event loop. In both
+    cases memory use is independent of the size of the file.
+    """
+
+    def __init__(
+        self,
+        segments: List[Segment],
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None
+    ):
+        self.segments = segments
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = background
+        self.body = b""
+        self.init_headers(headers)
+        self.headers["content-length"] = str(sum(s.length for s in segments))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD" or not self.segments:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        sent = DOWNLOAD_BYTES.labels("file")
+        zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+        last = len(self.segments) - 1
+        for i, segment in enumerate(self.segments):
+            if isinstance(segment.source, str) and zerocopy:
+                f = await run_in_threadpool(open, segment.source, "rb")
+                try:
+                    await send({
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": f,
+                        "offset": segment.offset,
+                        "count": segment.length,
+                        "more_body": i < last,
+                    })
+                finally:
+                    f.close()
+                sent.inc(segment.length)
+                continue
+
+            for pos in range(0, segment.length, _SEND_SIZE):
+                count = min(_SEND_SIZE, segment.length - pos)
+                if isinstance(segment.source, str):
+                    body = await run_in_threadpool(_read_at, segment.source, segment.offset + pos, count)
+                else:
+                    body = segment.source[segment.offset + pos:segment.offset + pos + count]
+                await send({
+                    "type": "http.response.body",
+                    "body": body,
+                    "more_body": i < last or pos + count < segment.length,
+                })
+                sent.inc(count)
+
+        if self.background is not None:
+            await self.background()
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(value: Any) -> Any:
+    # isoformat() as FastAPI's encoder writes it, UTC as +00:00 rather than Z
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _encode_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True, datetime=False)
+
+
+def _qualities(header: str) -> Dict[str, float]:
+    """Accept-style header as {token: q}"""
+    qualities = {}
+    for item in header.split(","):
+        token, _, params = item.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[token] = max(q, qualities.get(token, 0.0))
+    return qualities
+
+
+def _negotiate_format(accept: str) -> Tuple[str, Callable[[Any], bytes]]:
+    """MessagePack when the client prefers it, JSON otherwise"""
+    if msgpack is not None and accept:
+        qualities = _qualities(accept)
+        packed = max((qualities.get(t, 0.0) for t in MSGPACK_MEDIA_TYPES), default=0.0)
+        plain = max(qualities.get(JSON_MEDIA_TYPE, 0.0), qualities.get("application/*", 0.0), qualities.get("*/*", 0.0))
+        if packed > 0 and packed >= plain:
+            media_type = next(t for t in MSGPACK_MEDIA_TYPES if qualities.get(t, 0.0) == packed)
+            return media_type, _encode_msgpack
+    return JSON_MEDIA_TYPE, _encode_json
+
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """br or gzip, whichever the client ranks higher (br on a tie); None for identity"""
+    qualities = _qualities(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = qualities.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=settings.response_brotli_quality, mode=brotli.MODE_TEXT)
+    return gzip.compress(body, compresslevel=settings.response_gzip_level, mtime=0)
+
+
+async def encoded_response(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """Plain dicts and lists sent without Pydantic validation.
+
+    Encoded as MessagePack or JSON per ``Accept`` and, past
+    ``response_compress_min_bytes``, compressed per ``Accept-Encoding``;
+    compression runs in the threadpool so a large graph does not stall the
+    event loop. The endpoint's response_model still documents the shape.
+    """
+    media_type, encode = _negotiate_format(request.headers.get("accept", ""))
+    body = encode(content)
+    coding = None
+    if len(body) >= settings.response_compress_min_bytes:
+        coding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if coding is not None:
+            body = await run_in_threadpool(_compress, body, coding)
+
+    response = Response(body, status_code=status_code, headers=headers, media_type=media_type)
+    response.headers["vary"] = "Accept, Accept-Encoding"
+    if coding is not None:
+        response.headers["content-encoding"] = coding
+    return response
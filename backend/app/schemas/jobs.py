@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    status: str  # queued, running, succeeded, failed
+    priority: int
+    attempts: int
+    max_attempts: int
+    run_after: datetime  # Earliest time of the next attempt while queued
+    result: Optional[Any] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class JobListResponse(BaseModel):
+    """A page of jobs, newest first, with how many there are in each status"""
+    jobs: List[JobResponse]
+    counts: Dict[str, int]
+    next_offset: Optional[int] = None
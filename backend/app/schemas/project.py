@@ -14,6 +14,8 @@ class BranchCreate(BranchBase):
 class BranchResponse(BranchBase):
     id: uuid.UUID
     commitCount: int
+    contributorCount: int = 0
+    lastModified: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -61,11 +63,89 @@ class CommitResponse(CommitBase):
     parent_commit_id: Optional[uuid.UUID]
     graph_x: int
     graph_y: int
+    generation: int = 0
+    tree_hash: Optional[str] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class CommitPageResponse(BaseModel):
+    """One page of history, newest first; pass next_cursor to get the next page"""
+    commits: List[CommitResponse]
+    next_cursor: Optional[str]
+    limit: int
+
+class AncestryResponse(BaseModel):
+    ancestor: uuid.UUID
+    descendant: uuid.UUID
+    is_ancestor: bool
+
+class MergeBaseResponse(BaseModel):
+    merge_bases: List[CommitResponse]
+
+class CommitRangeResponse(BaseModel):
+    """Commits reachable from head but not from base"""
+    base: Optional[uuid.UUID]
+    head: uuid.UUID
+    total: int
+    commits: List[CommitResponse]
+
+class ReferenceListResponse(BaseModel):
+    """Paths directly linked to ``path`` in a commit's reference graph"""
+    commit_id: uuid.UUID
+    path: str
+    paths: List[str]
+
+class ImpactedDocument(BaseModel):
+    path: str
+    depth: int  # 1 uses the part directly, 2 uses something that does, ...
+
+class ImpactResponse(BaseModel):
+    commit_id: uuid.UUID
+    path: str
+    impacted: List[ImpactedDocument]
+
+class FileChange(BaseModel):
+    """A path whose content differs between two commits"""
+    path: str
+    status: str  # added, deleted, modified
+    old_file_id: Optional[uuid.UUID] = None
+    new_file_id: Optional[uuid.UUID] = None
+    old_hash: Optional[str] = None
+    new_hash: Optional[str] = None
+
+class CommitDiffResponse(BaseModel):
+    base: uuid.UUID
+    head: uuid.UUID
+    changes: List[FileChange]
+    trees_compared: int  # Subtrees descended into; unchanged ones are skipped
+
+# Commit graph schemas
+class GraphNode(BaseModel):
+    id: uuid.UUID
+    message: str
+    author: str
+    branch: str
+    timestamp: Optional[datetime]
+    x: int
+    y: int
+    lane: int
+    generation: int
+    parents: List[uuid.UUID]
+
+class GraphLane(BaseModel):
+    branch: str
+    lane: int
+    color: str
+
+class CommitGraphResponse(BaseModel):
+    """Server-computed layout of a project's commit DAG"""
+    nodes: List[GraphNode]
+    lanes: List[GraphLane]
+    total: int
+    max_generation: int
+
 # File schemas
 class FileBase(BaseModel):
     filename: str
@@ -92,10 +172,92 @@ class ProjectUpload(BaseModel):
     author: str
     branch_name: str = "main"
     parent_commit_id: Optional[uuid.UUID] = None
+    merge_parent_ids: List[uuid.UUID] = []  # Extra parents when the commit is a merge
     files: List[dict]  # File manifest from SolidWorks
     
+class FileVerification(BaseModel):
+    """Outcome of checking one manifest entry against stored content"""
+    file_path: Optional[str] = None
+    content_hash: Optional[str] = None
+    status: str  # verified, cached, hash_mismatch, size_mismatch, corrupt, unreadable
+    seconds: float = 0.0
+
+class VerificationReport(BaseModel):
+    files: List[FileVerification]
+    failed: int
+    hashed_bytes: int
+    seconds: float  # Wall clock time for the whole stage
+
 class UploadResponse(BaseModel):
     commit_id: uuid.UUID
     message: str
     files_uploaded: int
-    total_size: int
\ No newline at end of file
+    total_size: int
+    verification: Optional[VerificationReport] = None
+    job_ids: List[int] = []  # Follow-up work on the commit, see /jobs/{id}
+
+class UploadNegotiateResponse(BaseModel):
+    """Which manifest entries still need their bodies uploaded"""
+    missing: List[dict]
+    present: List[str]  # content_hash values already stored
+
+# Sync schemas
+class SyncRequest(BaseModel):
+    """What a client holds and what it wants to check out"""
+    want: str  # Commit id or branch name
+    have: List[uuid.UUID] = Field(default_factory=list, max_length=1000)  # Commits whose files are on disk
+
+class SyncChange(BaseModel):
+    path: str
+    status: str  # added, deleted, modified
+    file_id: Optional[uuid.UUID]  # None for deleted paths
+    content_hash: Optional[str]
+    is_main_assembly: bool = False
+
+class SyncFile(BaseModel):
+    """A file body to download from /files/by-hash/{content_hash}/content"""
+    file_id: uuid.UUID
+    content_hash: str
+    file_size: int
+
+class SyncResponse(BaseModel):
+    """Changes that turn ``base`` into ``want``, and the bodies not already held"""
+    want: uuid.UUID
+    base: Optional[uuid.UUID]  # The have commit the changes are relative to; None is a full checkout
+    changes: List[SyncChange]
+    files: List[SyncFile]
+    transfer_bytes: int
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    file_path: str
+    file_size: int = Field(..., ge=0)
+    content_hash: Optional[str] = None
+    file_type: Optional[str] = None
+    client_id: Optional[str] = Field(None, max_length=128)  # Resumes this client's own pending upload of the content
+
+class UploadSessionResponse(BaseModel):
+    id: Optional[uuid.UUID] = None  # None when the content was already stored
+    status: str
+    received_bytes: int
+    expected_size: int
+    file_id: Optional[uuid.UUID] = None
+    job_id: Optional[int] = None  # Ingest job of a deferred completion
+    
+    class Config:
+        from_attributes = True
+
+class SearchHitResponse(BaseModel):
+    commit: CommitResponse
+    rank: float  # Higher is a better match
+    matched_paths: List[str]  # Changed paths that matched a query word, if any
+
+class SearchResponse(BaseModel):
+    """Ranked commits matching a query; pass next_offset to get the next page"""
+    query: str
+    results: List[SearchHitResponse]
+    next_offset: Optional[int]
+    limit: int
+
+class SearchBackfillResponse(BaseModel):
+    indexed: int
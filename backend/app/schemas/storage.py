@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+
+class StorageStatsResponse(BaseModel):
+    """Space used by the chunk store and how much deduplication saves"""
+    files: int
+    logical_bytes: int
+    stored_bytes: int
+    saved_bytes: int
+    dedup_ratio: float
+    savings_percent: float
+    unique_chunks: int
+    chunk_references: int
+    avg_chunk_size: int
+
+class GarbageCollectionResponse(BaseModel):
+    """What a garbage collection removed, or would remove on a dry run"""
+    expired_uploads: int
+    trees: int
+    reference_graphs: int
+    files: int
+    previews: int
+    chunks: int
+    delta_blobs: int
+    orphan_files: int
+    jobs: int  # Finished jobs past their retention
+    events: int  # Project events past their retention
+    reclaimed_bytes: int
+    dry_run: bool
+    seconds: float
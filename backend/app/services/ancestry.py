@@ -0,0 +1,285 @@
+"""Ancestry index for reachability, merge-base and range queries.
+
+Commits are split into chains: a commit continues its first parent's
+chain when it is the first child to extend the chain's tip, otherwise it
+starts a new chain. Within a chain, position ``i`` is the first parent of
+position ``i + 1``, so everything a commit can reach is a prefix of some
+set of chains. Where a chain branches off another, and for every extra
+merge parent, a ChainLink records the jump to the other chain.
+
+The set of commits reachable from X is therefore described by a small map
+``{chain_id: highest reachable position}``, found by walking ChainLinks
+rather than commits. That walk is bounded by the number of branch and
+merge points, not by how deep the history is.
+
+Commits written before the index existed have no chain until
+``rebuild_project`` runs; until then, queries on that project fall back
+to walking parents, which is slower but needs no writes.
+"""
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Set, Tuple
+import uuid
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.models.project import ChainLink, Commit, CommitChain, CommitParent
+
+Reach = Dict[int, int]
+
+
+def _ancestors(parents: Dict[uuid.UUID, List[uuid.UUID]], start: List[uuid.UUID]) -> Set[uuid.UUID]:
+    """``start`` and everything reachable from it through ``parents``"""
+    seen = set(start)
+    stack = list(seen)
+    while stack:
+        for parent_id in parents.get(stack.pop(), ()):
+            if parent_id not in seen:
+                seen.add(parent_id)
+                stack.append(parent_id)
+    return seen
+
+
+def parent_map(db: Session, project_id: uuid.UUID) -> Dict[uuid.UUID, List[uuid.UUID]]:
+    """All parents of every commit in a project, first parent first"""
+    parents: Dict[uuid.UUID, List[uuid.UUID]] = defaultdict(list)
+    rows = db.query(CommitParent.commit_id, CommitParent.parent_id).join(
+        Commit, Commit.id == CommitParent.commit_id
+    ).filter(Commit.project_id == project_id).order_by(CommitParent.commit_id, CommitParent.position)
+    for commit_id, parent_id in rows:
+        parents[commit_id].append(parent_id)
+
+    # Commits written before commit_parents existed only have parent_commit_id
+    legacy = db.query(Commit.id, Commit.parent_commit_id).filter(
+        Commit.project_id == project_id,
+        Commit.parent_commit_id.isnot(None)
+    )
+    for commit_id, parent_id in legacy:
+        if commit_id not in parents:
+            parents[commit_id].append(parent_id)
+    return parents
+
+
+class AncestryIndex:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- Maintenance -----------------------------------------------------
+
+    def index_commit(self, commit: Commit, parent_ids: List[uuid.UUID]) -> None:
+        """Record a new commit's parents and place it on a chain.
+
+        ``parent_ids[0]`` is the first parent; the commit must be flushed.
+        """
+        for position, parent_id in enumerate(parent_ids):
+            self.db.add(CommitParent(commit_id=commit.id, position=position, parent_id=parent_id))
+
+        parents = {
+            c.id: c for c in self.db.query(Commit).filter(Commit.id.in_(parent_ids))
+        } if parent_ids else {}
+
+        first = parents.get(parent_ids[0]) if parent_ids else None
+        chain_id, position = None, 0
+        if first is not None and first.chain_id is not None:
+            # Extend the first parent's chain only if it is still the tip
+            claimed = self.db.query(CommitChain).filter(
+                CommitChain.id == first.chain_id,
+                CommitChain.length == first.chain_pos + 1
+            ).update({CommitChain.length: CommitChain.length + 1}, synchronize_session=False)
+            if claimed:
+                chain_id, position = first.chain_id, first.chain_pos + 1
+
+        if chain_id is None:
+            chain = CommitChain(project_id=commit.project_id, length=1)
+            self.db.add(chain)
+            self.db.flush()
+            chain_id = chain.id
+
+        commit.chain_id = chain_id
+        commit.chain_pos = position
+
+        links_from = parent_ids if position == 0 else parent_ids[1:]
+        for parent_id in links_from:
+            parent = parents.get(parent_id)
+            if parent is None or parent.chain_id is None:
+                continue
+            self.db.add(ChainLink(
+                project_id=commit.project_id,
+                chain_id=chain_id,
+                position=position,
+                parent_chain_id=parent.chain_id,
+                parent_position=parent.chain_pos
+            ))
+
+    def rebuild_project(self, project_id: uuid.UUID) -> None:
+        """Rebuild parents, chains and links for a whole project (backfill)"""
+        parents = parent_map(self.db, project_id)
+        commits = self.db.query(Commit).filter(Commit.project_id == project_id).order_by(
+            Commit.created_at, Commit.id
+        ).all()
+
+        self.db.query(ChainLink).filter(ChainLink.project_id == project_id).delete(synchronize_session=False)
+        # Keep the loaded commits in step, so reassigning their old chain
+        # positions below is still seen as a change and written back
+        self.db.query(Commit).filter(Commit.project_id == project_id).update(
+            {Commit.chain_id: None, Commit.chain_pos: None}, synchronize_session="evaluate"
+        )
+        self.db.query(CommitChain).filter(CommitChain.project_id == project_id).delete(synchronize_session=False)
+        self.db.query(CommitParent).filter(CommitParent.commit_id.in_(
+            self.db.query(Commit.id).filter(Commit.project_id == project_id)
+        )).delete(synchronize_session=False)
+        self.db.flush()
+
+        # Index parents before children
+        by_id = {c.id: c for c in commits}
+        pending = defaultdict(int)
+        children = defaultdict(list)
+        for commit in commits:
+            for parent_id in parents.get(commit.id, []):
+                if parent_id in by_id:
+                    pending[commit.id] += 1
+                    children[parent_id].append(commit.id)
+        ready = deque(c.id for c in commits if not pending[c.id])
+        while ready:
+            commit = by_id[ready.popleft()]
+            self.index_commit(commit, parents.get(commit.id, []))
+            self.db.flush()
+            for child_id in children[commit.id]:
+                pending[child_id] -= 1
+                if not pending[child_id]:
+                    ready.append(child_id)
+
+    # -- Queries ---------------------------------------------------------
+
+    def indexed(self, project_id: uuid.UUID) -> bool:
+        """Whether every commit of the project is on a chain"""
+        # Served by ix_commits_chain_pos, which holds few NULLs once backfilled
+        return self.db.query(Commit.id).filter(
+            Commit.chain_id.is_(None),
+            Commit.project_id == project_id
+        ).first() is None
+
+    def reach(self, commit: Commit, links: Optional[Dict[int, List[tuple]]] = None) -> Reach:
+        """Highest reachable position on every chain ``commit`` can reach"""
+        if links is None:
+            links = self._links(commit.project_id)
+        best: Reach = {}
+        stack = [(commit.chain_id, commit.chain_pos)]
+        while stack:
+            chain_id, position = stack.pop()
+            previous = best.get(chain_id, -1)
+            if position <= previous:
+                continue
+            best[chain_id] = position
+            # Links at or below ``previous`` were followed on an earlier visit
+            for link_position, parent_chain, parent_position in links.get(chain_id, ()):
+                if previous < link_position <= position:
+                    stack.append((parent_chain, parent_position))
+        return best
+
+    def is_ancestor(self, ancestor: Commit, descendant: Commit) -> bool:
+        """Whether ``ancestor`` is reachable from ``descendant`` (inclusive)"""
+        if ancestor.project_id != descendant.project_id:
+            return False
+        if not self.indexed(descendant.project_id):
+            if ancestor.id == descendant.id:
+                return True
+            return ancestor.id in _ancestors(parent_map(self.db, descendant.project_id), [descendant.id])
+        if ancestor.chain_id == descendant.chain_id:
+            return ancestor.chain_pos <= descendant.chain_pos
+        if ancestor.generation >= descendant.generation:
+            return False
+        return self.reach(descendant).get(ancestor.chain_id, -1) >= ancestor.chain_pos
+
+    def merge_bases(self, a: Commit, b: Commit) -> List[Commit]:
+        """Best common ancestors of two commits, newest first"""
+        if a.project_id != b.project_id:
+            return []
+        if not self.indexed(a.project_id):
+            parents = parent_map(self.db, a.project_id)
+            common = _ancestors(parents, [a.id]) & _ancestors(parents, [b.id])
+            # Common ancestors of other common ancestors are not the best ones
+            dominated = _ancestors(parents, [p for c in common for p in parents.get(c, ())])
+            return self._by_ids(common - dominated).order_by(
+                Commit.generation.desc(), Commit.created_at.desc()
+            ).all()
+        links = self._links(a.project_id)
+        reach_a = self.reach(a, links)
+        reach_b = self.reach(b, links)
+
+        # On each shared chain the newest common ancestor is the lower of the two tips
+        candidates = {
+            chain_id: min(position, reach_b[chain_id])
+            for chain_id, position in reach_a.items()
+            if chain_id in reach_b
+        }
+        if not candidates:
+            return []
+
+        # Drop candidates that another candidate can already reach
+        reaches = {
+            chain_id: self.reach(_Position(chain_id, position), links)
+            for chain_id, position in candidates.items()
+        }
+        best = [
+            (chain_id, position)
+            for chain_id, position in candidates.items()
+            if not any(
+                other != chain_id and reaches[other].get(chain_id, -1) >= position
+                for other in candidates
+            )
+        ]
+        return self.db.query(Commit).filter(or_(*[
+            and_(Commit.chain_id == chain_id, Commit.chain_pos == position)
+            for chain_id, position in best
+        ])).order_by(Commit.generation.desc(), Commit.created_at.desc()).all()
+
+    def range_query(self, base: Optional[Commit], head: Commit):
+        """Query for commits reachable from ``head`` but not from ``base``"""
+        if not self.indexed(head.project_id):
+            parents = parent_map(self.db, head.project_id)
+            ids = _ancestors(parents, [head.id])
+            if base is not None:
+                ids -= _ancestors(parents, [base.id])
+            return self._by_ids(ids).order_by(Commit.generation.desc(), Commit.created_at.desc(), Commit.id)
+        links = self._links(head.project_id)
+        reach_head = self.reach(head, links)
+        reach_base = self.reach(base, links) if base is not None else {}
+
+        ranges = [
+            and_(
+                Commit.chain_id == chain_id,
+                Commit.chain_pos > reach_base.get(chain_id, -1),
+                Commit.chain_pos <= position
+            )
+            for chain_id, position in reach_head.items()
+            if position > reach_base.get(chain_id, -1)
+        ]
+        query = self.db.query(Commit).filter(Commit.project_id == head.project_id)
+        if not ranges:
+            return query.filter(Commit.id.is_(None))
+        return query.filter(or_(*ranges)).order_by(
+            Commit.generation.desc(), Commit.created_at.desc(), Commit.id
+        )
+
+    def _by_ids(self, commit_ids: Set[uuid.UUID]):
+        if not commit_ids:
+            return self.db.query(Commit).filter(Commit.id.is_(None))
+        return self.db.query(Commit).filter(Commit.id.in_(commit_ids))
+
+    def _links(self, project_id: uuid.UUID) -> Dict[int, List[Tuple[int, int, int]]]:
+        links: Dict[int, List[Tuple[int, int, int]]] = defaultdict(list)
+        rows = self.db.query(
+            ChainLink.chain_id, ChainLink.position, ChainLink.parent_chain_id, ChainLink.parent_position
+        ).filter(ChainLink.project_id == project_id)
+        for chain_id, position, parent_chain, parent_position in rows:
+            links[chain_id].append((position, parent_chain, parent_position))
+        return links
+
+
+class _Position:
+    """Stand-in for a Commit when only its chain position is known"""
+
+    def __init__(self, chain_id: int, chain_pos: int):
+        self.chain_id = chain_id
+        self.chain_pos = chain_pos
@@ -0,0 +1,152 @@
+"""Streaming zip and tar archives of a commit's file tree.
+
+Archives are produced by generators that yield bytes as soon as they are
+encoded: file content is read chunk by chunk and pushed through the
+archive writer, and nothing is spooled to disk or held beyond the piece
+being written. Memory use is therefore constant in the size of the tree.
+"""
+from typing import Iterator, List, NamedTuple, Optional
+import tarfile
+import time
+import uuid
+import zipfile
+import zlib
+
+from sqlalchemy.orm import Session
+
+from app.models.project import Commit, File
+from app.services.storage import iter_file_content
+from app.services.tree_store import TreeStore
+
+ARCHIVE_FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+    "tar.gz": "application/gzip",
+}
+
+# Marks the main assembly: a zip entry comment, or a PAX header in tar
+MAIN_ASSEMBLY_MARKER = "main-assembly"
+PAX_MAIN_ASSEMBLY = "PDM.main_assembly"
+
+_BLOCK = tarfile.BLOCKSIZE
+_RECORD = tarfile.RECORDSIZE
+
+
+class ArchiveEntry(NamedTuple):
+    path: str
+    file_id: uuid.UUID
+    size: int
+    is_main_assembly: bool
+
+
+class _Sink:
+    """Write-only file object whose contents are drained by the generator"""
+
+    def __init__(self, level: Optional[int] = None):
+        self.parts: List[bytes] = []
+        self.written = 0
+        # wbits=31 writes a gzip container
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31) if level is not None else None
+
+    def write(self, data) -> int:
+        size = len(data)
+        self.written += size
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        if data:
+            self.parts.append(bytes(data))
+        return size
+
+    def flush(self) -> None:
+        pass
+
+    def finish(self) -> None:
+        if self.compressor is not None:
+            self.parts.append(self.compressor.flush())
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def commit_entries(db: Session, commit: Commit) -> List[ArchiveEntry]:
+    """The files of a commit in path order"""
+    files = TreeStore(db).list_files(commit)
+    sizes = dict(db.query(File.id, File.file_size).filter(File.id.in_({f.file_id for f in files}))) if files else {}
+    return [ArchiveEntry(f.path, f.file_id, sizes.get(f.file_id) or 0, f.is_main_assembly) for f in files]
+
+
+def stream_archive(
+    db: Session,
+    entries: List[ArchiveEntry],
+    archive_format: str = "zip",
+    level: int = 6,
+    mtime: Optional[float] = None
+) -> Iterator[bytes]:
+    """Yield an archive of ``entries`` in the requested format"""
+    mtime = time.time() if mtime is None else mtime
+    if archive_format == "zip":
+        pieces = _stream_zip(db, entries, level, mtime)
+    elif archive_format == "tar":
+        pieces = _stream_tar(db, entries, None, mtime)
+    elif archive_format == "tar.gz":
+        pieces = _stream_tar(db, entries, level, mtime)
+    else:
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+    return (piece for piece in pieces if piece)
+
+
+def _stream_zip(db: Session, entries: List[ArchiveEntry], level: int, mtime: float) -> Iterator[bytes]:
+    sink = _Sink()
+    compression = zipfile.ZIP_DEFLATED if level else zipfile.ZIP_STORED
+    # The sink cannot seek, so zipfile writes sizes and CRCs in data descriptors
+    with zipfile.ZipFile(sink, "w", compression=compression, compresslevel=level or None) as archive:
+        main = [entry.path for entry in entries if entry.is_main_assembly]
+        if main:
+            archive.comment = f"{MAIN_ASSEMBLY_MARKER}: {main[0]}".encode("utf-8")
+
+        date_time = time.localtime(max(mtime, 315532800))[:6]  # zip dates start in 1980
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.path, date_time=date_time)
+            info.compress_type = compression
+            info.file_size = entry.size  # Lets zipfile decide on zip64 up front
+            if entry.is_main_assembly:
+                info.comment = MAIN_ASSEMBLY_MARKER.encode("utf-8")
+            with archive.open(info, "w") as out:
+                for piece in iter_file_content(db, db.get(File, entry.file_id)):
+                    out.write(piece)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _stream_tar(db: Session, entries: List[ArchiveEntry], level: Optional[int], mtime: float) -> Iterator[bytes]:
+    sink = _Sink(level)
+    for entry in entries:
+        info = tarfile.TarInfo(entry.path)
+        info.size = entry.size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        if entry.is_main_assembly:
+            info.pax_headers = {PAX_MAIN_ASSEMBLY: "1"}
+        sink.write(info.tobuf(tarfile.PAX_FORMAT))
+
+        written = 0
+        for piece in iter_file_content(db, db.get(File, entry.file_id)):
+            sink.write(piece)
+            written += len(piece)
+            yield sink.drain()
+        if written != entry.size:
+            raise IOError(f"Stored content of {entry.path} is {written} bytes, expected {entry.size}")
+        remainder = written % _BLOCK
+        if remainder:
+            sink.write(b"\0" * (_BLOCK - remainder))
+
+    # End of archive: two empty blocks, padded to a full record
+    sink.write(b"\0" * (2 * _BLOCK))
+    remainder = sink.written % _RECORD
+    if remainder:
+        sink.write(b"\0" * (_RECORD - remainder))
+    sink.finish()
+    yield sink.drain()
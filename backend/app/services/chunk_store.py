@@ -0,0 +1,334 @@
+"""Content-defined chunked blob store.
+
+Files are cut into variable-size chunks with a FastCDC-style gear hash, so
+an edit in the middle of a large assembly only changes the chunks around
+it. Each chunk is written once under ``<storage_path>/chunks`` keyed by
+its SHA256, and a File is stored as its ordered list of chunk hashes.
+"""
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+import hashlib
+import io
+import os
+import tempfile
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.models.project import File, Chunk, FileChunk
+
+# Vectorized boundary search when installed; the pure-Python loop cuts
+# at exactly the same offsets, only slower
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHUNKED_SCHEME = "chunked://"
+
+_READ_SIZE = 1024 * 1024
+_MASK_64 = (1 << 64) - 1
+_QUERY_BATCH = 500
+_SCAN_BLOCK = 16 * 1024  # Bytes fingerprinted at once; a cut usually comes early
+
+
+def _gear_table() -> List[int]:
+    # Derived from SHA256 so boundaries are stable across processes and
+    # releases; changing this table would defeat dedup against old chunks.
+    return [
+        int.from_bytes(hashlib.sha256(b"gear" + bytes([i])).digest()[:8], "big")
+        for i in range(256)
+    ]
+
+
+GEAR = _gear_table()
+GEAR_ARRAY = numpy.array(GEAR, dtype=numpy.uint64) if numpy is not None else None
+
+
+def _mask(bits: int) -> int:
+    # Spread the mask bits over the upper part of the fingerprint, where the
+    # gear hash has mixed in the most input bytes.
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _fingerprints(data, begin: int, end: int):
+    """Gear fingerprint after each byte of data[begin:end], hashing from ``begin``.
+
+    The fingerprint is sum(GEAR[data[i - k]] << k) over the last 64 bytes
+    (older bytes are shifted out), built by doubling the span summed: six
+    passes over the window instead of one Python step per byte.
+    """
+    fp = GEAR_ARRAY[numpy.frombuffer(data, dtype=numpy.uint8, count=end - begin, offset=begin)]
+    span = 1
+    while span < 64 and span < len(fp):
+        fp[span:] += fp[:-span] << numpy.uint64(span)
+        span *= 2
+    return fp
+
+
+class ChunkRef(NamedTuple):
+    hash: str
+    size: int
+    offset: int
+
+
+class StoredBlob(NamedTuple):
+    content_hash: str
+    size: int
+    chunks: List[ChunkRef]
+    new_bytes: int  # Bytes actually written to disk for this blob
+
+
+class ChunkStore:
+    """Splits streams into content-defined chunks and stores each chunk once"""
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        min_size: Optional[int] = None,
+        avg_size: Optional[int] = None,
+        max_size: Optional[int] = None
+    ):
+        self.root = os.path.join(root or settings.storage_path, "chunks")
+        self.min_size = min_size or settings.chunk_min_size
+        self.avg_size = avg_size or settings.chunk_avg_size
+        self.max_size = max_size or settings.chunk_max_size
+
+        # Normalized chunking: a stricter mask before the average size and a
+        # looser one after it keeps chunk sizes clustered around avg_size.
+        bits = max(self.avg_size.bit_length() - 1, 1)
+        self._mask_small = _mask(bits + 2)
+        self._mask_large = _mask(max(bits - 2, 1))
+
+    # -- Chunking / disk -------------------------------------------------
+
+    def cut_point(self, data, start: int, end: int) -> int:
+        """Return the end offset of the chunk starting at ``start``"""
+        remaining = end - start
+        if remaining <= self.min_size:
+            return end
+        if remaining > self.max_size:
+            remaining = self.max_size
+        if numpy is not None:
+            return self._cut_point_vectorized(data, start, remaining)
+
+        gear = GEAR
+        mask_small = self._mask_small
+        mask_large = self._mask_large
+        normal_end = start + min(self.avg_size, remaining)
+        stop = start + remaining
+
+        fp = 0
+        i = start + self.min_size
+        while i < normal_end:
+            fp = ((fp << 1) + gear[data[i]]) & _MASK_64
+            if not fp & mask_small:
+                return i + 1
+            i += 1
+        while i < stop:
+            fp = ((fp << 1) + gear[data[i]]) & _MASK_64
+            if not fp & mask_large:
+                return i + 1
+            i += 1
+        return stop
+
+    def _cut_point_vectorized(self, data, start: int, remaining: int) -> int:
+        """``cut_point`` with fingerprints computed a block of bytes at a time"""
+        begin = start + self.min_size
+        normal_end = start + min(self.avg_size, remaining)
+        stop = start + remaining
+
+        cut = self._first_match(data, begin, begin, normal_end, self._mask_small)
+        if cut is None:
+            cut = self._first_match(data, begin, normal_end, stop, self._mask_large)
+        return stop if cut is None else cut
+
+    @staticmethod
+    def _first_match(data, begin: int, lo: int, hi: int, mask: int) -> Optional[int]:
+        """End of the first byte in [lo, hi) whose fingerprint has no ``mask`` bits set"""
+        mask = numpy.uint64(mask)
+        while lo < hi:
+            block_end = min(hi, lo + _SCAN_BLOCK)
+            # The fingerprint covers the last 64 bytes, so hashing may restart there
+            window_start = max(begin, lo - 63)
+            fp = _fingerprints(data, window_start, block_end)[lo - window_start:]
+            hits = numpy.flatnonzero((fp & mask) == 0)
+            if hits.size:
+                return lo + int(hits[0]) + 1
+            lo = block_end
+        return None
+
+    def write_stream(self, stream: BinaryIO) -> StoredBlob:
+        """Chunk a readable binary stream into the store.
+
+        Memory use is bounded by ``max_size`` plus one read buffer
+        regardless of the stream length. Touches disk only, no database.
+        """
+        writer = ChunkWriter(self)
+        while True:
+            block = stream.read(_READ_SIZE)
+            if not block:
+                break
+            writer.update(block)
+        return writer.finish()
+
+    def write_bytes(self, data: bytes) -> StoredBlob:
+        """Chunk an in-memory payload into the store"""
+        return self.write_stream(io.BytesIO(data))
+
+    def chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.root, chunk_hash[:2], chunk_hash[2:4], chunk_hash)
+
+    def read_chunk(self, chunk_hash: str) -> bytes:
+        with open(self.chunk_path(chunk_hash), "rb") as f:
+            return f.read()
+
+    def _write_chunk(self, chunk_hash: str, data: bytes) -> bool:
+        """Write a chunk unless already present; returns True if written"""
+        path = self.chunk_path(chunk_hash)
+        if os.path.exists(path):
+            # Reused: refresh mtime so garbage collection's grace period covers it
+            os.utime(path)
+            return False
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so readers never observe a partial chunk
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+
+    # -- Database --------------------------------------------------------
+
+    def record_file(
+        self,
+        db: Session,
+        blob: StoredBlob,
+        filename: str,
+        file_path: str,
+        file_type: Optional[str] = None
+    ) -> File:
+        """Create the File row and its chunk list, reusing an identical File"""
+        existing = db.query(File).filter(File.content_hash == blob.content_hash).first()
+        if existing:
+            return existing
+
+        insert_ignore(db, Chunk, [
+            {"hash": h, "size": size}
+            for h, size in {(c.hash, c.size) for c in blob.chunks}
+        ])
+
+        file = File(
+            filename=filename,
+            file_path=file_path,
+            file_size=blob.size,
+            file_type=file_type or os.path.splitext(filename)[1].upper(),
+            content_hash=blob.content_hash,
+            storage_path=CHUNKED_SCHEME + blob.content_hash,
+            # Hashed from the very bytes just chunked into the store, so the
+            # first commit using it need not read them back
+            verified_at=datetime.now(timezone.utc)
+        )
+        db.add(file)
+        db.flush()
+
+        db.bulk_insert_mappings(FileChunk, [
+            {"file_id": file.id, "sequence": i, "chunk_hash": c.hash, "offset": c.offset}
+            for i, c in enumerate(blob.chunks)
+        ])
+        return file
+
+    def missing_chunks(self, db: Session, chunk_hashes: List[str]) -> List[str]:
+        """Hashes from ``chunk_hashes`` that the store doesn't hold yet"""
+        unique = list(dict.fromkeys(chunk_hashes))
+        present = set()
+        for i in range(0, len(unique), _QUERY_BATCH):
+            batch = unique[i:i + _QUERY_BATCH]
+            present.update(h for (h,) in db.query(Chunk.hash).filter(Chunk.hash.in_(batch)))
+        return [h for h in unique if h not in present]
+
+    def file_chunks(self, db: Session, file: File) -> List[ChunkRef]:
+        rows = db.query(FileChunk.chunk_hash, Chunk.size, FileChunk.offset).join(
+            Chunk, Chunk.hash == FileChunk.chunk_hash
+        ).filter(FileChunk.file_id == file.id).order_by(FileChunk.sequence)
+        return [ChunkRef(h, size, offset) for h, size, offset in rows]
+
+    def iter_file(self, db: Session, file: File) -> Iterator[bytes]:
+        """Yield a chunked file's content one chunk at a time"""
+        for ref in self.file_chunks(db, file):
+            yield self.read_chunk(ref.hash)
+
+    def dedup_stats(self, db: Session) -> dict:
+        """Logical vs physical bytes for everything held in the chunk store"""
+        file_count, logical_bytes = db.query(
+            func.count(File.id), func.coalesce(func.sum(File.file_size), 0)
+        ).filter(File.storage_path.like(CHUNKED_SCHEME + "%")).one()
+        chunk_count, stored_bytes = db.query(
+            func.count(Chunk.hash), func.coalesce(func.sum(Chunk.size), 0)
+        ).one()
+        chunk_references = db.query(func.count()).select_from(FileChunk).scalar()
+
+        saved_bytes = max(logical_bytes - stored_bytes, 0)
+        return {
+            "files": file_count,
+            "logical_bytes": logical_bytes,
+            "stored_bytes": stored_bytes,
+            "saved_bytes": saved_bytes,
+            "dedup_ratio": round(logical_bytes / stored_bytes, 3) if stored_bytes else 1.0,
+            "savings_percent": round(100.0 * saved_bytes / logical_bytes, 2) if logical_bytes else 0.0,
+            "unique_chunks": chunk_count,
+            "chunk_references": chunk_references,
+            "avg_chunk_size": stored_bytes // chunk_count if chunk_count else 0,
+        }
+
+
+class ChunkWriter:
+    """Chunks content fed in pieces of any size, storing each chunk once it is cut.
+
+    A chunk is cut as soon as ``max_size`` bytes are buffered, all the
+    lookahead ``cut_point`` uses, so the chunks match what ``write_stream``
+    cuts from the same bytes read in one go.
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.hash = hashlib.sha256()
+        self.chunks: List[ChunkRef] = []
+        self.new_bytes = 0
+        self.offset = 0
+        self.buffer = bytearray()
+
+    def update(self, data: bytes) -> None:
+        self.hash.update(data)
+        self.buffer += data
+        while len(self.buffer) >= self.store.max_size:
+            self._cut()
+
+    def hexdigest(self) -> str:
+        """SHA256 of everything fed so far"""
+        return self.hash.hexdigest()
+
+    def finish(self) -> StoredBlob:
+        """Cut what is left and describe the stored content"""
+        while self.buffer:
+            self._cut()
+        return StoredBlob(self.hash.hexdigest(), self.offset, list(self.chunks), self.new_bytes)
+
+    def _cut(self) -> None:
+        cut = self.store.cut_point(self.buffer, 0, len(self.buffer))
+        data = bytes(self.buffer[:cut])
+        del self.buffer[:cut]
+
+        chunk_hash = hashlib.sha256(data).hexdigest()
+        if self.store._write_chunk(chunk_hash, data):
+            self.new_bytes += len(data)
+        self.chunks.append(ChunkRef(chunk_hash, len(data), self.offset))
+        self.offset += len(data)
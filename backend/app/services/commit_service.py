@@ -0,0 +1,93 @@
+from typing import List, Tuple
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.models.project import Branch, Commit, File
+from app.schemas.project import ProjectUpload
+from app.services.ancestry import AncestryIndex
+from app.services.events import EventLog
+from app.services.graph_layout import GraphLayout
+from app.services.project_service import ProjectService
+from app.services.references import ReferenceIndex
+from app.services.tree_store import TreeStore
+
+
+class MissingContentError(Exception):
+    """A commit manifest references content that hasn't been uploaded"""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(f"{len(missing)} file(s) not uploaded")
+        self.missing = missing
+
+
+class CommitService:
+    """Records commits whose file bodies are already in storage"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_commit(self, project_id: uuid.UUID, upload: ProjectUpload) -> Tuple[Commit, List[File]]:
+        """Create a commit from a plugin manifest and move the branch head.
+
+        Every manifest entry must carry the ``content_hash`` of an uploaded
+        File, and may list the documents it uses as ``references``; the
+        parent defaults to the current head of the branch. Parents must be
+        commits of the same project (ValueError otherwise).
+        """
+        hashes = [entry.get("content_hash") for entry in upload.files]
+        files_by_hash = {
+            f.content_hash: f
+            for f in self.db.query(File).filter(File.content_hash.in_(set(hashes)))
+        } if hashes else {}
+        missing = [h for h in dict.fromkeys(hashes) if h not in files_by_hash]
+        if missing:
+            raise MissingContentError(missing)
+
+        branch = self.db.query(Branch).filter(
+            Branch.project_id == project_id,
+            Branch.name == upload.branch_name
+        ).first()
+        new_branch = branch is None
+        if new_branch:
+            branch = Branch(name=upload.branch_name, project_id=project_id)
+            self.db.add(branch)
+        previous_head = branch.head_commit_id
+
+        commit = Commit(
+            message=upload.commit_message,
+            author=upload.author,
+            project_id=project_id,
+            branch_name=upload.branch_name,
+            parent_commit_id=upload.parent_commit_id or branch.head_commit_id
+        )
+        parent_ids = [commit.parent_commit_id] if commit.parent_commit_id else []
+        parent_ids += [p for p in upload.merge_parent_ids if p not in parent_ids]
+        if parent_ids:
+            found = {commit_id for (commit_id,) in self.db.query(Commit.id).filter(
+                Commit.project_id == project_id,
+                Commit.id.in_(parent_ids)
+            )}
+            foreign = [str(p) for p in parent_ids if p not in found]
+            if foreign:
+                raise ValueError(f"Parent commit(s) not found in this project: {', '.join(foreign)}")
+        GraphLayout(self.db).place_commit(commit, parent_ids)
+        self.db.add(commit)
+        self.db.flush()
+        AncestryIndex(self.db).index_commit(commit, parent_ids)
+
+        # Only trees along changed paths are written; the rest are shared
+        files = [files_by_hash[entry["content_hash"]] for entry in upload.files]
+        commit.tree_hash = TreeStore(self.db).write_files(
+            (entry.get("file_path") or file.file_path, file, bool(entry.get("is_main_assembly", False)))
+            for entry, file in zip(upload.files, files)
+        )
+        commit.reference_graph_hash = ReferenceIndex(self.db).write_graph([
+            (entry.get("file_path") or file.file_path, file, entry.get("references"))
+            for entry, file in zip(upload.files, files)
+        ])
+
+        branch.head_commit_id = commit.id
+        ProjectService(self.db).record_commit(commit)
+        EventLog(self.db).commit_created(commit, previous_head, new_branch)
+        return commit, files
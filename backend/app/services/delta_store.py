@@ -0,0 +1,571 @@
+"""Binary delta storage between successive versions of the same file.
+
+When ``settings.delta_storage_enabled`` is on, a file committed at a path
+that also existed in the parent commit is re-encoded as a delta against
+the parent's version. Delta chains are cut every
+``delta_keyframe_interval`` versions by leaving a full (chunked) copy, and
+recently rebuilt versions are kept in a byte-bounded LRU cache so reading
+a recent history doesn't replay the same chain over and over. Versions
+too large for that cache are rebuilt once into ``versions/`` on disk,
+itself trimmed to ``delta_spill_bytes``, and downloads read them there.
+
+Encoding maps temporary copies of both versions rather than reading them
+into memory, indexes at most ``delta_index_blocks`` blocks of the base,
+hashes the target's windows a span at a time with numpy where installed,
+and compresses the payload to disk as it is produced.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import Commit, File, FileChunk, FileDelta
+from app.services.chunk_store import ChunkStore, CHUNKED_SCHEME, GEAR_ARRAY
+from app.services.tree_store import TreeStore
+
+# Vectorized search for matching blocks when installed; the pure-Python
+# loop finds the same matches, only slower
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DELTA_SCHEME = "delta://"
+
+_MAGIC = b"FFD1"
+_OP_COPY = 0
+_OP_INSERT = 1
+_COMPARE_STEP = 4096
+_OPS_BUFFER = 1024 * 1024  # Encoded ops buffered before compression; also the longest INSERT
+_SCAN_MIN = 1024  # Target windows hashed at once right after a match, doubling up to _HASH_SPAN
+_HASH_SPAN = 256 * 1024
+_INDEX_BATCH = 64 * 1024  # Base blocks hashed at once
+_SPILL_MIN_AGE = 60  # Seconds a rebuilt version on disk is kept after use, even over the limit
+
+
+# -- Codec ---------------------------------------------------------------
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _forward_match(base: bytes, b: int, target: bytes, t: int) -> int:
+    """Length of the common run starting at base[b] and target[t]"""
+    length = 0
+    limit = min(len(base) - b, len(target) - t)
+    step = _COMPARE_STEP
+    # Compare big slices first, then narrow down to the exact byte
+    while step:
+        while length + step <= limit and \
+                base[b + length:b + length + step] == target[t + length:t + length + step]:
+            length += step
+        step //= 8
+    return length
+
+
+def _window_hashes(data, begin: int, end: int, block_size: int):
+    """Gear hash of each ``block_size`` window starting in data[begin:end].
+
+    Built by doubling the span summed, as chunk fingerprints are; exact for
+    power-of-two block sizes.
+    """
+    fp = GEAR_ARRAY[numpy.frombuffer(data, dtype=numpy.uint8, count=end - begin + block_size - 1, offset=begin)]
+    span = 1
+    while span < block_size:
+        fp[span:] += fp[:-span] << numpy.uint64(span)
+        span *= 2
+    return fp[block_size - 1:]
+
+
+def _block_finder(base, target, block_size: int, stride: int) -> Callable[[int, int], Optional[Tuple[int, int]]]:
+    """``find(i, limit)``: the first target offset in [i, limit] whose block
+    is indexed in the base, with that base offset, or None"""
+    # Keyed by the block's hash; a hit is confirmed against the base itself
+    index: Dict[int, int] = {}
+    for offset in range(0, len(base) - block_size + 1, stride):
+        index.setdefault(hash(base[offset:offset + block_size]), offset)
+
+    def find(i: int, limit: int) -> Optional[Tuple[int, int]]:
+        while i <= limit:
+            block = target[i:i + block_size]
+            offset = index.get(hash(block))
+            if offset is not None and base[offset:offset + block_size] == block:
+                return i, offset
+            i += 1
+        return None
+
+    return find
+
+
+def _block_hashes(data, offsets: range, block_size: int):
+    """``_window_hashes`` of just the blocks at ``offsets``, an evenly spaced range"""
+    view = numpy.frombuffer(data, dtype=numpy.uint8, count=offsets[-1] + block_size - offsets[0], offset=offsets[0])
+    blocks = numpy.lib.stride_tricks.sliding_window_view(view, block_size)[::offsets.step]
+    shifts = numpy.arange(block_size - 1, -1, -1, dtype=numpy.uint64)
+    return (GEAR_ARRAY[blocks] << shifts).sum(axis=1, dtype=numpy.uint64)
+
+
+def _block_finder_vectorized(base, target, block_size: int, stride: int) -> Callable[[int, int], Optional[Tuple[int, int]]]:
+    """``_block_finder`` hashing every target window of a span at once"""
+    index: Dict[int, int] = {}
+    offsets = range(0, len(base) - block_size + 1, stride)
+    for i in range(0, len(offsets), _INDEX_BATCH):
+        batch = offsets[i:i + _INDEX_BATCH]
+        for offset, key in zip(batch, _block_hashes(base, batch, block_size).tolist()):
+            index.setdefault(key, offset)
+    if not index:
+        return lambda i, limit: None
+    keys = numpy.sort(numpy.fromiter(index, dtype=numpy.uint64, count=len(index)))
+    # Most windows match no block; a table on the low hash bits rules them
+    # out before the (cache-unfriendly) binary search over every key
+    bits = max(10, (len(keys) * 16).bit_length())
+    low = numpy.uint64((1 << bits) - 1)
+    present = numpy.zeros(1 << bits, dtype=bool)
+    present[keys & low] = True
+
+    def find(i: int, limit: int) -> Optional[Tuple[int, int]]:
+        # Matches usually resume right after a copy, so scan a little first
+        size = _SCAN_MIN
+        while i <= limit:
+            hi = min(limit + 1, i + size)
+            hashes = _window_hashes(target, i, hi, block_size)
+            candidates = numpy.flatnonzero(present[hashes & low])
+            if candidates.size:
+                slots = numpy.minimum(numpy.searchsorted(keys, hashes[candidates]), len(keys) - 1)
+                for hit in candidates[keys[slots] == hashes[candidates]].tolist():
+                    t = i + hit
+                    offset = index[int(hashes[hit])]
+                    if base[offset:offset + block_size] == target[t:t + block_size]:
+                        return t, offset
+            i = hi
+            size = min(size * 2, _HASH_SPAN)
+        return None
+
+    return find
+
+
+def encode_delta_to(write: Callable[[bytes], object], base, target, block_size: int = 32,
+                    max_literal: Optional[int] = None, max_blocks: Optional[int] = None) -> Optional[int]:
+    """Encode ``target`` as COPY/INSERT ops against ``base``, passing the payload to ``write``.
+
+    ``base`` and ``target`` may be any byte buffers (bytes, mmap). At most
+    ``max_blocks`` blocks of the base are indexed, evenly spaced, so the
+    index stays bounded for large files at the cost of missing matches
+    shorter than the spacing. With numpy and a power-of-two block size the
+    search for matching blocks runs over whole spans of the target at a
+    time. Ops are compressed as they are produced. Returns the payload
+    size, or None once more than ``max_literal`` bytes would have to be
+    inserted verbatim, which bounds the work spent on dissimilar files.
+    """
+    stride = block_size
+    if max_blocks and len(base) // block_size > max_blocks:
+        stride = -(-len(base) // max_blocks)
+    if numpy is not None and not block_size & (block_size - 1):
+        find = _block_finder_vectorized(base, target, block_size, stride)
+    else:
+        find = _block_finder(base, target, block_size, stride)
+
+    compressor = zlib.compressobj(6)
+    written = 0
+    ops = bytearray(_MAGIC)
+    _write_varint(ops, len(target))
+    literal_total = 0
+    literal_start = 0
+    i = 0
+    end = len(target) - block_size
+
+    def emit() -> None:
+        nonlocal written
+        if len(ops) >= _OPS_BUFFER:
+            data = compressor.compress(bytes(ops))
+            ops.clear()
+            if data:
+                write(data)
+                written += len(data)
+
+    def flush_literal(upto: int) -> None:
+        for run_start in range(literal_start, upto, _OPS_BUFFER):
+            run_end = min(upto, run_start + _OPS_BUFFER)
+            ops.append(_OP_INSERT)
+            _write_varint(ops, run_end - run_start)
+            ops.extend(target[run_start:run_end])
+            emit()
+
+    while i <= end:
+        limit = end
+        if max_literal is not None:
+            # Any later match leaves a literal run longer than allowed
+            limit = min(end, literal_start + max_literal - literal_total)
+        found = find(i, limit)
+        if found is None:
+            if limit < end:
+                return None
+            break
+        i, base_offset = found
+
+        # Grow the match backwards into the pending literal run, then forwards
+        back = 0
+        while i - back > literal_start and base_offset - back > 0 and \
+                target[i - back - 1] == base[base_offset - back - 1]:
+            back += 1
+        start, base_start = i - back, base_offset - back
+        length = back + _forward_match(base, base_offset, target, i)
+
+        literal_total += start - literal_start
+        flush_literal(start)
+        ops.append(_OP_COPY)
+        _write_varint(ops, base_start)
+        _write_varint(ops, length)
+        emit()
+        i = literal_start = start + length
+
+    literal_total += len(target) - literal_start
+    if max_literal is not None and literal_total > max_literal:
+        return None
+    flush_literal(len(target))
+    data = compressor.compress(bytes(ops)) + compressor.flush()
+    write(data)
+    return written + len(data)
+
+
+def encode_delta(base, target, block_size: int = 32, max_literal: Optional[int] = None,
+                 max_blocks: Optional[int] = None) -> Optional[bytes]:
+    """``encode_delta_to`` collecting the payload in memory"""
+    parts: List[bytes] = []
+    if encode_delta_to(parts.append, base, target, block_size, max_literal, max_blocks) is None:
+        return None
+    return b"".join(parts)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild the target from its base and an ``encode_delta`` payload"""
+    data = zlib.decompress(delta)
+    if data[:4] != _MAGIC:
+        raise ValueError("Not a delta payload")
+    size, pos = _read_varint(data, 4)
+    out = bytearray()
+    while pos < len(data):
+        op = data[pos]
+        pos += 1
+        if op == _OP_COPY:
+            offset, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            out += base[offset:offset + length]
+        elif op == _OP_INSERT:
+            length, pos = _read_varint(data, pos)
+            out += data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f"Unknown delta op {op}")
+    if len(out) != size:
+        raise ValueError("Delta produced wrong size")
+    return bytes(out)
+
+
+# -- Rebuilt version cache -----------------------------------------------
+
+class _VersionCache:
+    """Byte-bounded LRU of fully rebuilt file contents"""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size = 0
+        self._items: "OrderedDict[uuid.UUID, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: uuid.UUID) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: uuid.UUID, data: bytes) -> None:
+        # One large version would push out everything else
+        if len(data) > min(self.max_bytes, self.max_entry_bytes):
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+_cache = _VersionCache(settings.delta_cache_bytes, settings.delta_cache_entry_bytes)
+
+
+def _trim_spilled(root: str, max_bytes: int) -> None:
+    """Remove the least recently used versions on disk until ``root`` fits ``max_bytes``"""
+    versions = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            versions.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in versions)
+    # A path just handed to a download is opened within moments; an open
+    # file can be unlinked safely
+    recent = time.time() - _SPILL_MIN_AGE
+    for mtime, size, path in sorted(versions):
+        if total <= max_bytes or mtime >= recent:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+# -- Store ---------------------------------------------------------------
+
+class DeltaStore:
+    """Re-encodes committed files as deltas and rebuilds them on read"""
+
+    def __init__(self, db: Session, chunk_store: Optional[ChunkStore] = None):
+        self.db = db
+        self.chunk_store = chunk_store or ChunkStore()
+        self.root = os.path.join(settings.storage_path, "deltas")
+        self.versions_root = os.path.join(settings.storage_path, "versions")
+
+    def delta_path(self, delta_hash: str) -> str:
+        return os.path.join(self.root, delta_hash[:2], delta_hash)
+
+    def spilled_path(self, content_hash: str) -> str:
+        return os.path.join(self.versions_root, content_hash[:2], content_hash)
+
+    def read_file(self, file: File) -> bytes:
+        """Full content of a chunked or delta-stored file"""
+        cached = _cache.get(file.id)
+        if cached is None:
+            cached = self._read_spilled(file)
+        if cached is not None:
+            return cached
+
+        # Walk back to the nearest keyframe or cached version, then replay
+        chain: List[FileDelta] = []
+        current = file
+        base_content = None
+        while current.storage_path.startswith(DELTA_SCHEME):
+            delta = self.db.query(FileDelta).filter(FileDelta.file_id == current.id).one()
+            chain.append(delta)
+            current = self.db.query(File).filter(File.id == delta.base_file_id).one()
+            base_content = _cache.get(current.id)
+            if base_content is None and current.storage_path.startswith(DELTA_SCHEME):
+                base_content = self._read_spilled(current)
+            if base_content is not None:
+                break
+        if base_content is None:
+            base_content = b"".join(self.chunk_store.iter_file(self.db, current))
+
+        content = base_content
+        for delta in reversed(chain):
+            with open(self.delta_path(delta.delta_hash), "rb") as f:
+                content = apply_delta(content, f.read())
+            _cache.put(delta.file_id, content)
+        if not chain:
+            _cache.put(file.id, content)
+        return content
+
+    def version_path(self, file: File) -> str:
+        """A file on disk holding the full content of delta-stored ``file``.
+
+        For versions over ``delta_cache_entry_bytes``, which the memory cache
+        does not keep: the chain is replayed once and its result written
+        under ``versions/``, so later downloads and Range requests read that
+        instead of rebuilding the version each time.
+        """
+        path = self.spilled_path(file.content_hash)
+        try:
+            os.utime(path)  # Recently used, so trimmed last
+            return path
+        except FileNotFoundError:
+            pass
+
+        content = self.read_file(file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(content)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        _trim_spilled(self.versions_root, settings.delta_spill_bytes)
+        return path
+
+    def encode_commit(self, commit: Commit) -> List[Tuple[uuid.UUID, int, int]]:
+        """Re-encode the commit's changed files as deltas against its parent.
+
+        Returns (file_id, full_size, delta_size) for each file converted.
+        """
+        if not commit.parent_commit_id:
+            return []
+
+        # Only paths modified since the parent can gain a delta
+        trees = TreeStore(self.db)
+        parent = self.db.query(Commit).filter(Commit.id == commit.parent_commit_id).one()
+        changes, _ = trees.diff(trees.ensure_tree(parent), trees.ensure_tree(commit))
+        converted = []
+        for change in changes:
+            if change.status != "modified" or change.old.file_id == change.new.file_id:
+                continue
+            result = self.encode_file(change.new.file_id, change.old.file_id)
+            if result:
+                converted.append(result)
+        return converted
+
+    def encode_file(self, file_id: uuid.UUID, base_id: uuid.UUID) -> Optional[Tuple[uuid.UUID, int, int]]:
+        """Store ``file_id`` as a delta against ``base_id`` if that saves enough space"""
+        file = self.db.query(File).filter(File.id == file_id).one()
+        if not file.storage_path.startswith(CHUNKED_SCHEME):
+            return None  # Already a delta, or stored by some other means
+
+        base = self.db.query(File).filter(File.id == base_id).one()
+        base_delta = self.db.query(FileDelta).filter(FileDelta.file_id == base.id).first()
+        depth = base_delta.depth + 1 if base_delta else 1
+        if depth >= settings.delta_keyframe_interval:
+            return None  # Leave this version whole as the next keyframe
+        if self._in_chain(base, file.id):
+            return None
+
+        # The payload goes straight to disk; it is hashed on the way
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out, self._content(base) as base_content, self._content(file) as target:
+                def write(data: bytes) -> None:
+                    digest.update(data)
+                    out.write(data)
+
+                full_size = len(target)
+                max_size = full_size * (1 - settings.delta_min_savings)
+                delta_size = encode_delta_to(
+                    write, base_content, target,
+                    settings.delta_block_size, int(max_size), settings.delta_index_blocks
+                )
+            if delta_size is None or delta_size > max_size:
+                return None
+            delta_hash = digest.hexdigest()
+            self._store_blob(delta_hash, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        self.db.add(FileDelta(
+            file_id=file.id,
+            base_file_id=base.id,
+            depth=depth,
+            delta_hash=delta_hash,
+            delta_size=delta_size
+        ))
+        # The File row is shared by every project with this content, so all of
+        # them now read it through ``base``; garbage collection keeps a File
+        # while any delta is based on it. The chunks stay on disk until
+        # collection finds them unused.
+        self.db.query(FileChunk).filter(FileChunk.file_id == file.id).delete(synchronize_session=False)
+        file.storage_path = DELTA_SCHEME + file.content_hash
+        return file.id, full_size, delta_size
+
+    @contextmanager
+    def _content(self, file: File):
+        """A file's content as a buffer; chunked content is mapped from a temporary file"""
+        if not file.storage_path.startswith(CHUNKED_SCHEME):
+            yield self.read_file(file)
+            return
+        # Unlinked on creation; pages are read in as the encoder reaches them
+        with tempfile.TemporaryFile(dir=self.root) as f:
+            for data in self.chunk_store.iter_file(self.db, file):
+                f.write(data)
+            if not f.tell():
+                yield b""
+                return
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                yield view
+
+    def _read_spilled(self, file: File) -> Optional[bytes]:
+        """Content of a version ``version_path`` already wrote to disk"""
+        if not file.storage_path.startswith(DELTA_SCHEME):
+            return None
+        try:
+            with open(self.spilled_path(file.content_hash), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _in_chain(self, base: File, file_id: uuid.UUID) -> bool:
+        """Whether ``file_id`` already sits in ``base``'s delta chain"""
+        current_id = base.id
+        for _ in range(settings.delta_keyframe_interval):
+            if current_id == file_id:
+                return True
+            delta = self.db.query(FileDelta.base_file_id).filter(FileDelta.file_id == current_id).first()
+            if not delta:
+                return False
+            current_id = delta[0]
+        return False
+
+    def _store_blob(self, delta_hash: str, tmp_path: str) -> None:
+        """Move a fully written payload into place unless the same one is stored"""
+        path = self.delta_path(delta_hash)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+
+def encode_commit_deltas(commit_id: str) -> dict:
+    """Job handler: delta-encode a freshly recorded commit in its own session"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        converted = []
+        commit = db.query(Commit).filter(Commit.id == uuid.UUID(str(commit_id))).first()
+        if commit:
+            converted = DeltaStore(db).encode_commit(commit)
+            db.commit()
+        return {
+            "files": len(converted),
+            "saved_bytes": sum(full - delta for _, full, delta in converted),
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,269 @@
+"""Live project updates pushed to clients as Server-Sent Events.
+
+Changes are recorded as ProjectEvent rows by ``EventLog`` in the same
+transaction as the change, so an event exists exactly when its change
+does and every process sees it. Its id is the SSE event id: a client
+that reconnects with ``Last-Event-ID`` is replayed what it missed from
+the table, up to ``event_replay_limit`` events, after which it is told
+to reload instead.
+
+Live delivery does not touch the database per subscriber. Each process
+has one ``EventBroadcaster`` that polls for new rows every
+``event_poll_seconds`` (immediately after a local commit calls
+``notify``) and fans them out to in-memory subscriptions, so an idle
+stream costs a coroutine and a keepalive now and then.
+"""
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import AsyncIterator, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import time
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.metrics import EVENT_SUBSCRIBERS, EVENTS_SENT
+from app.models.project import Branch, Commit, Project, ProjectEvent
+
+_FETCH_BATCH = 500
+# An id skipped by the poller may belong to a transaction that has not
+# committed yet (PostgreSQL sequences are not transactional); it is looked
+# for again until this many seconds have passed
+_GAP_SECONDS = 10.0
+_MAX_GAPS = 1000
+
+
+class Event(NamedTuple):
+    id: int
+    project_id: uuid.UUID
+    type: str
+    data: dict
+    created_at: Optional[datetime]
+
+
+def _event(row: ProjectEvent) -> Event:
+    return Event(row.id, row.project_id, row.type, row.data or {}, row.created_at)
+
+
+def format_event(event: Event) -> str:
+    """The event as an SSE message"""
+    data = {
+        "project_id": str(event.project_id),
+        "created_at": event.created_at.isoformat() if event.created_at else None,
+        **event.data
+    }
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventLog:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record(self, project_id: uuid.UUID, type: str, data: dict) -> ProjectEvent:
+        """Add an event to the session's transaction; ``data`` must be JSON"""
+        event = ProjectEvent(project_id=project_id, type=type, data=data)
+        self.db.add(event)
+        return event
+
+    def commit_created(self, commit: Commit, previous_head: Optional[uuid.UUID], new_branch: bool) -> None:
+        """Events for a recorded commit and the branch head it moved"""
+        self.record(commit.project_id, "commit.created", {
+            "commit_id": str(commit.id),
+            "branch": commit.branch_name,
+            "author": commit.author,
+            "message": commit.message,
+            "parent_commit_id": str(commit.parent_commit_id) if commit.parent_commit_id else None,
+        })
+        self.record(commit.project_id, "branch.created" if new_branch else "branch.updated", {
+            "branch": commit.branch_name,
+            "head_commit_id": str(commit.id),
+            "previous_head_commit_id": str(previous_head) if previous_head else None,
+        })
+
+    def project_created(self, project: Project, branches: List[Branch]) -> None:
+        self.record(project.id, "project.created", {
+            "name": project.name,
+            "description": project.description,
+            "branches": [branch.name for branch in branches],
+        })
+
+    def project_deleted(self, project_id: uuid.UUID) -> None:
+        self.record(project_id, "project.deleted", {})
+
+
+async def replay(project_id: Optional[uuid.UUID], after: int) -> Tuple[List[Event], bool]:
+    """Events after ``after``, and whether that is all of them.
+
+    Incomplete when more than ``event_replay_limit`` were missed or older
+    events have already been trimmed.
+    """
+    from app.database import AsyncReadSessionLocal
+
+    async with AsyncReadSessionLocal() as db:
+        query = select(ProjectEvent).where(ProjectEvent.id > after)
+        if project_id is not None:
+            query = query.where(ProjectEvent.project_id == project_id)
+        rows = (await db.execute(
+            query.order_by(ProjectEvent.id).limit(settings.event_replay_limit + 1)
+        )).scalars().all()
+        oldest = (await db.execute(select(func.min(ProjectEvent.id)))).scalar()
+
+    events = [_event(row) for row in rows[:settings.event_replay_limit]]
+    trimmed = oldest is not None and after < oldest - 1
+    return events, len(rows) <= settings.event_replay_limit and not trimmed
+
+
+class Subscription:
+    """Events waiting to be written to one stream"""
+
+    __slots__ = ("project_id", "events", "ready", "overflowed")
+
+    def __init__(self, project_id: Optional[uuid.UUID]):
+        self.project_id = project_id
+        self.events: Deque[Event] = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, event: Event) -> None:
+        if len(self.events) >= settings.event_queue_size:
+            # Dropped rather than buffered without bound; the client resumes
+            self.overflowed = True
+        else:
+            self.events.append(event)
+        self.ready.set()
+
+
+class EventBroadcaster:
+    """Polls for new events and hands them to this process's subscriptions"""
+
+    def __init__(self):
+        # project id -> subscriptions; None holds subscriptions to every project
+        self.subscriptions: Dict[Optional[uuid.UUID], Set[Subscription]] = defaultdict(set)
+        self.cursor: Optional[int] = None
+        self.gaps: Dict[int, float] = {}
+        self.wake: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.starting: Optional[asyncio.Lock] = None
+
+    async def subscribe(self, project_id: Optional[uuid.UUID]) -> Subscription:
+        if self.cursor is None:
+            if self.starting is None:
+                self.starting = asyncio.Lock()
+            async with self.starting:
+                # One query for a burst of first subscribers, not one each
+                if self.cursor is None:
+                    self.cursor = await self._latest_id()
+        subscription = Subscription(project_id)
+        self.subscriptions[project_id].add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        if self.task is None or self.task.done():
+            self.wake = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscriptions.get(subscription.project_id)
+        if subscribers is not None and subscription in subscribers:
+            subscribers.discard(subscription)
+            EVENT_SUBSCRIBERS.dec()
+            if not subscribers:
+                del self.subscriptions[subscription.project_id]
+
+    def notify(self) -> None:
+        """Look for new events now; call after committing some"""
+        if self.wake is not None:
+            self.wake.set()
+
+    async def _run(self) -> None:
+        while self.subscriptions:
+            try:
+                await asyncio.wait_for(self.wake.wait(), settings.event_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                events = await self._fetch()
+            except Exception:
+                continue  # Database unavailable; subscribers catch up on the next poll
+            for event in events:
+                for key in (event.project_id, None):
+                    for subscription in self.subscriptions.get(key, ()):
+                        subscription.push(event)
+        # Nobody listening: start again from the newest event next time
+        self.cursor = None
+        self.gaps.clear()
+
+    async def _latest_id(self) -> int:
+        from app.database import AsyncReadSessionLocal
+
+        async with AsyncReadSessionLocal() as db:
+            return (await db.execute(select(func.max(ProjectEvent.id)))).scalar() or 0
+
+    async def _fetch(self) -> List[Event]:
+        from app.database import AsyncReadSessionLocal
+
+        now = time.monotonic()
+        self.gaps = {event_id: until for event_id, until in self.gaps.items() if until > now}
+        async with AsyncReadSessionLocal() as db:
+            rows = list((await db.execute(
+                select(ProjectEvent).where(ProjectEvent.id > self.cursor).order_by(ProjectEvent.id).limit(_FETCH_BATCH)
+            )).scalars())
+            if self.gaps:
+                rows += (await db.execute(
+                    select(ProjectEvent).where(ProjectEvent.id.in_(list(self.gaps)))
+                )).scalars()
+
+        fresh = [row for row in rows if row.id > self.cursor]
+        expected = self.cursor + 1
+        for row in fresh:
+            for missing in range(expected, min(row.id, expected + _MAX_GAPS)):
+                self.gaps[missing] = now + _GAP_SECONDS
+            expected = row.id + 1
+        for row in rows:
+            self.gaps.pop(row.id, None)
+        if fresh:
+            self.cursor = fresh[-1].id
+        return sorted((_event(row) for row in rows), key=lambda e: e.id)
+
+
+broadcaster = EventBroadcaster()
+
+
+async def event_stream(project_id: Optional[uuid.UUID], after: Optional[int]) -> AsyncIterator[str]:
+    """SSE messages for one client: the events it missed, then live ones"""
+    subscription = await broadcaster.subscribe(project_id)
+    try:
+        yield f"retry: {settings.event_retry_ms}\n\n"
+        replayed = 0
+        if after is not None:
+            events, complete = await replay(project_id, after)
+            if not complete:
+                # Too much to replay; the client should reload its state
+                reset_id = max(broadcaster.cursor or 0, after)
+                yield f"id: {reset_id}\nevent: reset\ndata: {{}}\n\n"
+                events, replayed = [], reset_id
+            for event in events:
+                replayed = event.id
+                yield format_event(event)
+            EVENTS_SENT.inc(len(events))
+
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), settings.event_keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            subscription.ready.clear()
+            if subscription.overflowed:
+                return  # The client reconnects and is replayed what it missed
+            while subscription.events:
+                event = subscription.events.popleft()
+                if event.id <= replayed:
+                    continue  # Already sent by the replay
+                yield format_event(event)
+                EVENTS_SENT.inc()
+    finally:
+        broadcaster.unsubscribe(subscription)
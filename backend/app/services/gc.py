@@ -0,0 +1,468 @@
+"""Garbage collection of storage no commit references any more.
+
+Deleting a project removes its commits but leaves everything they shared
+through content addressing: trees, reference graphs, Files, their chunks
+and delta blobs. ``GarbageCollector`` finds what is no longer reachable
+and removes it in phases, from the top down, so each phase can only
+orphan rows a later phase collects:
+
+1. pending uploads idle past ``upload_session_ttl_seconds`` expire and
+   their part files are removed, as do deferred ones whose ingest job
+   never finished;
+2. trees and reference graphs not reachable from any commit are deleted;
+3. Files used by no tree, legacy CommitFile row or delta are deleted with
+   their chunk lists, references, delta blobs and rebuilt versions on
+   disk, then the previews of content no File has any more;
+4. chunks used by no File are deleted from the database and from disk;
+5. jobs finished more than ``job_retention_seconds`` ago and project
+   events older than ``event_retention_seconds`` are deleted.
+
+Every phase deletes at most ``gc_batch_size`` rows per transaction, so a
+collection never holds a lock for long and uploads and commits keep
+running alongside it. Nothing written or reused within the last
+``gc_grace_seconds`` is collected: TreeStore and ReferenceIndex touch the
+trees and graphs they reuse, the chunk and delta stores refresh the mtime
+of blobs they find already on disk, and the deletes recheck that a row is
+still unreferenced in the same statement.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set
+import os
+import re
+import shutil
+import time
+
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import (
+    Chunk, Commit, CommitFile, File, FileChunk, FileDelta, FilePreview, FileReference,
+    Job, ProjectEvent, ReferenceEdge, ReferenceGraph, Tree, TreeEntry, UploadSession
+)
+from app.services.chunk_store import ChunkStore
+from app.services.delta_store import DELTA_SCHEME, DeltaStore
+from app.services.previews import preview_directory
+from app.services.tree_store import TREE
+
+_QUERY_BATCH = 500
+_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+_PART_NAME = re.compile(r"^([0-9a-f-]{36})\.part$")
+
+
+def _batches(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class GarbageCollector:
+    def __init__(
+        self,
+        db: Session,
+        grace_seconds: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        dry_run: bool = False
+    ):
+        self.db = db
+        self.grace_seconds = settings.gc_grace_seconds if grace_seconds is None else grace_seconds
+        self.batch_size = batch_size or settings.gc_batch_size
+        self.dry_run = dry_run
+        self.chunk_store = ChunkStore()
+        self.delta_store = DeltaStore(db, self.chunk_store)
+
+    def collect(self, scan_disk: bool = False) -> dict:
+        """Run every phase once and report what was (or would be) removed.
+
+        ``scan_disk`` also walks the chunk, delta and upload directories for
+        files without a database row, such as blobs left behind by a crash
+        between writing a chunk and recording its File.
+        """
+        started = time.perf_counter()
+        self.cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        self.report: Dict[str, int] = defaultdict(int)
+
+        self._expire_uploads()
+        self._sweep_trees()
+        self._sweep_reference_graphs()
+        self._sweep_files()
+        self._sweep_previews()
+        self._sweep_chunks()
+        self._sweep_jobs()
+        self._sweep_events()
+        if scan_disk:
+            self._sweep_disk()
+
+        report = {key: self.report[key] for key in (
+            "expired_uploads", "trees", "reference_graphs", "files", "previews", "chunks",
+            "delta_blobs", "orphan_files", "jobs", "events", "reclaimed_bytes"
+        )}
+        report["dry_run"] = self.dry_run
+        report["seconds"] = round(time.perf_counter() - started, 6)
+        return report
+
+    # -- Uploads ---------------------------------------------------------
+
+    def _expire_uploads(self) -> None:
+        from app.services.upload_service import forget_progress, part_path
+
+        expiry = datetime.now(timezone.utc) - timedelta(seconds=settings.upload_session_ttl_seconds)
+        stale = self.db.query(UploadSession).filter(
+            UploadSession.status.in_(("pending", "processing")),
+            func.coalesce(UploadSession.updated_at, UploadSession.created_at) < expiry
+        )
+        if self.dry_run:
+            for session in stale:
+                self.report["expired_uploads"] += 1
+                self.report["reclaimed_bytes"] += self._size(part_path(session))
+            return
+
+        while True:
+            sessions = stale.limit(self.batch_size).all()
+            if not sessions:
+                break
+            for session in sessions:
+                session.status = "expired"
+            self.db.commit()
+            for session in sessions:
+                forget_progress(session.id)
+                self.report["expired_uploads"] += 1
+                self.report["reclaimed_bytes"] += self._unlink(part_path(session))
+
+    # -- Trees and reference graphs --------------------------------------
+
+    def _sweep_trees(self) -> None:
+        marked_at = datetime.now(timezone.utc)
+        live = {h for (h,) in self.db.query(Commit.tree_hash).filter(Commit.tree_hash.isnot(None)).distinct()}
+        live.update(h for (h,) in self.db.query(Tree.hash).filter(Tree.touched_at >= self.cutoff))
+        # Mark: everything below a live root, one query per directory level
+        level = list(live)
+        while level:
+            found = set()
+            for batch in _batches(level, _QUERY_BATCH):
+                found.update(h for (h,) in self.db.query(TreeEntry.object_hash).filter(
+                    TreeEntry.tree_hash.in_(batch),
+                    TreeEntry.kind == TREE
+                ))
+            level = [h for h in found if h not in live]
+            live.update(level)
+
+        dead = [h for (h,) in self.db.query(Tree.hash) if h not in live]
+        if self.dry_run:
+            self.report["trees"] += len(dead)
+            return
+        # A commit that reuses a tree touches only that tree, not the
+        # subtrees below it; anything reachable from a tree touched since the
+        # mark is kept, checked in the delete itself so nothing slips between
+        fresh = select(Tree.hash).where(Tree.touched_at >= marked_at).cte("fresh", recursive=True, nesting=True)
+        fresh = fresh.union(
+            select(TreeEntry.object_hash).join(fresh, TreeEntry.tree_hash == fresh.c.hash).where(TreeEntry.kind == TREE)
+        )
+        for batch in _batches(dead, self.batch_size):
+            # The tree rows go first: the touched_at check is what keeps a
+            # tree a concurrent commit has just reused
+            deleted = self.db.query(Tree).filter(
+                Tree.hash.in_(batch),
+                Tree.touched_at < self.cutoff,
+                Tree.hash.notin_(select(fresh.c.hash))
+            ).delete(synchronize_session=False)
+            self.db.query(TreeEntry).filter(
+                TreeEntry.tree_hash.in_(batch),
+                ~exists().where(Tree.hash == TreeEntry.tree_hash)
+            ).delete(synchronize_session=False)
+            self.db.commit()
+            self.report["trees"] += deleted
+
+    def _sweep_reference_graphs(self) -> None:
+        live = {h for (h,) in self.db.query(Commit.reference_graph_hash).filter(
+            Commit.reference_graph_hash.isnot(None)
+        ).distinct()}
+        dead = [h for (h,) in self.db.query(ReferenceGraph.hash).filter(
+            ReferenceGraph.touched_at < self.cutoff
+        ) if h not in live]
+        if self.dry_run:
+            self.report["reference_graphs"] += len(dead)
+            return
+        for batch in _batches(dead, self.batch_size):
+            deleted = self.db.query(ReferenceGraph).filter(
+                ReferenceGraph.hash.in_(batch),
+                ReferenceGraph.touched_at < self.cutoff,
+                ~exists().where(Commit.reference_graph_hash == ReferenceGraph.hash)
+            ).delete(synchronize_session=False)
+            self.db.query(ReferenceEdge).filter(
+                ReferenceEdge.graph_hash.in_(batch),
+                ~exists().where(ReferenceGraph.hash == ReferenceEdge.graph_hash)
+            ).delete(synchronize_session=False)
+            self.db.commit()
+            self.report["reference_graphs"] += deleted
+
+    # -- Files -----------------------------------------------------------
+
+    def _unreferenced_files(self):
+        """Condition on File: old enough and used by nothing"""
+        return and_(
+            File.created_at < self.cutoff,
+            ~exists().where(TreeEntry.file_id == File.id),
+            ~exists().where(CommitFile.file_id == File.id),
+            # A File is one row for its content in every project, and a
+            # delta-stored one is readable only through its base. Keeping
+            # every base keeps each chain whole, whichever projects still
+            # use its versions and whichever project's commit encoded it.
+            ~exists().where(FileDelta.base_file_id == File.id),
+            # Uploaded recently, presumably for a commit still to come
+            ~exists().where(and_(
+                UploadSession.file_id == File.id,
+                UploadSession.updated_at >= self.cutoff
+            ))
+        )
+
+    def _sweep_files(self) -> None:
+        if self.dry_run:
+            self.report["files"] += self.db.query(func.count(File.id)).filter(self._unreferenced_files()).scalar()
+            return
+
+        while True:
+            batch = [file_id for (file_id,) in self.db.query(File.id).filter(
+                self._unreferenced_files()
+            ).limit(self.batch_size).with_for_update(skip_locked=True)]
+            if not batch:
+                break
+            doomed = select(File.id).where(File.id.in_(batch), self._unreferenced_files())
+            # The first write locks out concurrent commits on SQLite, so the
+            # set re-read below is exactly the one whose chunk lists went
+            self.db.query(FileChunk).filter(FileChunk.file_id.in_(doomed)).delete(synchronize_session=False)
+            ids = [file_id for (file_id,) in self.db.execute(doomed)]
+            if not ids:
+                self.db.commit()
+                break
+
+            delta_hashes = {h for (h,) in self.db.query(FileDelta.delta_hash).filter(FileDelta.file_id.in_(ids))}
+            spilled = [h for (h,) in self.db.query(File.content_hash).filter(
+                File.id.in_(ids), File.storage_path.startswith(DELTA_SCHEME)
+            )]
+            self.db.query(FileDelta).filter(FileDelta.file_id.in_(ids)).delete(synchronize_session=False)
+            self.db.query(FileReference).filter(FileReference.file_id.in_(ids)).delete(synchronize_session=False)
+            self.db.query(UploadSession).filter(UploadSession.file_id.in_(ids)).update(
+                {UploadSession.file_id: None}, synchronize_session=False
+            )
+            self.db.query(File).filter(File.id.in_(ids)).delete(synchronize_session=False)
+            # Delta blobs are content addressed too; keep any another File still uses
+            still_used = {h for (h,) in self.db.query(FileDelta.delta_hash).filter(
+                FileDelta.delta_hash.in_(delta_hashes)
+            )} if delta_hashes else set()
+            self.db.commit()
+
+            self.report["files"] += len(ids)
+            for content_hash in spilled:
+                self.report["reclaimed_bytes"] += self._unlink(self.delta_store.spilled_path(content_hash))
+            for delta_hash in delta_hashes - still_used:
+                freed = self._unlink(self.delta_store.delta_path(delta_hash))
+                if freed:
+                    self.report["delta_blobs"] += 1
+                    self.report["reclaimed_bytes"] += freed
+            if len(ids) < len(batch):
+                break  # The rest became referenced since it was selected
+
+    # -- Previews --------------------------------------------------------
+
+    def _sweep_previews(self) -> None:
+        orphaned = and_(
+            FilePreview.updated_at < self.cutoff,
+            ~exists().where(File.content_hash == FilePreview.content_hash)
+        )
+        while True:
+            batch = [h for (h,) in self.db.query(FilePreview.content_hash).filter(orphaned).limit(self.batch_size)]
+            if not batch or self.dry_run:
+                for content_hash in batch:
+                    self.report["previews"] += 1
+                    self.report["reclaimed_bytes"] += self._tree_size(preview_directory(content_hash))
+                return
+            self.db.query(FilePreview).filter(
+                FilePreview.content_hash.in_(batch), orphaned
+            ).delete(synchronize_session=False)
+            kept = {h for (h,) in self.db.query(FilePreview.content_hash).filter(FilePreview.content_hash.in_(batch))}
+            self.db.commit()
+
+            for content_hash in batch:
+                if content_hash in kept:
+                    continue
+                directory = preview_directory(content_hash)
+                self.report["previews"] += 1
+                self.report["reclaimed_bytes"] += self._tree_size(directory)
+                shutil.rmtree(directory, ignore_errors=True)
+            if kept:
+                break
+
+    # -- Chunks ----------------------------------------------------------
+
+    def _sweep_chunks(self) -> None:
+        unused = and_(
+            Chunk.created_at < self.cutoff,
+            ~exists().where(FileChunk.chunk_hash == Chunk.hash)
+        )
+        if self.dry_run:
+            count, size = self.db.query(func.count(Chunk.hash), func.coalesce(func.sum(Chunk.size), 0)).filter(
+                unused
+            ).one()
+            self.report["chunks"] += count
+            self.report["reclaimed_bytes"] += size
+            return
+
+        while True:
+            batch = [h for (h,) in self.db.query(Chunk.hash).filter(unused).limit(self.batch_size)]
+            if not batch:
+                break
+            self.db.query(Chunk).filter(Chunk.hash.in_(batch), unused).delete(synchronize_session=False)
+            kept = {h for (h,) in self.db.query(Chunk.hash).filter(Chunk.hash.in_(batch))}
+            self.db.commit()
+
+            for chunk_hash in batch:
+                if chunk_hash in kept:
+                    continue
+                self.report["chunks"] += 1
+                # A chunk an upload has just found on disk again is left for
+                # that upload to record; the disk scan collects it otherwise
+                self.report["reclaimed_bytes"] += self._unlink(self.chunk_store.chunk_path(chunk_hash), self.cutoff)
+            if kept:
+                break
+
+    # -- Jobs and events -------------------------------------------------
+
+    def _sweep_jobs(self) -> None:
+        expiry = datetime.now(timezone.utc) - timedelta(seconds=settings.job_retention_seconds)
+        finished = and_(Job.status.in_(("succeeded", "failed")), Job.finished_at < expiry)
+        if self.dry_run:
+            self.report["jobs"] += self.db.query(func.count(Job.id)).filter(finished).scalar()
+            return
+        while True:
+            batch = [job_id for (job_id,) in self.db.query(Job.id).filter(finished).limit(self.batch_size)]
+            if not batch:
+                break
+            self.db.query(Job).filter(Job.id.in_(batch)).delete(synchronize_session=False)
+            self.db.commit()
+            self.report["jobs"] += len(batch)
+
+    def _sweep_events(self) -> None:
+        expiry = datetime.now(timezone.utc) - timedelta(seconds=settings.event_retention_seconds)
+        old = ProjectEvent.created_at < expiry
+        if self.dry_run:
+            self.report["events"] += self.db.query(func.count(ProjectEvent.id)).filter(old).scalar()
+            return
+        while True:
+            batch = [event_id for (event_id,) in self.db.query(ProjectEvent.id).filter(old).limit(self.batch_size)]
+            if not batch:
+                break
+            self.db.query(ProjectEvent).filter(ProjectEvent.id.in_(batch)).delete(synchronize_session=False)
+            self.db.commit()
+            self.report["events"] += len(batch)
+
+    # -- Disk ------------------------------------------------------------
+
+    def _sweep_disk(self) -> None:
+        cutoff = self.cutoff
+        self._sweep_directory(self.chunk_store.root, cutoff, lambda names: {
+            h for (h,) in self.db.query(Chunk.hash).filter(Chunk.hash.in_(names))
+        })
+        self._sweep_directory(self.delta_store.root, cutoff, lambda names: {
+            h for (h,) in self.db.query(FileDelta.delta_hash).filter(FileDelta.delta_hash.in_(names))
+        })
+
+        uploads = os.path.join(settings.storage_path, "uploads")
+        if not os.path.isdir(uploads):
+            return
+        parts = {}
+        for entry in os.scandir(uploads):
+            match = _PART_NAME.match(entry.name)
+            if match and self._older(entry.path, cutoff):
+                parts[match.group(1)] = entry.path
+        pending = set()
+        for batch in _batches(list(parts), _QUERY_BATCH):
+            pending.update(str(session_id) for (session_id,) in self.db.query(UploadSession.id).filter(
+                UploadSession.id.in_(batch),
+                UploadSession.status.in_(("pending", "processing"))
+            ))
+        for session_id, path in parts.items():
+            if session_id not in pending:
+                self._orphan(path, cutoff)
+
+    def _sweep_directory(self, root: str, cutoff: datetime, known) -> None:
+        """Remove files under ``root`` not named after a known hash, batch by batch"""
+        candidates: Dict[str, str] = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.startswith(".tmp-"):
+                    # Left behind by a write that never finished
+                    self._orphan(path, cutoff)
+                elif _HASH_NAME.match(name) and self._older(path, cutoff):
+                    candidates[name] = path
+                    if len(candidates) >= _QUERY_BATCH:
+                        self._remove_unknown(candidates, cutoff, known)
+                        candidates = {}
+        if candidates:
+            self._remove_unknown(candidates, cutoff, known)
+
+    def _remove_unknown(self, candidates: Dict[str, str], cutoff: datetime, known) -> None:
+        keep: Set[str] = known(list(candidates))
+        for name, path in candidates.items():
+            if name not in keep:
+                self._orphan(path, cutoff)
+
+    def _orphan(self, path: str, cutoff: datetime) -> None:
+        if self.dry_run:
+            if self._older(path, cutoff):
+                self.report["orphan_files"] += 1
+                self.report["reclaimed_bytes"] += self._size(path)
+            return
+        freed = self._unlink(path, cutoff)
+        if freed:
+            self.report["orphan_files"] += 1
+            self.report["reclaimed_bytes"] += freed
+
+    # -- Helpers ---------------------------------------------------------
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _tree_size(directory: str) -> int:
+        total = 0
+        for root, _, names in os.walk(directory):
+            total += sum(GarbageCollector._size(os.path.join(root, name)) for name in names)
+        return total
+
+    @staticmethod
+    def _older(path: str, cutoff: datetime) -> bool:
+        try:
+            return os.path.getmtime(path) < cutoff.timestamp()
+        except OSError:
+            return False
+
+    def _unlink(self, path: str, cutoff: Optional[datetime] = None) -> int:
+        """Remove a file, unless modified after ``cutoff``; returns the bytes freed"""
+        try:
+            stat = os.stat(path)
+            if cutoff is not None and stat.st_mtime >= cutoff.timestamp():
+                return 0
+            os.unlink(path)
+            return stat.st_size
+        except FileNotFoundError:
+            return 0
+
+
+def collect_garbage(dry_run: bool = False, scan_disk: bool = False) -> dict:
+    """Run a collection in a session of its own.
+
+    Walks the whole store, so async callers run it in the threadpool.
+    """
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return GarbageCollector(db, dry_run=dry_run).collect(scan_disk)
+    finally:
+        db.close()
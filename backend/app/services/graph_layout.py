@@ -0,0 +1,245 @@
+"""Server-side layout of the commit graph.
+
+Each branch owns a lane (row) and each commit sits in the column given by
+its generation, the longest parent path back to a root. Both are fixed
+when a commit is written: appending a commit only places that commit and,
+for a brand new branch, allocates one lane, so existing coordinates never
+move. Per-project layouts are cached in process and topped up in place
+with just the commits written since they were built, found by timestamp
+and, when that comes up short of the project's commit count, by id.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional
+import threading
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.project import Branch, Commit, CommitParent, Project
+from app.services.ancestry import parent_map
+
+# Matches the coordinates the React graph was hand-tuned for
+X_ORIGIN = 50
+X_STEP = 100
+Y_ORIGIN = 50
+LANE_HEIGHT = 70
+
+_MAX_CACHED_PROJECTS = 64
+
+
+class _ProjectLayout:
+    def __init__(self):
+        self.version = -1  # Project.commit_count the layout reflects
+        self.nodes: List[tuple] = []  # (generation, created_at, id, node), sorted
+        self.known = set()
+        self.last_created_at = None
+        # Held while commits are added and while a window of nodes is copied
+        # out, so a top-up extends the cached layout instead of a copy of it
+        self.lock = threading.Lock()
+
+
+_cache: "OrderedDict[uuid.UUID, _ProjectLayout]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class GraphLayout:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- Write path ------------------------------------------------------
+
+    def place_commit(self, commit: Commit, parent_ids: Optional[List[uuid.UUID]] = None) -> None:
+        """Assign generation, lane and coordinates to a new commit"""
+        if parent_ids is None:
+            parent_ids = [commit.parent_commit_id] if commit.parent_commit_id else []
+        generation = 0
+        if parent_ids:
+            parent_generation = self.db.query(func.max(Commit.generation)).filter(
+                Commit.id.in_(parent_ids)
+            ).scalar()
+            generation = (parent_generation or 0) + 1
+
+        lane = self._lane_for(commit.project_id, commit.branch_name)
+        commit.generation = generation
+        commit.graph_x = X_ORIGIN + X_STEP * generation
+        commit.graph_y = Y_ORIGIN + LANE_HEIGHT * lane
+
+    def relayout_project(self, project_id: uuid.UUID) -> None:
+        """Recompute every commit position of a project from scratch (backfill)"""
+        rows = self.db.query(Commit.id, Commit.branch_name).filter(
+            Commit.project_id == project_id
+        ).order_by(Commit.created_at, Commit.id).all()
+        parents = parent_map(self.db, project_id)
+
+        ids = {commit_id for commit_id, _ in rows}
+        pending: Dict[uuid.UUID, int] = {}
+        children: Dict[uuid.UUID, List[uuid.UUID]] = {}
+        for commit_id, _ in rows:
+            known_parents = [p for p in parents.get(commit_id, []) if p in ids]
+            pending[commit_id] = len(known_parents)
+            for parent_id in known_parents:
+                children.setdefault(parent_id, []).append(commit_id)
+
+        # Kahn's algorithm: a commit is placed once all of its parents are
+        generation: Dict[uuid.UUID, int] = {}
+        ready = [commit_id for commit_id, _ in rows if not pending[commit_id]]
+        for commit_id in ready:
+            generation[commit_id] = 0
+        while ready:
+            commit_id = ready.pop()
+            for child in children.get(commit_id, []):
+                generation[child] = max(generation.get(child, 0), generation[commit_id] + 1)
+                pending[child] -= 1
+                if not pending[child]:
+                    ready.append(child)
+
+        lanes: Dict[str, int] = {}
+        for _, branch_name in rows:
+            lanes.setdefault(branch_name, len(lanes))
+        for branch in self.db.query(Branch).filter(Branch.project_id == project_id):
+            branch.graph_lane = lanes.setdefault(branch.name, len(lanes))
+
+        self.db.bulk_update_mappings(Commit, [
+            {
+                "id": commit_id,
+                "generation": generation.get(commit_id, 0),
+                "graph_x": X_ORIGIN + X_STEP * generation.get(commit_id, 0),
+                "graph_y": Y_ORIGIN + LANE_HEIGHT * lanes[branch_name],
+            }
+            for commit_id, branch_name in rows
+        ])
+        with _cache_lock:
+            _cache.pop(project_id, None)
+
+    def _lane_for(self, project_id: uuid.UUID, branch_name: str) -> int:
+        self.db.flush()
+        branch = self.db.query(Branch).filter(
+            Branch.project_id == project_id,
+            Branch.name == branch_name
+        ).first()
+        if branch and branch.graph_lane is not None:
+            return branch.graph_lane
+
+        # First commit on this branch: take the next free lane
+        used = self.db.query(func.max(Branch.graph_lane)).filter(
+            Branch.project_id == project_id
+        ).scalar()
+        lane = 0 if used is None else used + 1
+        if branch:
+            branch.graph_lane = lane
+        return lane
+
+    # -- Read path -------------------------------------------------------
+
+    def project_graph(
+        self,
+        project_id: uuid.UUID,
+        from_generation: Optional[int] = None,
+        to_generation: Optional[int] = None
+    ) -> dict:
+        """Laid-out nodes for a project, optionally windowed by generation"""
+        layout = self._layout(project_id)
+        with layout.lock:
+            nodes = layout.nodes
+            lo = 0 if from_generation is None else bisect_left(nodes, (from_generation,))
+            hi = len(nodes) if to_generation is None else bisect_right(nodes, (to_generation + 1,))
+            window = [entry[3] for entry in nodes[lo:hi]]
+            total = len(nodes)
+            max_generation = nodes[-1][0] if nodes else 0
+
+        lanes = self.db.query(Branch.name, Branch.graph_lane, Branch.color).filter(
+            Branch.project_id == project_id,
+            Branch.graph_lane.isnot(None)
+        ).order_by(Branch.graph_lane)
+
+        return {
+            "nodes": window,
+            "lanes": [{"branch": name, "lane": lane, "color": color} for name, lane, color in lanes],
+            "total": total,
+            "max_generation": max_generation,
+        }
+
+    def _layout(self, project_id: uuid.UUID) -> _ProjectLayout:
+        version = self.db.query(Project.commit_count).filter(Project.id == project_id).scalar() or 0
+
+        with _cache_lock:
+            layout = _cache.get(project_id)
+            if layout is not None:
+                _cache.move_to_end(project_id)
+        if layout is not None and layout.version >= version:
+            return layout
+        cached = layout is not None
+        if not cached:
+            layout = _ProjectLayout()
+        with layout.lock:
+            known_count = len(layout.known)
+            since = layout.last_created_at
+
+        # Only fetch commits written since the cached layout was built. The
+        # one second overlap covers timestamps stored at second resolution;
+        # commits already laid out are skipped via ``known``.
+        query = self.db.query(Commit).filter(Commit.project_id == project_id)
+        if since is not None:
+            query = query.filter(Commit.created_at >= since - timedelta(seconds=1))
+        added = [c for c in query.order_by(Commit.created_at) if c.id not in layout.known]
+        if known_count + len(added) < version:
+            # Commits are never removed from a project, so some were written
+            # with timestamps older than the newest one laid out (an import
+            # keeping its source's dates, a clock stepped back): find them by id
+            with layout.lock:
+                seen = layout.known | {c.id for c in added}
+            missing = [
+                commit_id for (commit_id,) in self.db.query(Commit.id).filter(Commit.project_id == project_id)
+                if commit_id not in seen
+            ]
+            for i in range(0, len(missing), 500):
+                added.extend(self.db.query(Commit).filter(Commit.id.in_(missing[i:i + 500])))
+        parents = self._parents([c.id for c in added])
+        entries = [(c.generation, c.created_at, c.id, self._node(c, parents.get(c.id))) for c in added]
+
+        with layout.lock:
+            for entry in entries:
+                if entry[2] in layout.known:
+                    continue  # Added meanwhile by another request
+                layout.known.add(entry[2])
+                insort(layout.nodes, entry)
+                if layout.last_created_at is None or entry[1] > layout.last_created_at:
+                    layout.last_created_at = entry[1]
+            layout.version = max(layout.version, version)
+
+        with _cache_lock:
+            # A layout dropped by relayout_project meanwhile is not put back
+            if not cached or _cache.get(project_id) is layout:
+                _cache[project_id] = layout
+                _cache.move_to_end(project_id)
+            while len(_cache) > _MAX_CACHED_PROJECTS:
+                _cache.popitem(last=False)
+        return layout
+
+    def _parents(self, commit_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[uuid.UUID]]:
+        parents: Dict[uuid.UUID, List[uuid.UUID]] = {}
+        for i in range(0, len(commit_ids), 500):
+            rows = self.db.query(CommitParent.commit_id, CommitParent.parent_id).filter(
+                CommitParent.commit_id.in_(commit_ids[i:i + 500])
+            ).order_by(CommitParent.commit_id, CommitParent.position)
+            for commit_id, parent_id in rows:
+                parents.setdefault(commit_id, []).append(parent_id)
+        return parents
+
+    @staticmethod
+    def _node(commit: Commit, parents: Optional[List[uuid.UUID]] = None) -> dict:
+        return {
+            "id": commit.id,
+            "message": commit.message,
+            "author": commit.author,
+            "branch": commit.branch_name,
+            "timestamp": commit.created_at,
+            "x": commit.graph_x,
+            "y": commit.graph_y,
+            "lane": (commit.graph_y - Y_ORIGIN) // LANE_HEIGHT,
+            "generation": commit.generation,
+            "parents": parents or ([commit.parent_commit_id] if commit.parent_commit_id else []),
+        }
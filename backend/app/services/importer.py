@@ -0,0 +1,861 @@
+"""Bulk import of an existing vault's history into a new project.
+
+A source yields revisions oldest first, each as the files it added,
+changed or deleted against its first parent: ``GitSource`` reads a git
+repository with one streaming ``git log``, ``RevisionDirectory`` compares
+consecutive snapshot directories. Content is hashed and chunked into the
+chunk store by a process pool while the previous batch is written.
+
+Revisions are written ``import_batch_size`` at a time, in one transaction
+per batch, with bulk inserts rather than one ORM object per row: Files
+and their chunk lists, trees, commits, parents, chains and branch heads,
+plus an ImportedRevision row for each revision. Those rows are the
+checkpoint: running the same import again skips what was recorded and
+carries on. Trees are kept in memory as directories shared between
+revisions, so each revision only rehashes the directories it changed.
+
+Commits are placed exactly as CommitService would place them (generation,
+lane, ancestry chain). Reference graphs are built on first use from the
+references scanned here, and search indexing, previews and delta encoding
+are left to background jobs.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import subprocess
+import sys
+import time
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.models.project import (
+    Branch, Chunk, ChainLink, Commit, CommitChain, CommitParent, File, FileChunk, FileReference,
+    ImportedRevision, Project, VaultImport
+)
+from app.services.chunk_store import CHUNKED_SCHEME, ChunkStore, StoredBlob
+from app.services.events import EventLog
+from app.services.graph_layout import LANE_HEIGHT, X_ORIGIN, X_STEP, Y_ORIGIN
+from app.services.jobs import JobQueue
+from app.services.previews import queue_previews
+from app.services.project_service import ProjectService
+from app.services.references import ReferenceScanner, ScanningReader, is_scannable
+from app.services.tree_store import BLOB, TREE, TreeStore, normalize_path, tree_hash
+
+_READ_SIZE = 1024 * 1024
+_QUERY_BATCH = 500
+_REGULAR_MODES = (b"100644", b"100755")
+
+
+class Revision(NamedTuple):
+    id: str
+    parents: List[str]  # First parent first
+    branch: str
+    author: str
+    message: str
+    timestamp: Optional[datetime]
+    # (path, blob key) against the first parent; the key is None for a deleted path
+    changes: List[Tuple[str, Optional[str]]]
+
+
+# -- Sources ---------------------------------------------------------------
+
+def _git(repo: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", "-C", repo, *args], capture_output=True)
+
+
+class GitSource:
+    """Every branch of a git repository (git 2.31 or later).
+
+    Each commit goes on the first branch whose first-parent history
+    contains it, the checked-out branch first and renamed ``main``.
+    Commits only reachable through merges of deleted branches get a
+    ``merged-<id>`` branch of their own.
+    """
+
+    reuses_blobs = True
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.key = f"git:{self.path}"
+        self.name = os.path.basename(self.path.rstrip(os.sep)) or self.path
+        self.blob_source = ("git", self.path)
+        self.total = 0
+        self.children: Dict[str, int] = {}
+        self.branches: Dict[str, str] = {}
+
+    def prepare(self) -> None:
+        """Read the commit graph (parents only) to assign branches and count children"""
+        listing = _git(self.path, "rev-list", "--topo-order", "--parents", "--branches")
+        if listing.returncode:
+            raise ValueError(f"Not a git repository with branches: {listing.stderr.decode(errors='replace').strip()}")
+        parents: Dict[str, List[str]] = {}
+        order: List[str] = []  # Children before parents
+        for line in listing.stdout.decode().splitlines():
+            commit, *commit_parents = line.split()
+            parents[commit] = commit_parents
+            order.append(commit)
+            for parent in commit_parents:
+                self.children[parent] = self.children.get(parent, 0) + 1
+        self.total = len(order)
+
+        refs = _git(self.path, "for-each-ref", "--format=%(refname:short) %(objectname)", "refs/heads").stdout
+        tips = dict(line.split(" ", 1) for line in refs.decode().splitlines())
+        head = _git(self.path, "symbolic-ref", "--quiet", "--short", "HEAD").stdout.decode().strip()
+        names = {name: name for name in tips}
+        if head in tips and "main" not in tips:
+            names[head] = "main"
+
+        def claim(commit: Optional[str], branch: str) -> None:
+            while commit and commit not in self.branches:
+                self.branches[commit] = branch
+                commit = parents[commit][0] if parents.get(commit) else None
+
+        for ref in sorted(tips, key=lambda ref: (ref != head, ref)):
+            claim(tips[ref], names[ref])
+        for commit in order:
+            if commit not in self.branches:
+                claim(commit, f"merged-{commit[:7]}")
+
+    def revisions(self) -> Iterator[Revision]:
+        tokens = self._log()
+        current: Optional[Revision] = None
+        for token in tokens:
+            token = token.lstrip(b"\n")
+            if token.startswith(b"\x01"):
+                if current is not None:
+                    yield current
+                commit = token[1:].decode()
+                commit_parents = next(tokens).decode().split()
+                author = next(tokens).decode("utf-8", "replace")
+                timestamp = datetime.fromtimestamp(int(next(tokens)), timezone.utc)
+                message = next(tokens).decode("utf-8", "replace").strip()
+                current = Revision(
+                    commit, commit_parents, self.branches.get(commit, "main"), author, message, timestamp, []
+                )
+            elif token.startswith(b":") and current is not None:
+                # :old_mode new_mode old_blob new_blob status, then the path
+                _, new_mode, _, new_blob, _ = token[1:].split()
+                path = next(tokens).decode("utf-8", "replace")
+                # Symlinks and submodules are not files; leave them out
+                current.changes.append((path, new_blob.decode() if new_mode in _REGULAR_MODES else None))
+        if current is not None:
+            yield current
+
+    def _log(self) -> Iterator[bytes]:
+        """NUL-separated ``git log`` output: a header per commit, then its raw diff"""
+        process = subprocess.Popen([
+            "git", "-C", self.path, "log", "--reverse", "--topo-order", "--branches",
+            "--no-renames", "--no-abbrev", "--raw", "-z", "--diff-merges=first-parent",
+            "--format=%x01%H%x00%P%x00%an%x00%at%x00%B%x00",
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        finished = False
+        try:
+            rest = b""
+            for block in iter(lambda: process.stdout.read(_READ_SIZE), b""):
+                *tokens, rest = (rest + block).split(b"\0")
+                yield from tokens
+            if rest:
+                yield rest
+            finished = True
+        finally:
+            if not finished:
+                process.kill()
+            process.stdout.close()
+            if process.wait() and finished:
+                raise RuntimeError(f"git log failed with exit status {process.returncode}")
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite and hand-written metadata give naive datetimes; those are UTC here
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _natural_key(name: str) -> list:
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+class RevisionDirectory:
+    """A directory holding one full snapshot of the vault per revision.
+
+    Revisions are its subdirectories in natural order (``rev-2`` before
+    ``rev-10``), forming a single branch. A file whose size and mtime
+    match the previous revision's is taken to be unchanged, as rsync
+    does. An optional ``.revision.json`` in a revision gives its
+    ``message``, ``author`` and ``timestamp`` (ISO 8601).
+    """
+
+    reuses_blobs = False
+    METADATA = ".revision.json"
+
+    def __init__(self, path: str, branch: str = "main", author: str = "import"):
+        self.path = os.path.abspath(path)
+        self.key = f"revisions:{self.path}"
+        self.name = os.path.basename(self.path.rstrip(os.sep)) or self.path
+        self.blob_source = ("revisions", self.path)
+        self.branch = branch
+        self.author = author
+        self.total = 0
+        self.children: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def prepare(self) -> None:
+        if not os.path.isdir(self.path):
+            raise ValueError(f"{self.path} is not a directory")
+        self.names = sorted((
+            entry.name for entry in os.scandir(self.path)
+            if entry.is_dir() and not entry.name.startswith(".")
+        ), key=_natural_key)
+        self.total = len(self.names)
+        self.children = {name: 1 for name in self.names[:-1]}
+
+    def revisions(self) -> Iterator[Revision]:
+        previous: Dict[str, Tuple[int, int]] = {}
+        parent: Optional[str] = None
+        for name in self.names:
+            directory = os.path.join(self.path, name)
+            listing = self._list(directory)
+            changes = [
+                (path, os.path.join(directory, *path.split("/")))
+                for path, stat in listing.items() if previous.get(path) != stat
+            ]
+            changes += [(path, None) for path in previous if path not in listing]
+            metadata = self._metadata(directory)
+            timestamp = metadata.get("timestamp")
+            yield Revision(
+                name,
+                [parent] if parent else [],
+                self.branch,
+                metadata.get("author") or self.author,
+                metadata.get("message") or f"Revision {name}",
+                _utc(datetime.fromisoformat(timestamp)) if timestamp else
+                datetime.fromtimestamp(os.stat(directory).st_mtime, timezone.utc),
+                changes
+            )
+            previous, parent = listing, name
+
+    @staticmethod
+    def _list(directory: str) -> Dict[str, Tuple[int, int]]:
+        """Relative path -> (size, mtime) of every file, hidden ones excluded"""
+        files = {}
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in names:
+                if name.startswith("."):
+                    continue
+                full = os.path.join(root, name)
+                stat = os.stat(full)
+                files[os.path.relpath(full, directory).replace(os.sep, "/")] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def _metadata(self, directory: str) -> dict:
+        path = os.path.join(directory, self.METADATA)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+# -- Content (runs in the process pool) ------------------------------------
+
+# One ``git cat-file --batch`` per repository in each worker process
+_cat_files: Dict[str, subprocess.Popen] = {}
+
+
+class _BlobReader:
+    """The next ``size`` bytes of a stream, read through to their end"""
+
+    def __init__(self, stream, size: int):
+        self.stream = stream
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        data = self.stream.read(self.remaining if size < 0 else min(size, self.remaining))
+        if not data:
+            raise IOError("git cat-file ended early")
+        self.remaining -= len(data)
+        return data
+
+
+def _store_git_blob(repo: str, blob: str, store: ChunkStore, scanner: Optional[ReferenceScanner]) -> StoredBlob:
+    process = _cat_files.get(repo)
+    if process is None or process.poll() is not None:
+        process = _cat_files[repo] = subprocess.Popen(
+            ["git", "-C", repo, "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+    try:
+        process.stdin.write(f"{blob}\n".encode())
+        process.stdin.flush()
+        header = process.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise ValueError(f"{blob} is not a blob in {repo}")
+        reader = _BlobReader(process.stdout, int(header[2]))
+        stored = store.write_stream(ScanningReader(reader, scanner) if scanner else reader)
+        process.stdout.read(1)  # Newline after the content
+        return stored
+    except BaseException:
+        # The pipe is out of step now; start a fresh one next time
+        process.kill()
+        _cat_files.pop(repo, None)
+        raise
+
+
+def _store_blob(source: Tuple[str, str], key: str, filename: str) -> Tuple[StoredBlob, Optional[List[str]]]:
+    """Chunk one file body into the store; returns it with the references it names"""
+    kind, location = source
+    store = ChunkStore()
+    scanner = ReferenceScanner(filename) if is_scannable(filename) else None
+    if kind == "git":
+        blob = _store_git_blob(location, key, store, scanner)
+    else:
+        with open(key, "rb") as f:
+            blob = store.write_stream(ScanningReader(f, scanner) if scanner else f)
+    return blob, sorted(scanner.names) if scanner else None
+
+
+# -- Trees -----------------------------------------------------------------
+
+# content_hash, file_id, is_main_assembly
+_Blob = Tuple[str, uuid.UUID, bool]
+
+
+class _Dir:
+    """One directory of an imported tree, shared by revisions until one changes it"""
+
+    __slots__ = ("entries", "hash")
+
+    def __init__(self, entries: Optional[dict] = None):
+        self.entries: Dict[str, object] = entries if entries is not None else {}
+        self.hash: Optional[str] = None
+
+
+def _apply(directory: Optional[_Dir], changes: List[Tuple[List[str], Optional[_Blob]]]) -> Optional[_Dir]:
+    """A copy of ``directory`` with ``(path parts, blob or None)`` changes; None once empty.
+
+    Only directories along changed paths are copied. Deletions come first,
+    so a file may be replaced by a directory of the same name and back.
+    """
+    entries = dict(directory.entries) if directory is not None else {}
+    leaves: Dict[str, Optional[_Blob]] = {}
+    nested: Dict[str, list] = {}
+    for parts, blob in changes:
+        if len(parts) == 1:
+            leaves[parts[0]] = blob
+        else:
+            nested.setdefault(parts[0], []).append((parts[1:], blob))
+
+    for name, blob in leaves.items():
+        if blob is None and not isinstance(entries.get(name), _Dir):
+            entries.pop(name, None)
+    for name, children in nested.items():
+        current = entries.get(name)
+        if current is not None and not isinstance(current, _Dir):
+            raise ValueError(f"'{name}' is a file, not a directory")
+        child = _apply(current, children)
+        if child is None:
+            entries.pop(name, None)
+        else:
+            entries[name] = child
+    for name, blob in leaves.items():
+        if blob is not None:
+            if isinstance(entries.get(name), _Dir):
+                raise ValueError(f"'{name}' is a directory")
+            entries[name] = blob
+    return _Dir(entries) if entries else None
+
+
+def _hash_tree(directory: _Dir, objects: Optional[dict]) -> str:
+    """Hash directories not hashed yet, adding their entries to ``objects``"""
+    if directory.hash is None:
+        entries = []
+        for name, value in directory.entries.items():
+            if isinstance(value, _Dir):
+                entries.append((name, TREE, _hash_tree(value, objects), None, False))
+            else:
+                entries.append((name, BLOB, value[0], value[1], value[2]))
+        directory.hash = tree_hash(entries)
+        if objects is not None:
+            objects[directory.hash] = entries
+    return directory.hash
+
+
+# -- Import ----------------------------------------------------------------
+
+class _Chain:
+    __slots__ = ("id", "length", "dirty")
+
+    def __init__(self, chain_id: Optional[int], length: int):
+        self.id = chain_id
+        self.length = length
+        self.dirty = False
+
+
+class _State(NamedTuple):
+    """What children of an imported revision need from it"""
+    commit_id: uuid.UUID
+    generation: int
+    chain: Optional[_Chain]
+    position: Optional[int]
+    tree: Optional[_Dir]  # Loaded from the database when first needed
+
+
+class _Branch:
+    __slots__ = ("id", "name", "lane", "head", "new")
+
+    def __init__(self, branch_id: uuid.UUID, name: str, lane: Optional[int], head: Optional[uuid.UUID], new: bool):
+        self.id = branch_id
+        self.name = name
+        self.lane = lane
+        self.head = head
+        self.new = new
+
+
+def _print_progress(line: str) -> None:
+    print(line, file=sys.stderr, flush=True)
+
+
+class VaultImporter:
+    """Imports a source into a project, one transaction per batch of revisions"""
+
+    def __init__(
+        self,
+        db: Session,
+        source,
+        project_name: Optional[str] = None,
+        description: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        main_assembly: Optional[str] = None,
+        queue_jobs: bool = True,
+        report: Optional[Callable[[str], None]] = None
+    ):
+        self.db = db
+        self.source = source
+        self.project_name = project_name or source.name
+        self.description = description
+        self.batch_size = max(1, batch_size or settings.import_batch_size)
+        self.workers = workers or settings.import_workers or os.cpu_count() or 1
+        self.main_assembly = normalize_path(main_assembly) if main_assembly else None
+        self.queue_jobs = queue_jobs
+        self.report = report or _print_progress
+
+        self.import_id: Optional[int] = None
+        self.project_id: Optional[uuid.UUID] = None
+        self.imported: Dict[str, uuid.UUID] = {}  # Revision -> commit, this run's and earlier ones
+        self.states: Dict[str, _State] = {}
+        self.chains: Dict[int, _Chain] = {}
+        self.branches: Dict[str, _Branch] = {}
+        self.next_lane = 0
+        self.blobs: Dict[str, Tuple[str, uuid.UUID]] = {}  # Blob key -> content hash, File id
+
+        self.stats = dict.fromkeys(("imported", "skipped", "files_stored", "bytes_read", "bytes_stored"), 0)
+        self.started = 0.0
+
+    def run(self) -> dict:
+        """Import every revision not imported yet; returns throughput figures"""
+        self.started = time.perf_counter()
+        self.source.prepare()
+        self._begin()
+
+        # spawn: the parent may hold database connections and git pipes
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            # Content of one batch is chunked while the one before it is written
+            pending = None
+            for batch in self._batches():
+                submitted = self._submit(pool, batch)
+                if pending is not None:
+                    self._finish(*pending)
+                pending = (batch, submitted)
+            if pending is not None:
+                self._finish(*pending)
+        except BaseException:
+            self.db.rollback()
+            raise
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        self.db.query(VaultImport).filter(VaultImport.id == self.import_id).update({
+            VaultImport.status: "complete",
+            VaultImport.updated_at: datetime.now(timezone.utc),
+        }, synchronize_session=False)
+        self.db.commit()
+        return self.summary()
+
+    def summary(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "project_id": str(self.project_id),
+            "revisions": self.source.total,
+            **self.stats,
+            "seconds": round(seconds, 3),
+            "revisions_per_second": round(self.stats["imported"] / seconds, 3) if seconds else None,
+            "bytes_per_second": round(self.stats["bytes_read"] / seconds, 1) if seconds else None,
+        }
+
+    # -- Setup -----------------------------------------------------------
+
+    def _begin(self) -> None:
+        """Start a new import, or pick up the one recorded for this source"""
+        record = self.db.query(VaultImport).filter(VaultImport.source == self.source.key).first()
+        if record is None:
+            project = Project(name=self.project_name, description=self.description)
+            self.db.add(project)
+            self.db.flush()
+            EventLog(self.db).project_created(project, [])
+            record = VaultImport(source=self.source.key, project_id=project.id, status="running", revisions=0)
+            self.db.add(record)
+            self.db.commit()
+        self.import_id, self.project_id = record.id, record.project_id
+
+        self.imported = dict(self.db.query(ImportedRevision.revision, ImportedRevision.commit_id).filter(
+            ImportedRevision.import_id == self.import_id
+        ))
+        for branch in self.db.query(Branch).filter(Branch.project_id == self.project_id):
+            self.branches[branch.name] = _Branch(branch.id, branch.name, branch.graph_lane, branch.head_commit_id, False)
+        lanes = [b.lane for b in self.branches.values() if b.lane is not None]
+        self.next_lane = max(lanes) + 1 if lanes else 0
+
+    def _batches(self) -> Iterator[List[Revision]]:
+        batch: List[Revision] = []
+        for revision in self.source.revisions():
+            if revision.id in self.imported:
+                self.stats["skipped"] += 1
+                continue
+            batch.append(revision)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _submit(self, pool: ProcessPoolExecutor, batch: List[Revision]) -> Dict[str, Tuple[Future, str]]:
+        """Start chunking every blob of the batch not stored by this run yet"""
+        submitted: Dict[str, Tuple[Future, str]] = {}
+        for revision in batch:
+            for path, key in revision.changes:
+                if key is not None and key not in self.blobs and key not in submitted:
+                    path = normalize_path(path)
+                    submitted[key] = (
+                        pool.submit(_store_blob, self.source.blob_source, key, posixpath.basename(path)), path
+                    )
+        return submitted
+
+    # -- Writing a batch -------------------------------------------------
+
+    def _finish(self, batch: List[Revision], submitted: Dict[str, Tuple[Future, str]]) -> None:
+        self._record_files({key: (future.result(), path) for key, (future, path) in submitted.items()})
+
+        objects: Dict[str, list] = {}
+        commits: List[Tuple[dict, _Chain]] = []
+        parent_rows: List[dict] = []
+        links: List[Tuple[_Chain, int, _Chain, int]] = []
+        new_chains: List[_Chain] = []
+        moved: Dict[str, Optional[uuid.UUID]] = {}  # Branch -> head before this batch
+
+        for revision in batch:
+            parents = [self._state(parent) for parent in dict.fromkeys(revision.parents)]
+            first = parents[0] if parents else None
+
+            changes = []
+            for path, key in revision.changes:
+                parts = normalize_path(path).split("/")
+                blob = None
+                if key is not None:
+                    content_hash, file_id = self.blobs[key]
+                    blob = (content_hash, file_id, "/".join(parts) == self.main_assembly)
+                changes.append((parts, blob))
+            base = self._tree(revision.parents[0]) if first else None
+            tree = (_apply(base, changes) if changes else base) or _Dir()
+            root_hash = _hash_tree(tree, objects)
+
+            # Same placement as AncestryIndex.index_commit: extend the first
+            # parent's chain only while it is the chain's tip
+            if first is not None and first.chain is not None and first.chain.length == first.position + 1:
+                chain, position = first.chain, first.position + 1
+                chain.length += 1
+                chain.dirty = True
+            else:
+                chain, position = _Chain(None, 1), 0
+                new_chains.append(chain)
+            for parent in (parents if position == 0 else parents[1:]):
+                if parent.chain is not None:
+                    links.append((chain, position, parent.chain, parent.position))
+
+            branch = self.branches.get(revision.branch)
+            if branch is None:
+                branch = self.branches[revision.branch] = _Branch(uuid.uuid4(), revision.branch, None, None, True)
+            if branch.lane is None:
+                branch.lane = self.next_lane
+                self.next_lane += 1
+            moved.setdefault(branch.name, branch.head)
+
+            generation = max(p.generation for p in parents) + 1 if parents else 0
+            commit_id = uuid.uuid4()
+            commits.append(({
+                "id": commit_id,
+                "message": revision.message or "(no message)",
+                "author": revision.author,
+                "project_id": self.project_id,
+                "branch_name": branch.name,
+                "parent_commit_id": first.commit_id if first else None,
+                "graph_x": X_ORIGIN + X_STEP * generation,
+                "graph_y": Y_ORIGIN + LANE_HEIGHT * branch.lane,
+                "generation": generation,
+                "chain_pos": position,
+                "tree_hash": root_hash,
+                "created_at": revision.timestamp or datetime.now(timezone.utc),
+            }, chain))
+            parent_rows.extend(
+                {"commit_id": commit_id, "position": i, "parent_id": parent.commit_id}
+                for i, parent in enumerate(parents)
+            )
+
+            self.states[revision.id] = _State(commit_id, generation, chain, position, tree)
+            self.imported[revision.id] = commit_id
+            branch.head = commit_id
+            for parent in revision.parents:
+                self._release(parent)
+
+        self._write(batch, objects, commits, parent_rows, links, new_chains, moved)
+
+    def _write(self, batch, objects, commits, parent_rows, links, new_chains, moved) -> None:
+        db = self.db
+        TreeStore(db).store_objects(objects)
+
+        db.bulk_update_mappings(CommitChain, [
+            {"id": chain.id, "length": chain.length}
+            for chain in self.chains.values() if chain.dirty
+        ])
+        rows = [CommitChain(project_id=self.project_id, length=chain.length) for chain in new_chains]
+        db.add_all(rows)
+        db.flush()
+        for chain, row in zip(new_chains, rows):
+            chain.id = row.id
+            self.chains[chain.id] = chain
+
+        db.bulk_insert_mappings(Commit, [{**row, "chain_id": chain.id} for row, chain in commits])
+        db.bulk_insert_mappings(CommitParent, parent_rows)
+        db.bulk_insert_mappings(ChainLink, [
+            {
+                "project_id": self.project_id,
+                "chain_id": chain.id,
+                "position": position,
+                "parent_chain_id": parent_chain.id,
+                "parent_position": parent_position,
+            }
+            for chain, position, parent_chain, parent_position in links
+        ])
+
+        branches = [self.branches[name] for name in moved]
+        db.bulk_insert_mappings(Branch, [
+            {"id": b.id, "name": b.name, "project_id": self.project_id, "graph_lane": b.lane, "head_commit_id": b.head}
+            for b in branches if b.new
+        ])
+        db.bulk_update_mappings(Branch, [
+            {"id": b.id, "graph_lane": b.lane, "head_commit_id": b.head}
+            for b in branches if not b.new
+        ])
+        events = EventLog(db)
+        for b in branches:
+            events.record(self.project_id, "branch.created" if b.new else "branch.updated", {
+                "branch": b.name,
+                "head_commit_id": str(b.head),
+                "previous_head_commit_id": str(moved[b.name]) if moved[b.name] else None,
+            })
+
+        # The checkpoint, in the same transaction as what it records
+        db.bulk_insert_mappings(ImportedRevision, [
+            {"import_id": self.import_id, "revision": revision.id, "commit_id": self.imported[revision.id]}
+            for revision in batch
+        ])
+        db.query(VaultImport).filter(VaultImport.id == self.import_id).update({
+            VaultImport.revisions: VaultImport.revisions + len(batch),
+            VaultImport.updated_at: datetime.now(timezone.utc),
+        }, synchronize_session=False)
+
+        if self.queue_jobs:
+            jobs = JobQueue(db)
+            jobs.enqueue_many("index_commit", [
+                (f"index_commit:{row['id']}", {"commit_id": str(row["id"])}) for row, _ in commits
+            ])
+            if settings.delta_storage_enabled:
+                jobs.enqueue_many("encode_deltas", [
+                    (f"encode_deltas:{row['id']}", {"commit_id": str(row["id"])})
+                    for row, _ in commits if row["parent_commit_id"]
+                ])
+        ProjectService(db).record_commits(self.project_id, [row for row, _ in commits])
+        db.commit()
+
+        for chain in self.chains.values():
+            chain.dirty = False
+        for b in branches:
+            b.new = False
+        if not self.source.reuses_blobs:
+            for revision in batch:
+                for _, key in revision.changes:
+                    self.blobs.pop(key, None)
+
+        self.stats["imported"] += len(batch)
+        seconds = time.perf_counter() - self.started
+        done = self.stats["imported"] + self.stats["skipped"]
+        self.report(
+            f"{done}/{self.source.total} revisions, {self.stats['imported'] / seconds:.1f}/s; "
+            f"{self.stats['files_stored']} files stored, "
+            f"{self.stats['bytes_read'] / seconds / (1024 * 1024):.1f} MB/s read"
+        )
+
+    def _record_files(self, stored: Dict[str, Tuple[Tuple[StoredBlob, Optional[List[str]]], str]]) -> None:
+        """File rows, chunk lists and references for newly chunked content, in bulk"""
+        by_hash: Dict[str, Tuple[StoredBlob, Optional[List[str]], str]] = {}
+        for (blob, names), path in stored.values():
+            by_hash.setdefault(blob.content_hash, (blob, names, path))
+            self.stats["bytes_read"] += blob.size
+            self.stats["bytes_stored"] += blob.new_bytes
+
+        ids = self._file_ids(list(by_hash))
+        new = {h: value for h, value in by_hash.items() if h not in ids}
+        generated = {h: uuid.uuid4() for h in new}
+        now = datetime.now(timezone.utc)
+        insert_ignore(self.db, Chunk, [
+            {"hash": h, "size": size}
+            for h, size in {(c.hash, c.size) for blob, _, _ in new.values() for c in blob.chunks}
+        ])
+        insert_ignore(self.db, File, [
+            {
+                "id": generated[h],
+                "filename": posixpath.basename(path),
+                "file_path": path,
+                "file_size": blob.size,
+                "file_type": os.path.splitext(path)[1].upper(),
+                "content_hash": h,
+                "storage_path": CHUNKED_SCHEME + h,
+                # Just hashed from the source, and every file type is scanned or unscannable
+                "verified_at": now,
+                "is_corrupt": False,
+                "references_scanned": True,
+            }
+            for h, (blob, names, path) in new.items()
+        ])
+        ids.update(self._file_ids(list(new)))
+
+        # Content another writer recorded meanwhile keeps its own chunk list
+        ours = [h for h in new if ids[h] == generated[h]]
+        self.db.bulk_insert_mappings(FileChunk, [
+            {"file_id": ids[h], "sequence": i, "chunk_hash": c.hash, "offset": c.offset}
+            for h in ours
+            for i, c in enumerate(new[h][0].chunks)
+        ])
+        insert_ignore(self.db, FileReference, [
+            {"file_id": ids[h], "ref_name": name}
+            for h in ours
+            for name in new[h][1] or ()
+        ])
+        if self.queue_jobs:
+            queue_previews(self.db, [(h, posixpath.basename(new[h][2])) for h in ours])
+        self.stats["files_stored"] += len(ours)
+
+        for key, ((blob, _), _) in stored.items():
+            self.blobs[key] = (blob.content_hash, ids[blob.content_hash])
+
+    def _file_ids(self, hashes: List[str]) -> Dict[str, uuid.UUID]:
+        ids = {}
+        for i in range(0, len(hashes), _QUERY_BATCH):
+            ids.update(self.db.query(File.content_hash, File.id).filter(
+                File.content_hash.in_(hashes[i:i + _QUERY_BATCH])
+            ))
+        return ids
+
+    # -- Revision state --------------------------------------------------
+
+    def _state(self, revision: str) -> _State:
+        """A parent's state, from memory or, for one imported earlier, the database"""
+        state = self.states.get(revision)
+        if state is not None:
+            return state
+        commit_id = self.imported.get(revision)
+        if commit_id is None:
+            # A shallow clone, or a source listing children before parents
+            raise ValueError(f"Parent revision {revision} has not been imported")
+        commit = self.db.get(Commit, commit_id)
+        chain = None
+        if commit.chain_id is not None:
+            chain = self.chains.get(commit.chain_id)
+            if chain is None:
+                length = self.db.query(CommitChain.length).filter(CommitChain.id == commit.chain_id).scalar()
+                chain = self.chains[commit.chain_id] = _Chain(commit.chain_id, length)
+        state = self.states[revision] = _State(commit.id, commit.generation, chain, commit.chain_pos, None)
+        return state
+
+    def _tree(self, revision: str) -> _Dir:
+        state = self._state(revision)
+        if state.tree is None:
+            commit = self.db.get(Commit, state.commit_id)
+            changes = [
+                (f.path.split("/"), (f.content_hash, f.file_id, f.is_main_assembly))
+                for f in TreeStore(self.db).list_files(commit)
+            ]
+            tree = _apply(None, changes) or _Dir()
+            _hash_tree(tree, None)  # Stored already
+            state = self.states[revision] = state._replace(tree=tree)
+        return state.tree
+
+    def _release(self, revision: str) -> None:
+        """One more child of ``revision`` imported; forget it after the last"""
+        remaining = self.source.children.get(revision)
+        if remaining is None:
+            return
+        if remaining <= 1:
+            self.source.children.pop(revision)
+            self.states.pop(revision, None)
+        else:
+            self.source.children[revision] = remaining - 1
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import a vault's history into a new project; rerun to resume an interrupted import"
+    )
+    parser.add_argument("kind", choices=("git", "revisions"), help="A git repository, or a directory of snapshots")
+    parser.add_argument("path")
+    parser.add_argument("--project", help="Project name, by default the source directory's name")
+    parser.add_argument("--description")
+    parser.add_argument("--branch", default="main", help="Branch for a directory of revisions")
+    parser.add_argument("--author", default="import", help="Author of revisions that name none")
+    parser.add_argument("--main-assembly", help="Path of the top-level assembly within the vault")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size)
+    parser.add_argument("--workers", type=int, default=settings.import_workers)
+    parser.add_argument("--no-jobs", action="store_true", help="Skip search indexing, preview and delta jobs")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal
+
+    if args.kind == "git":
+        source = GitSource(args.path)
+    else:
+        source = RevisionDirectory(args.path, branch=args.branch, author=args.author)
+    db = SessionLocal()
+    try:
+        summary = VaultImporter(
+            db, source,
+            project_name=args.project,
+            description=args.description,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            main_assembly=args.main_assembly,
+            queue_jobs=not args.no_jobs
+        ).run()
+    finally:
+        db.close()
+    print(json.dumps(summary, indent=2))
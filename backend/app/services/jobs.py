@@ -0,0 +1,394 @@
+"""Durable background jobs.
+
+Work that need not finish before a response is sent (verification, delta
+encoding, search indexing, preview extraction, deferred upload ingestion)
+is recorded as a Job row in the application database, normally in the
+same transaction as whatever made it necessary, so a restart loses
+nothing. There is no broker: workers claim due jobs straight from the
+table, highest priority first, and a failed attempt is retried with
+exponential backoff until ``max_attempts``. Enqueueing with an
+``idempotency_key`` that was used before returns the existing job.
+
+Handlers are module-level functions that take the payload as keyword
+arguments and open their own session, like every other threadpool entry
+point. Each API process runs ``settings.job_workers`` worker threads,
+started with the application (or with the first job it enqueues, in a
+process that did not start them); ``python -m app.services.jobs`` runs
+workers on their own.
+"""
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.metrics import JOB_DURATION, JOB_RUNS
+from app.models.project import Job
+
+# kind -> "module:function"; imported on first use so services can enqueue each other
+HANDLERS: Dict[str, str] = {
+    "ingest_upload": "app.services.upload_service:ingest_upload",
+    "verify_commit": "app.services.verification:verify_commit",
+    "index_commit": "app.services.search_index:index_commit",
+    "encode_deltas": "app.services.delta_store:encode_commit_deltas",
+    "preview": "app.services.previews:generate_preview",
+}
+
+# Clients wait on uploads; previews are only cosmetic
+PRIORITIES: Dict[str, int] = {
+    "ingest_upload": 100,
+    "verify_commit": 50,
+    "index_commit": 20,
+    "encode_deltas": 0,
+    "preview": -10,
+}
+
+STATUSES = ("queued", "running", "succeeded", "failed")
+
+_CLAIM_TRIES = 5
+_INSERT_BATCH = 500
+_MAX_ERROR = 4000
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when another attempt cannot succeed"""
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait after the given number of failed attempts"""
+    delay = min(settings.job_retry_max_seconds, settings.job_retry_base_seconds * 2 ** max(0, attempts - 1))
+    # Jitter, so jobs that failed together do not all retry together
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Optional[dict] = None,
+        idempotency_key: Optional[str] = None,
+        priority: Optional[int] = None,
+        delay: float = 0.0,
+        max_attempts: Optional[int] = None
+    ) -> Job:
+        """Add a job to the session's transaction; the caller commits.
+
+        With an ``idempotency_key`` that is already taken the existing job
+        is returned, whatever its status.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        now = datetime.now(timezone.utc)
+        row = {
+            "kind": kind,
+            "payload": payload or {},
+            "idempotency_key": idempotency_key,
+            "priority": PRIORITIES.get(kind, 0) if priority is None else priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or settings.job_max_attempts,
+            "run_after": now + timedelta(seconds=delay),
+            "created_at": now,
+        }
+        if idempotency_key is None:
+            job = Job(**row)
+            self.db.add(job)
+            self.db.flush()
+            return job
+        insert_ignore(self.db, Job, [row])
+        return self.db.query(Job).filter(Job.idempotency_key == idempotency_key).one()
+
+    def enqueue_many(self, kind: str, jobs: List[Tuple[str, dict]], priority: Optional[int] = None) -> None:
+        """Add ``(idempotency_key, payload)`` jobs in bulk, skipping keys already taken"""
+        now = datetime.now(timezone.utc)
+        rows = [{
+            "kind": kind,
+            "payload": payload,
+            "idempotency_key": key,
+            "priority": PRIORITIES.get(kind, 0) if priority is None else priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": settings.job_max_attempts,
+            "run_after": now,
+            "created_at": now,
+        } for key, payload in jobs]
+        for i in range(0, len(rows), _INSERT_BATCH):
+            insert_ignore(self.db, Job, rows[i:i + _INSERT_BATCH])
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self.db.get(Job, job_id)
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Mark the most urgent due job as running for ``worker`` and return it"""
+        for _ in range(_CLAIM_TRIES):
+            now = datetime.now(timezone.utc)
+            candidate = self.db.query(Job.id).filter(
+                Job.status == "queued",
+                Job.run_after <= now
+            ).order_by(Job.priority.desc(), Job.run_after, Job.id).limit(1)
+            if self.db.get_bind().dialect.name == "postgresql":
+                candidate = candidate.with_for_update(skip_locked=True)
+            row = candidate.first()
+            if row is None:
+                self.db.commit()
+                return None
+            # Conditional on the status, so two workers never both take it
+            claimed = self.db.query(Job).filter(Job.id == row.id, Job.status == "queued").update({
+                Job.status: "running",
+                Job.locked_by: worker,
+                Job.locked_at: now,
+                Job.attempts: Job.attempts + 1,
+            }, synchronize_session=False)
+            self.db.commit()
+            if claimed:
+                return self.db.get(Job, row.id)
+        return None
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """Extend the lease on a job ``worker`` is running; False if it no longer holds it"""
+        renewed = self.db.query(Job).filter(
+            Job.id == job_id,
+            Job.status == "running",
+            Job.locked_by == worker
+        ).update({Job.locked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+        self.db.commit()
+        return bool(renewed)
+
+    def succeed(self, job: Job, result=None) -> None:
+        job.status = "succeeded"
+        job.result = result
+        job.last_error = None
+        job.locked_by = None
+        job.finished_at = datetime.now(timezone.utc)
+        self.db.commit()
+
+    def fail(self, job: Job, error: str, permanent: bool = False) -> None:
+        """Record a failed attempt; retry later unless attempts are used up"""
+        job.last_error = error[:_MAX_ERROR]
+        job.locked_by = None
+        if permanent or job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.status = "queued"
+            job.run_after = datetime.now(timezone.utc) + timedelta(seconds=retry_delay(job.attempts))
+        self.db.commit()
+
+    def retry(self, job: Job) -> Job:
+        """Queue a failed job again with a fresh set of attempts"""
+        if job.status != "failed":
+            raise ValueError(f"Only failed jobs can be retried, this one is {job.status}")
+        job.status = "queued"
+        job.attempts = 0
+        job.run_after = datetime.now(timezone.utc)
+        job.finished_at = None
+        self.db.commit()
+        return job
+
+    def requeue_stale(self) -> int:
+        """Return jobs held by workers that stopped without finishing them"""
+        now = datetime.now(timezone.utc)
+        expired = (Job.status == "running") & (Job.locked_at < now - timedelta(seconds=settings.job_lease_seconds))
+        failed = self.db.query(Job).filter(expired, Job.attempts >= Job.max_attempts).update({
+            Job.status: "failed",
+            Job.locked_by: None,
+            Job.last_error: "Worker stopped while running the job",
+            Job.finished_at: now,
+        }, synchronize_session=False)
+        requeued = self.db.query(Job).filter(expired).update({
+            Job.status: "queued",
+            Job.locked_by: None,
+            Job.run_after: now,
+        }, synchronize_session=False)
+        self.db.commit()
+        return failed + requeued
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per status"""
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self.db.query(Job.status, func.count(Job.id)).group_by(Job.status))
+        return counts
+
+
+def handler(kind: str) -> Callable:
+    module, _, name = HANDLERS[kind].partition(":")
+    return getattr(import_module(module), name)
+
+
+def _json_safe(result):
+    # Handlers may return ids and timestamps; the result column stores JSON
+    return None if result is None else json.loads(json.dumps(result, default=str))
+
+
+class _Heartbeat:
+    """Renews a job's lease every ``job_heartbeat_seconds`` while its handler runs"""
+
+    def __init__(self, job_id: int, worker: str):
+        self.job_id = job_id
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"job-heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self) -> None:
+        from app.database import SessionLocal
+
+        while not self.stopped.wait(settings.job_heartbeat_seconds):
+            db = SessionLocal()
+            try:
+                if not JobQueue(db).renew(self.job_id, self.worker):
+                    return
+            except Exception:
+                # Try again at the next beat; the lease outlasts several
+                pass
+            finally:
+                db.close()
+
+
+def run_next(worker: str) -> bool:
+    """Claim and run one due job; False if there was none"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        queue = JobQueue(db)
+        job = queue.claim(worker)
+        if job is None:
+            return False
+        started = time.perf_counter()
+        try:
+            with _Heartbeat(job.id, worker):
+                result = handler(job.kind)(**job.payload)
+        except PermanentJobError as e:
+            db.rollback()
+            queue.fail(job, str(e), permanent=True)
+            outcome = "failed"
+        except Exception as e:
+            db.rollback()
+            queue.fail(job, f"{type(e).__name__}: {e}")
+            outcome = "failed" if job.status == "failed" else "retried"
+        else:
+            queue.succeed(job, _json_safe(result))
+            outcome = "succeeded"
+        JOB_RUNS.labels(job.kind, outcome).inc()
+        JOB_DURATION.labels(job.kind).observe(time.perf_counter() - started)
+        return True
+    finally:
+        db.close()
+
+
+class WorkerPool:
+    """A fixed number of threads running jobs until stopped"""
+
+    def __init__(self, workers: int, name: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(index,), name=f"job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def notify(self) -> None:
+        """Wake idle workers now rather than at their next poll"""
+        self.wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Let running jobs finish, then end the threads"""
+        self.stopping.set()
+        self.wake.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _run(self, index: int) -> None:
+        from app.database import SessionLocal
+
+        worker = f"{self.name}/{index}"
+        next_sweep = 0.0
+        while not self.stopping.is_set():
+            ran = False
+            try:
+                if index == 0 and time.monotonic() >= next_sweep:
+                    db = SessionLocal()
+                    try:
+                        JobQueue(db).requeue_stale()
+                    finally:
+                        db.close()
+                    next_sweep = time.monotonic() + settings.job_lease_seconds / 4
+                ran = run_next(worker)
+            except Exception:
+                # The database is unreachable or similar; try again after a poll
+                pass
+            if not ran:
+                self.wake.wait(settings.job_poll_seconds)
+                self.wake.clear()
+
+
+_workers: Optional[WorkerPool] = None
+_workers_lock = threading.Lock()
+
+
+def start_workers() -> Optional[WorkerPool]:
+    """This process's worker pool, started once; None if it runs no workers"""
+    global _workers
+    with _workers_lock:
+        if _workers is None and settings.job_workers > 0:
+            _workers = WorkerPool(settings.job_workers)
+            _workers.start()
+        return _workers
+
+
+def notify_workers() -> None:
+    """Tell workers that jobs were committed; call after the commit"""
+    workers = start_workers()
+    if workers is not None:
+        workers.notify()
+
+
+def stop_workers(timeout: Optional[float] = None) -> None:
+    global _workers
+    with _workers_lock:
+        workers, _workers = _workers, None
+    if workers is not None:
+        workers.stop(timeout)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run background job workers until interrupted")
+    parser.add_argument("--workers", type=int, default=max(1, settings.job_workers))
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
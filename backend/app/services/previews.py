@@ -0,0 +1,191 @@
+"""Preview images embedded in SolidWorks documents.
+
+SolidWorks saves a PNG rendering of the model inside every part, assembly
+and drawing: as the ``PreviewPNG`` stream of older compound files, and
+embedded in the container of newer ones. ``PngExtractor`` finds it in a
+single streaming pass over the stored content without knowing the
+container format, ``PreviewStore`` renders it at ``preview_sizes`` and
+stores the results under ``<storage_path>/previews`` keyed by content
+hash. A document stored under several names or in many commits is
+therefore processed once, and a FilePreview row records the outcome.
+
+Extraction runs as low priority ``preview`` jobs queued with the commit.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+import io
+import os
+import tempfile
+
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.models.project import File, FilePreview
+from app.services.jobs import JobQueue
+from app.services.storage import iter_file_content
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_MAX_PNG = 16 * 1024 * 1024
+# A claim older than this belongs to a worker that died
+_STALE_CLAIM = timedelta(minutes=10)
+_QUERY_BATCH = 500
+
+
+class PngExtractor:
+    """Finds complete PNG images in content fed in blocks and keeps the largest"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.best: Optional[bytes] = None
+
+    def feed(self, data: bytes) -> None:
+        self.buffer += data
+        while True:
+            start = self.buffer.find(PNG_SIGNATURE)
+            if start < 0:
+                # Keep what could be the beginning of a signature
+                del self.buffer[:max(0, len(self.buffer) - len(PNG_SIGNATURE) + 1)]
+                return
+            del self.buffer[:start]
+            end = self._png_end()
+            if end is None:
+                return  # Incomplete; wait for more data
+            if end < 0:
+                del self.buffer[:1]  # Signature bytes that do not start a PNG
+                continue
+            if self.best is None or end > len(self.best):
+                self.best = bytes(self.buffer[:end])
+            del self.buffer[:end]
+
+    def _png_end(self) -> Optional[int]:
+        """Length of the PNG at the start of the buffer, None if cut off, -1 if invalid"""
+        pos = len(PNG_SIGNATURE)
+        while True:
+            if pos + 8 > len(self.buffer):
+                return None if pos < _MAX_PNG else -1
+            length = int.from_bytes(self.buffer[pos:pos + 4], "big")
+            chunk_type = bytes(self.buffer[pos + 4:pos + 8])
+            if not chunk_type.isalpha() or length > _MAX_PNG:
+                return -1
+            pos += 12 + length  # Length, type, data and CRC
+            if chunk_type == b"IEND":
+                return pos if pos <= len(self.buffer) else None
+
+
+def has_preview(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in {e.lower() for e in settings.preview_extensions}
+
+
+def preview_directory(content_hash: str) -> str:
+    return os.path.join(settings.storage_path, "previews", content_hash[:2], content_hash)
+
+
+def preview_path(content_hash: str, size: int) -> str:
+    return os.path.join(preview_directory(content_hash), f"{size}.png")
+
+
+def best_size(sizes: Optional[List[int]], size: int) -> Optional[int]:
+    """Smallest rendered size of at least ``size``, else the largest there is"""
+    sizes = sorted(sizes or [])
+    if not sizes:
+        return None
+    return next((s for s in sizes if s >= size), sizes[-1])
+
+
+class PreviewStore:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def claim(self, content_hash: str) -> bool:
+        """Take the job of rendering ``content_hash``; False if done or taken"""
+        insert_ignore(self.db, FilePreview, [{"content_hash": content_hash, "status": "pending"}])
+        now = datetime.now(timezone.utc)
+        claimed = self.db.query(FilePreview).filter(
+            FilePreview.content_hash == content_hash,
+            (FilePreview.status == "pending") | (
+                (FilePreview.status == "processing") & (FilePreview.updated_at < now - _STALE_CLAIM)
+            )
+        ).update({FilePreview.status: "processing", FilePreview.updated_at: now}, synchronize_session=False)
+        self.db.commit()
+        return claimed == 1
+
+    def generate(self, file: File) -> FilePreview:
+        """Extract, render and store the preview of a File, recording the outcome"""
+        preview = self.db.get(FilePreview, file.content_hash)
+        extractor = PngExtractor()
+        try:
+            for piece in iter_file_content(self.db, file):
+                extractor.feed(piece)
+            if extractor.best is None:
+                preview.status = "none"
+            else:
+                with Image.open(io.BytesIO(extractor.best)) as image:
+                    image.load()
+                    preview.width, preview.height = image.size
+                    preview.sizes = self._render(file.content_hash, image)
+                preview.status = "ready"
+            preview.error = None
+        except Exception as e:
+            preview.status = "failed"
+            preview.error = str(e)
+        self.db.commit()
+        return preview
+
+    def _render(self, content_hash: str, image: Image.Image) -> List[int]:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        directory = preview_directory(content_hash)
+        os.makedirs(directory, exist_ok=True)
+        sizes = []
+        for size in sorted(set(settings.preview_sizes)):
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)  # Never enlarges
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    thumbnail.save(f, format="PNG", optimize=True)
+                os.replace(tmp_path, preview_path(content_hash, size))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            sizes.append(size)
+        return sizes
+
+
+def queue_previews(db: Session, files: Iterable[Tuple[str, str]]) -> int:
+    """Enqueue preview jobs for ``(content_hash, filename)`` pairs; the caller commits.
+
+    Content without a preview format or already known is skipped, and the
+    job's idempotency key keeps content from being queued twice.
+    Returns the number of files considered new.
+    """
+    hashes = list(dict.fromkeys(h for h, filename in files if h and has_preview(filename)))
+    known = set()
+    for i in range(0, len(hashes), _QUERY_BATCH):
+        known.update(h for (h,) in db.query(FilePreview.content_hash).filter(
+            FilePreview.content_hash.in_(hashes[i:i + _QUERY_BATCH])
+        ))
+    new = [h for h in hashes if h not in known]
+    # A pending row tells clients asking for the preview to come back later
+    for i in range(0, len(new), _QUERY_BATCH):
+        insert_ignore(db, FilePreview, [{"content_hash": h, "status": "pending"} for h in new[i:i + _QUERY_BATCH]])
+    JobQueue(db).enqueue_many("preview", [(f"preview:{h}", {"content_hash": h}) for h in new])
+    return len(new)
+
+
+def generate_preview(content_hash: str) -> Optional[str]:
+    """Job handler: render the preview of some content; returns its status"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        file = db.query(File).filter(File.content_hash == content_hash).first()
+        store = PreviewStore(db)
+        if file is None or not store.claim(content_hash):
+            return None
+        return store.generate(file).status
+    finally:
+        db.close()
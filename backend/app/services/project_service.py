@@ -0,0 +1,273 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+import uuid
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.models.project import Project, Branch, Commit, Contributor
+
+
+class ProjectService:
+    """Project queries backed by the rollup columns on Project/Branch.
+
+    Listing never touches the commits table: commit counts, last modified
+    times and contributors are read from rollups that ``record_commit``
+    keeps up to date as commits are written.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def list_projects(self) -> List[dict]:
+        """All projects with branch summaries, in a constant number of queries"""
+        projects = self.db.query(Project).order_by(Project.created_at).all()
+        project_ids = [project.id for project in projects]
+
+        branches = self._branches_by_project(project_ids)
+        contributors = self._contributors_by_project(project_ids)
+
+        return [
+            {
+                "id": project.id,
+                "name": project.name,
+                "description": project.description,
+                "lastModified": project.last_commit_at or project.created_at,
+                "branches": [self._branch_summary(b) for b in branches.get(project.id, [])],
+                "totalCommits": project.commit_count,
+                "contributors": contributors.get(project.id, []),
+            }
+            for project in projects
+        ]
+
+    def get_project(self, project_id: uuid.UUID) -> Optional[dict]:
+        """A single project with its branch summaries, or None if missing"""
+        project = self.db.query(Project).filter(Project.id == project_id).first()
+        if not project:
+            return None
+
+        branches = self._branches_by_project([project.id]).get(project.id, [])
+        return {
+            "id": project.id,
+            "name": project.name,
+            "description": project.description,
+            "branches": [self._branch_summary(b) for b in branches],
+            "created_at": project.created_at,
+        }
+
+    def record_commit(self, commit: Commit) -> None:
+        """Fold a newly added commit into the project, branch and contributor rollups.
+
+        Counters are bumped with UPDATE ... SET col = col + 1 so concurrent
+        writers don't lose increments. Call inside the transaction that adds
+        the commit.
+        """
+        self.db.flush()
+        committed_at = commit.created_at
+
+        contributor = self.db.query(Contributor).filter(
+            Contributor.project_id == commit.project_id,
+            Contributor.branch_name == commit.branch_name,
+            Contributor.author == commit.author
+        ).first()
+
+        new_to_branch = contributor is None
+        new_to_project = False
+        if new_to_branch:
+            new_to_project = not self.db.query(
+                self.db.query(Contributor).filter(
+                    Contributor.project_id == commit.project_id,
+                    Contributor.author == commit.author
+                ).exists()
+            ).scalar()
+            contributor = Contributor(
+                project_id=commit.project_id,
+                branch_name=commit.branch_name,
+                author=commit.author,
+                commit_count=0
+            )
+            self.db.add(contributor)
+            self.db.flush()
+
+        self.db.query(Contributor).filter(Contributor.id == contributor.id).update({
+            Contributor.commit_count: Contributor.commit_count + 1,
+            Contributor.last_commit_at: _latest(Contributor.last_commit_at, committed_at),
+        }, synchronize_session=False)
+
+        self.db.query(Branch).filter(
+            Branch.project_id == commit.project_id,
+            Branch.name == commit.branch_name
+        ).update({
+            Branch.commit_count: Branch.commit_count + 1,
+            Branch.contributor_count: Branch.contributor_count + int(new_to_branch),
+            Branch.last_commit_at: _latest(Branch.last_commit_at, committed_at),
+        }, synchronize_session=False)
+
+        self.db.query(Project).filter(Project.id == commit.project_id).update({
+            Project.commit_count: Project.commit_count + 1,
+            Project.contributor_count: Project.contributor_count + int(new_to_project),
+            Project.last_commit_at: _latest(Project.last_commit_at, committed_at),
+        }, synchronize_session=False)
+
+    def record_commits(self, project_id: uuid.UUID, commits: List[dict]) -> None:
+        """Fold a batch of added commits into the rollups, like ``record_commit``.
+
+        ``commits`` are rows with ``branch_name``, ``author`` and
+        ``created_at``. Counts are summed per branch and author first, so
+        bulk writers pay one update per contributor touched, not per commit.
+        """
+        if not commits:
+            return
+        self.db.flush()
+
+        groups: Dict[tuple, list] = defaultdict(lambda: [0, None])
+        for commit in commits:
+            group = groups[(commit["branch_name"], commit["author"])]
+            group[0] += 1
+            group[1] = _max_datetime(group[1], commit["created_at"])
+
+        authors = list({author for _, author in groups})
+        contributors = {
+            (branch_name, author): contributor_id
+            for contributor_id, branch_name, author in self.db.query(
+                Contributor.id, Contributor.branch_name, Contributor.author
+            ).filter(Contributor.project_id == project_id, Contributor.author.in_(authors))
+        }
+        known_authors = {author for _, author in contributors}
+
+        added = [
+            Contributor(project_id=project_id, branch_name=branch_name, author=author, commit_count=0)
+            for branch_name, author in groups if (branch_name, author) not in contributors
+        ]
+        self.db.add_all(added)
+        self.db.flush()
+
+        branch_totals = defaultdict(lambda: [0, 0, None])
+        for contributor in added:
+            contributors[(contributor.branch_name, contributor.author)] = contributor.id
+            branch_totals[contributor.branch_name][1] += 1
+        for (branch_name, author), (count, last_at) in groups.items():
+            self.db.query(Contributor).filter(Contributor.id == contributors[(branch_name, author)]).update({
+                Contributor.commit_count: Contributor.commit_count + count,
+                Contributor.last_commit_at: _latest(Contributor.last_commit_at, last_at),
+            }, synchronize_session=False)
+            totals = branch_totals[branch_name]
+            totals[0] += count
+            totals[2] = _max_datetime(totals[2], last_at)
+
+        for branch_name, (count, new_contributors, last_at) in branch_totals.items():
+            self.db.query(Branch).filter(
+                Branch.project_id == project_id,
+                Branch.name == branch_name
+            ).update({
+                Branch.commit_count: Branch.commit_count + count,
+                Branch.contributor_count: Branch.contributor_count + new_contributors,
+                Branch.last_commit_at: _latest(Branch.last_commit_at, last_at),
+            }, synchronize_session=False)
+
+        project_last = None
+        for _, last_at in groups.values():
+            project_last = _max_datetime(project_last, last_at)
+        self.db.query(Project).filter(Project.id == project_id).update({
+            Project.commit_count: Project.commit_count + len(commits),
+            Project.contributor_count: Project.contributor_count + len(set(authors) - known_authors),
+            Project.last_commit_at: _latest(Project.last_commit_at, project_last),
+        }, synchronize_session=False)
+
+    def rebuild_rollups(self, project_id: uuid.UUID) -> None:
+        """Recompute a project's rollups from its commits (backfill/repair)"""
+        self.db.query(Contributor).filter(Contributor.project_id == project_id).delete(
+            synchronize_session=False
+        )
+
+        per_author = self.db.query(
+            Commit.branch_name,
+            Commit.author,
+            func.count(Commit.id),
+            func.max(Commit.created_at)
+        ).filter(Commit.project_id == project_id).group_by(
+            Commit.branch_name, Commit.author
+        ).all()
+
+        branch_totals = defaultdict(lambda: [0, 0, None])
+        authors = set()
+        project_total, project_last = 0, None
+        for branch_name, author, count, last_at in per_author:
+            self.db.add(Contributor(
+                project_id=project_id,
+                branch_name=branch_name,
+                author=author,
+                commit_count=count,
+                last_commit_at=last_at
+            ))
+            totals = branch_totals[branch_name]
+            totals[0] += count
+            totals[1] += 1
+            totals[2] = _max_datetime(totals[2], last_at)
+            authors.add(author)
+            project_total += count
+            project_last = _max_datetime(project_last, last_at)
+
+        for branch in self.db.query(Branch).filter(Branch.project_id == project_id):
+            branch.commit_count, branch.contributor_count, branch.last_commit_at = \
+                branch_totals.get(branch.name, (0, 0, None))
+
+        self.db.query(Project).filter(Project.id == project_id).update({
+            Project.commit_count: project_total,
+            Project.contributor_count: len(authors),
+            Project.last_commit_at: project_last,
+        }, synchronize_session=False)
+
+    def _branches_by_project(self, project_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[Branch]]:
+        if not project_ids:
+            return {}
+        grouped = defaultdict(list)
+        branches = self.db.query(Branch).filter(
+            Branch.project_id.in_(project_ids)
+        ).order_by(Branch.project_id, Branch.created_at)
+        for branch in branches:
+            grouped[branch.project_id].append(branch)
+        return grouped
+
+    def _contributors_by_project(self, project_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[str]]:
+        if not project_ids:
+            return {}
+        grouped = defaultdict(list)
+        rows = self.db.query(Contributor.project_id, Contributor.author).filter(
+            Contributor.project_id.in_(project_ids)
+        ).group_by(Contributor.project_id, Contributor.author).order_by(
+            Contributor.project_id, Contributor.author
+        )
+        for project_id, author in rows:
+            grouped[project_id].append(author)
+        return grouped
+
+    @staticmethod
+    def _branch_summary(branch: Branch) -> dict:
+        return {
+            "id": branch.id,
+            "name": branch.name,
+            "commitCount": branch.commit_count,
+            "contributorCount": branch.contributor_count,
+            "lastModified": branch.last_commit_at,
+            "color": branch.color
+        }
+
+
+def _latest(column, value):
+    """SQL expression keeping the later of a nullable datetime column and value"""
+    if value is None:
+        return column
+    return case(
+        (column.is_(None), value),
+        (column < value, value),
+        else_=column
+    )
+
+
+def _max_datetime(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
@@ -0,0 +1,286 @@
+"""Reference index between assembly, drawing and part documents.
+
+SolidWorks documents store the file names of the documents they use, as
+ASCII or UTF-16 strings, alongside their geometry. ``ReferenceScanner``
+finds those names in a single streaming pass, so the upload pipeline can
+record them while chunking without a second read. The plugin can also
+send the names it gets from the SolidWorks API as ``references`` on a
+manifest entry; those take precedence over scanned ones.
+
+At commit time the names are resolved against the commit's paths into a
+ReferenceGraph of (source_path, target_path) edges. Graphs are keyed by
+the hash of their edges, so commits that only change geometry share the
+graph of their parent and write nothing. Where-used is a single indexed
+lookup on target_path; impact walks it one query per level.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import insert_ignore
+from app.models.project import Commit, File, FileReference, ReferenceEdge, ReferenceGraph
+from app.services.storage import iter_file_content
+from app.services.tree_store import TreeStore, normalize_path
+
+_QUERY_BATCH = 500
+_MAX_NAME = 255
+# Kept between blocks so a name split across two reads is still found
+_OVERLAP = 2 * (_MAX_NAME + 16)
+
+# Printable characters allowed in a Windows file name
+_NAME_CHAR = rb'[^\x00-\x1f\x7f-\xff\\/:*?"<>|]'
+
+
+def _patterns(extensions: Iterable[str]) -> Tuple["re.Pattern", "re.Pattern"]:
+    suffixes = sorted({ext.lower().lstrip(".") for ext in extensions}, key=len, reverse=True)
+    ascii_ext = b"|".join(re.escape(s.encode("ascii")) for s in suffixes)
+    wide_ext = b"|".join(b"".join(re.escape(bytes([c])) + b"\\x00" for c in s.encode("ascii")) for s in suffixes)
+    ascii_name = re.compile(
+        b"(" + _NAME_CHAR + b"{1,%d}\\.(?:" % _MAX_NAME + ascii_ext + b"))(?![A-Za-z0-9])", re.I
+    )
+    wide_name = re.compile(
+        b"((?:" + _NAME_CHAR + b"\\x00){1,%d}\\.\\x00(?:" % _MAX_NAME + wide_ext + b"))", re.I
+    )
+    return ascii_name, wide_name
+
+
+def is_scannable(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in {e.lower() for e in settings.allowed_extensions}
+
+
+def reference_name(name: str) -> str:
+    """Lowercased base name, the key references are matched on"""
+    return posixpath.basename(name.replace("\\", "/")).strip().lower()
+
+
+class ReferenceScanner:
+    """Collects referenced document names from content fed in blocks"""
+
+    def __init__(self, own_name: Optional[str] = None):
+        self.ascii_name, self.wide_name = _patterns(settings.allowed_extensions)
+        self.names: Set[str] = set()
+        self.own_name = reference_name(own_name) if own_name else None
+        self.tail = b""
+
+    def feed(self, data: bytes) -> None:
+        window = self.tail + bytes(data)
+        for match in self.ascii_name.finditer(window):
+            self._add(match.group(1).decode("latin-1"))
+        for match in self.wide_name.finditer(window):
+            self._add(match.group(1).decode("utf-16-le", errors="ignore"))
+        self.tail = window[-_OVERLAP:]
+
+    def _add(self, name: str) -> None:
+        name = reference_name(name)
+        if name and name != self.own_name and not name.startswith("."):
+            self.names.add(name)
+
+
+class ScanningReader:
+    """Wraps a binary stream, feeding everything read through a scanner"""
+
+    def __init__(self, stream: BinaryIO, scanner: ReferenceScanner):
+        self.stream = stream
+        self.scanner = scanner
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        if data:
+            self.scanner.feed(data)
+        return data
+
+
+def _suffix_match(name: str, by_name: Dict[str, List[str]]) -> List[str]:
+    # Scanning cannot tell where a name starts when it follows other
+    # printable bytes, so fall back to the longest known name it ends with
+    for i in range(1, len(name)):
+        targets = by_name.get(name[i:])
+        if targets:
+            return targets
+    return []
+
+
+class ReferenceIndex:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- File level ------------------------------------------------------
+
+    def record_file_references(self, file: File, names: Iterable[str]) -> None:
+        """Store the reference names of a File's content and mark it scanned"""
+        if file.references_scanned:
+            return
+        insert_ignore(self.db, FileReference, [
+            {"file_id": file.id, "ref_name": name}
+            for name in {reference_name(n) for n in names}
+            if name
+        ])
+        file.references_scanned = True
+
+    def scan_file(self, file: File) -> Set[str]:
+        """Read a stored file and record its references (for content stored before scanning)"""
+        scanner = ReferenceScanner(file.filename)
+        if is_scannable(file.filename):
+            for piece in iter_file_content(self.db, file):
+                scanner.feed(piece)
+        self.record_file_references(file, scanner.names)
+        return scanner.names
+
+    # -- Commit level ----------------------------------------------------
+
+    def write_graph(self, files: List[Tuple[str, File, Optional[List[str]]]]) -> str:
+        """Resolve references between ``(path, file, declared_references)`` entries.
+
+        ``declared_references`` comes from the manifest; when it is None the
+        scanned FileReference rows are used. Returns the graph hash.
+        """
+        by_name: Dict[str, List[str]] = defaultdict(list)
+        entries: Dict[str, Tuple[File, Optional[List[str]]]] = {}
+        for path, file, declared in files:
+            path = normalize_path(path)
+            if path not in entries:
+                by_name[reference_name(path)].append(path)
+            entries[path] = (file, declared)
+
+        scanned = self._file_references([
+            file.id for file, declared in entries.values() if declared is None
+        ])
+
+        edges: Set[Tuple[str, str]] = set()
+        for path, (file, declared) in entries.items():
+            if declared is not None:
+                self.record_file_references(file, declared)
+                names = {reference_name(n) for n in declared}
+            else:
+                names = scanned.get(file.id, ())
+            directory = posixpath.dirname(path)
+            for name in names:
+                targets = by_name.get(name) or ([] if declared is not None else _suffix_match(name, by_name))
+                # Several documents with the same name: prefer the one next to the source
+                nearby = [t for t in targets if posixpath.dirname(t) == directory]
+                for target in nearby or targets:
+                    if target != path:
+                        edges.add((path, target))
+
+        return self._store(sorted(edges))
+
+    def ensure_graph(self, commit: Commit) -> str:
+        """The commit's reference graph, built from its tree for older commits"""
+        if commit.reference_graph_hash is None:
+            tree_files = TreeStore(self.db).list_files(commit)
+            files = {
+                f.id: f for f in self._files([tf.file_id for tf in tree_files])
+            }
+            commit.reference_graph_hash = self.write_graph([
+                (tf.path, files[tf.file_id], None) for tf in tree_files if tf.file_id in files
+            ])
+        return commit.reference_graph_hash
+
+    def _store(self, edges: List[Tuple[str, str]]) -> str:
+        hasher = hashlib.sha256()
+        for source, target in edges:
+            hasher.update(f"{source}\0{target}\n".encode("utf-8"))
+        digest = hasher.hexdigest()
+
+        now = datetime.now(timezone.utc)
+        # Touched first so a concurrent garbage collection leaves it alone
+        touched = self.db.query(ReferenceGraph).filter(ReferenceGraph.hash == digest).update(
+            {ReferenceGraph.touched_at: now}, synchronize_session=False
+        )
+        if not touched:
+            insert_ignore(self.db, ReferenceGraph, [{"hash": digest, "edge_count": len(edges), "touched_at": now}])
+            insert_ignore(self.db, ReferenceEdge, [
+                {"graph_hash": digest, "source_path": source, "target_path": target}
+                for source, target in edges
+            ])
+        return digest
+
+    def _file_references(self, file_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Set[str]]:
+        refs: Dict[uuid.UUID, Set[str]] = defaultdict(set)
+        for i in range(0, len(file_ids), _QUERY_BATCH):
+            rows = self.db.query(FileReference.file_id, FileReference.ref_name).filter(
+                FileReference.file_id.in_(file_ids[i:i + _QUERY_BATCH])
+            )
+            for file_id, name in rows:
+                refs[file_id].add(name)
+        return refs
+
+    def _files(self, file_ids: List[uuid.UUID]) -> List[File]:
+        files = []
+        for i in range(0, len(file_ids), _QUERY_BATCH):
+            files.extend(self.db.query(File).filter(File.id.in_(file_ids[i:i + _QUERY_BATCH])))
+        return files
+
+    # -- Queries ---------------------------------------------------------
+
+    def uses(self, graph_hash: str, path: str) -> List[str]:
+        """Documents ``path`` references directly"""
+        return [target for (target,) in self.db.query(ReferenceEdge.target_path).filter(
+            ReferenceEdge.graph_hash == graph_hash,
+            ReferenceEdge.source_path == path
+        ).order_by(ReferenceEdge.target_path)]
+
+    def where_used(self, graph_hash: str, path: str) -> List[str]:
+        """Documents that reference ``path`` directly"""
+        return [source for (source,) in self.db.query(ReferenceEdge.source_path).filter(
+            ReferenceEdge.graph_hash == graph_hash,
+            ReferenceEdge.target_path == path
+        ).order_by(ReferenceEdge.source_path)]
+
+    def impact(self, graph_hash: str, path: str, max_depth: Optional[int] = None) -> Dict[str, int]:
+        """Every document affected by a change to ``path``, with its distance"""
+        depths: Dict[str, int] = {}
+        level = [path]
+        depth = 0
+        while level and (max_depth is None or depth < max_depth):
+            depth += 1
+            found = set()
+            for i in range(0, len(level), _QUERY_BATCH):
+                found.update(source for (source,) in self.db.query(ReferenceEdge.source_path).filter(
+                    ReferenceEdge.graph_hash == graph_hash,
+                    ReferenceEdge.target_path.in_(level[i:i + _QUERY_BATCH])
+                ))
+            level = sorted(p for p in found if p not in depths and p != path)
+            for p in level:
+                depths[p] = depth
+        return depths
+
+
+def scan_manifest_references(manifest: List[dict]) -> int:
+    """Scan stored files of a manifest whose references were never extracted.
+
+    Runs in a session of its own; async callers use the threadpool.
+    Returns how many files were scanned.
+    """
+    from app.database import SessionLocal
+
+    hashes = {
+        entry.get("content_hash") for entry in manifest
+        if entry.get("content_hash") and entry.get("references") is None
+    }
+    if not hashes:
+        return 0
+    db = SessionLocal()
+    try:
+        index = ReferenceIndex(db)
+        scanned = 0
+        hashes = list(hashes)
+        for i in range(0, len(hashes), _QUERY_BATCH):
+            for file in db.query(File).filter(
+                File.content_hash.in_(hashes[i:i + _QUERY_BATCH]),
+                File.references_scanned.is_(False)
+            ).all():
+                index.scan_file(file)
+                scanned += 1
+        db.commit()
+        return scanned
+    finally:
+        db.close()
@@ -0,0 +1,239 @@
+"""Full-text search over commit messages, authors and changed paths.
+
+Each commit gets one CommitSearch row, written by an ``index_commit``
+job shortly after the commit is recorded, holding its message, author
+and the paths it added, changed or deleted against its first parent
+(every path, for a root commit). The full-text index over
+those rows is maintained by the database itself: FTS5 on SQLite,
+a GIN-indexed tsvector on PostgreSQL (see ``CommitSearch``). A query is
+one index lookup ranked by BM25 or ``ts_rank_cd``; commits are loaded
+only for the page being returned.
+
+Queries are words, matched as prefixes and all required. A word may be
+limited to one field with ``message:``, ``author:`` or ``path:``.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import posixpath
+import re
+import uuid
+
+from sqlalchemy import Float, Text, bindparam, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import Commit, CommitSearch, File
+from app.services.tree_store import TreeStore
+
+FIELDS = ("message", "author", "path")
+
+# Letters and digits; underscores separate words, as in both tokenizers
+_TERM = re.compile(r"(?:([^\W_]+):)?([^\W_]+)")
+_WORD = re.compile(r"[^\W_]+")
+
+# FTS5 columns searched by each field, and the tsvector weight it was stored under
+_FTS_COLUMNS = {"message": "message", "author": "author", "path": "{paths filenames}"}
+_TS_WEIGHTS = {"message": "A", "author": "B", "path": "C"}
+# bm25 column weights, in CommitSearch column order: message, author, paths, filenames
+_BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+_QUERY_BATCH = 500
+
+
+class SearchHit(NamedTuple):
+    commit: Commit
+    rank: float  # Higher is better
+    matched_paths: List[str]
+
+
+def parse_query(query: str) -> List[Tuple[Optional[str], str]]:
+    """(field, word) pairs of a query; field is None for any field"""
+    terms = []
+    for field, word in _TERM.findall(query.lower()):
+        if field and field not in FIELDS:
+            # Not a field name, so the colon was just punctuation
+            terms.extend((None, w) for w in (field, word))
+        else:
+            terms.append((field or None, word))
+    return terms
+
+
+class SearchIndex:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- Indexing --------------------------------------------------------
+
+    def index_commit(self, commit: Commit) -> CommitSearch:
+        """Record a commit's searchable text; call once its tree is written"""
+        trees = TreeStore(self.db)
+        if commit.parent_commit_id:
+            parent = self.db.get(Commit, commit.parent_commit_id)
+            changes, _ = trees.diff(trees.ensure_tree(parent), trees.ensure_tree(commit))
+            touched = [(c.path, (c.new or c.old).file_id) for c in changes]
+        else:
+            touched = [(f.path, f.file_id) for f in trees.list_files(commit)]
+        # A root commit of a huge vault would otherwise make one enormous row
+        touched = touched[:settings.search_max_paths]
+
+        names = self._filenames({file_id for _, file_id in touched})
+        filenames = sorted({
+            names[file_id] for path, file_id in touched
+            if file_id in names and names[file_id] != posixpath.basename(path)
+        })
+        entry = CommitSearch(
+            commit_id=commit.id,
+            project_id=commit.project_id,
+            message=commit.message,
+            author=commit.author,
+            paths="\n".join(path for path, _ in touched),
+            filenames="\n".join(filenames),
+        )
+        self.db.add(entry)
+        return entry
+
+    def backfill(self, limit: Optional[int] = None) -> int:
+        """Index commits recorded before search existed; returns how many"""
+        indexed = 0
+        while limit is None or indexed < limit:
+            batch = self.db.query(Commit).outerjoin(
+                CommitSearch, CommitSearch.commit_id == Commit.id
+            ).filter(CommitSearch.id.is_(None)).limit(
+                min(_QUERY_BATCH, limit - indexed) if limit is not None else _QUERY_BATCH
+            ).all()
+            if not batch:
+                break
+            for commit in batch:
+                self.index_commit(commit)
+            self.db.commit()
+            indexed += len(batch)
+        return indexed
+
+    def _filenames(self, file_ids: set) -> Dict[uuid.UUID, str]:
+        file_ids = list(file_ids)
+        names = {}
+        for i in range(0, len(file_ids), _QUERY_BATCH):
+            names.update(self.db.query(File.id, File.filename).filter(File.id.in_(file_ids[i:i + _QUERY_BATCH])))
+        return names
+
+    # -- Queries ---------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        project_id: Optional[uuid.UUID] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[SearchHit]:
+        """Best matches first; fetch ``limit + 1`` to learn whether more follow"""
+        terms = parse_query(query)
+        if not terms:
+            return []
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            ranked = self._search_fts5(terms, project_id, limit, offset)
+        elif dialect == "postgresql":
+            ranked = self._search_tsvector(terms, project_id, limit, offset)
+        else:
+            raise NotImplementedError(f"Full-text search is not available on {dialect}")
+
+        ids = [commit_id for commit_id, _, _ in ranked]
+        commits = {c.id: c for c in self.db.query(Commit).filter(Commit.id.in_(ids))} if ids else {}
+        path_words = [word for field, word in terms if field in (None, "path")]
+        return [
+            SearchHit(commits[commit_id], rank, _matched_paths(paths, path_words))
+            for commit_id, rank, paths in ranked
+            if commit_id in commits
+        ]
+
+    def _search_fts5(self, terms, project_id, limit, offset) -> List[Tuple[uuid.UUID, float, str]]:
+        match = " AND ".join(
+            (f"{_FTS_COLUMNS[field]} : " if field else "") + f'"{word}"*'
+            for field, word in terms
+        )
+        weights = ", ".join(str(w) for w in _BM25_WEIGHTS)
+        sql = f"""
+            SELECT s.commit_id, bm25(commit_search_fts, {weights}) AS score, s.paths
+            FROM commit_search_fts
+            -- CROSS JOIN fixes the order: match first, never scan a project's rows
+            CROSS JOIN commit_search s ON s.id = commit_search_fts.rowid
+            WHERE commit_search_fts MATCH :match
+            {"AND s.project_id = :project_id" if project_id else ""}
+            ORDER BY score, s.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+        params = {"match": match, "limit": limit, "offset": offset}
+        if project_id:
+            params["project_id"] = project_id
+        # bm25 is lower for better matches; flip it so both dialects rank high first
+        return [
+            (commit_id, -score, paths)
+            for commit_id, score, paths in self.db.execute(_typed(sql, project_id), params)
+        ]
+
+    def _search_tsvector(self, terms, project_id, limit, offset) -> List[Tuple[uuid.UUID, float, str]]:
+        tsquery = " & ".join(
+            f"{word}:*{_TS_WEIGHTS[field] if field else ''}" for field, word in terms
+        )
+        sql = f"""
+            SELECT commit_id, ts_rank_cd(document, query) AS score, paths
+            FROM commit_search, to_tsquery('simple', :tsquery) AS query
+            WHERE document @@ query
+            {"AND project_id = :project_id" if project_id else ""}
+            ORDER BY score DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """
+        params = {"tsquery": tsquery, "limit": limit, "offset": offset}
+        if project_id:
+            params["project_id"] = project_id
+        return [
+            (commit_id, score, paths)
+            for commit_id, score, paths in self.db.execute(_typed(sql, project_id), params)
+        ]
+
+
+def _typed(sql: str, project_id: Optional[uuid.UUID]):
+    # Binds and reads UUIDs the way the column type stores them on each dialect
+    statement = text(sql)
+    if project_id:
+        statement = statement.bindparams(bindparam("project_id", type_=CommitSearch.project_id.type))
+    return statement.columns(commit_id=CommitSearch.commit_id.type, score=Float, paths=Text)
+
+
+def _matched_paths(paths: str, words: List[str], limit: int = 20) -> List[str]:
+    """Paths of a hit containing a word that starts with one of ``words``"""
+    if not words or not paths:
+        return []
+    matched = []
+    for path in paths.split("\n"):
+        parts = _WORD.findall(path.lower())
+        if any(part.startswith(word) for word in words for part in parts):
+            matched.append(path)
+            if len(matched) == limit:
+                break
+    return matched
+
+
+def index_commit(commit_id: str) -> None:
+    """Job handler: index one recorded commit in a session of its own"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        commit = db.get(Commit, uuid.UUID(commit_id))
+        # Backfill may have got there first
+        if commit is not None and db.query(CommitSearch.id).filter(CommitSearch.commit_id == commit.id).first() is None:
+            SearchIndex(db).index_commit(commit)
+            db.commit()
+    finally:
+        db.close()
+
+
+def backfill_search_index(limit: Optional[int] = None) -> int:
+    """Index unindexed commits in a session of its own (threadpool callers)"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return SearchIndex(db).backfill(limit)
+    finally:
+        db.close()
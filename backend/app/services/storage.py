@@ -0,0 +1,76 @@
+"""Read access to stored File content, whatever backend holds it"""
+from bisect import bisect_right
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import File
+from app.services.chunk_store import ChunkStore, CHUNKED_SCHEME
+from app.services.delta_store import DeltaStore, DELTA_SCHEME
+
+_SLICE_SIZE = 1024 * 1024
+
+
+class Segment(NamedTuple):
+    """``length`` bytes at ``offset`` of a file on disk (path) or of content in memory"""
+    source: Union[str, bytes]
+    offset: int
+    length: int
+
+
+def iter_file_content(db: Session, file: File) -> Iterator[bytes]:
+    """Yield a file's bytes in order, chunk by chunk where possible"""
+    if file.storage_path.startswith(DELTA_SCHEME) and _spills(file):
+        with open(DeltaStore(db).version_path(file), "rb") as f:
+            yield from iter(lambda: f.read(_SLICE_SIZE), b"")
+    elif file.storage_path.startswith(DELTA_SCHEME):
+        content = memoryview(DeltaStore(db).read_file(file))
+        for offset in range(0, len(content), _SLICE_SIZE):
+            yield content[offset:offset + _SLICE_SIZE]
+    else:
+        yield from ChunkStore().iter_file(db, file)
+
+
+def read_file_content(db: Session, file: File) -> bytes:
+    if file.storage_path.startswith(DELTA_SCHEME):
+        return DeltaStore(db).read_file(file)
+    return b"".join(ChunkStore().iter_file(db, file))
+
+
+def file_segments(db: Session, file: File, start: int = 0, end: Optional[int] = None) -> List[Segment]:
+    """Where bytes ``[start, end)`` of a file live, in order.
+
+    Chunked files resolve to slices of chunk files, which can be sent
+    straight from disk. Delta files are reconstructed once and cached by
+    DeltaStore: in memory, or for large versions in a file on disk, so a
+    client reading one in ranges does not rebuild it for every range.
+    """
+    size = file.file_size or 0
+    end = size if end is None else min(end, size)
+    if start >= end:
+        return []
+
+    if file.storage_path.startswith(DELTA_SCHEME) and _spills(file):
+        return [Segment(DeltaStore(db).version_path(file), start, end - start)]
+    if file.storage_path.startswith(DELTA_SCHEME):
+        return [Segment(DeltaStore(db).read_file(file), start, end - start)]
+    if not file.storage_path.startswith(CHUNKED_SCHEME):
+        return [Segment(file.storage_path, start, end - start)]
+
+    store = ChunkStore()
+    refs = store.file_chunks(db, file)
+    segments = []
+    index = max(bisect_right([ref.offset for ref in refs], start) - 1, 0)
+    for ref in refs[index:]:
+        if ref.offset >= end:
+            break
+        lo = max(start, ref.offset)
+        hi = min(end, ref.offset + ref.size)
+        segments.append(Segment(store.chunk_path(ref.hash), lo - ref.offset, hi - lo))
+    return segments
+
+
+def _spills(file: File) -> bool:
+    """Whether a delta file is too large for DeltaStore's memory cache"""
+    return (file.file_size or 0) > settings.delta_cache_entry_bytes
@@ -0,0 +1,108 @@
+"""Have/want negotiation for syncing a client's working folder.
+
+The client names the commit it wants and the commits whose files it
+already has on disk. Trees are content addressed, so what differs between
+a held commit and the wanted one falls out of ``TreeStore.diff``, which
+descends only into directories whose hashes differ: a routine sync costs
+queries in proportion to what changed, not to the size of the assembly
+or the length of the history in between.
+
+The nearest held commit becomes the base the changes are relative to,
+preferring ancestors of the wanted commit. A body is left out of the
+download list when any held commit has it at any path: a rename or move,
+a copy of a file the client already has, or a version another held
+commit carries.
+"""
+from typing import Dict, List, Optional
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import Commit, File
+from app.services.ancestry import AncestryIndex
+from app.services.tree_store import TreeChange, TreeStore
+
+_QUERY_BATCH = 500
+
+
+class SyncService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.trees = TreeStore(db)
+
+    def negotiate(self, want: Commit, have: List[uuid.UUID]) -> dict:
+        """SyncResponse fields for checking out ``want`` over the files of ``have``.
+
+        May build trees for commits from before trees existed; commit afterwards.
+        """
+        held_commits = self._held(want, have)
+        want_tree = self.trees.ensure_tree(want)
+
+        base: Optional[Commit] = None
+        held_trees: List[str] = []
+        if held_commits:
+            base = held_commits[0]
+            held_trees = [self.trees.ensure_tree(commit) for commit in held_commits]
+            changes, _ = self.trees.diff(held_trees[0], want_tree)
+        else:
+            # Nothing in common: a full checkout
+            changes = [TreeChange(f.path, "added", None, f) for f in self.trees.list_files(want)]
+        held = self.trees.contained(held_trees, (c.new.content_hash for c in changes if c.new))
+
+        wanted: Dict[str, uuid.UUID] = {}
+        for change in changes:
+            new = change.new
+            if new and new.content_hash not in held:
+                wanted.setdefault(new.content_hash, new.file_id)
+        files = self._files(wanted)
+
+        return {
+            "want": want.id,
+            "base": base.id if base else None,
+            "changes": [
+                {
+                    "path": change.path,
+                    "status": change.status,
+                    "file_id": change.new.file_id if change.new else None,
+                    "content_hash": change.new.content_hash if change.new else None,
+                    "is_main_assembly": change.new.is_main_assembly if change.new else False,
+                }
+                for change in changes
+            ],
+            "files": files,
+            "transfer_bytes": sum(f["file_size"] for f in files),
+        }
+
+    def _held(self, want: Commit, have: List[uuid.UUID]) -> List[Commit]:
+        """The client's commits in this project, nearest to ``want`` first"""
+        ids = list(dict.fromkeys(have))
+        commits: List[Commit] = []
+        for i in range(0, len(ids), _QUERY_BATCH):
+            commits.extend(self.db.query(Commit).filter(
+                Commit.project_id == want.project_id,
+                Commit.id.in_(ids[i:i + _QUERY_BATCH])
+            ))
+        if not commits:
+            return []
+
+        # Commits from before the ancestry index have no chain
+        reach = AncestryIndex(self.db).reach(want) if want.chain_id is not None else {}
+
+        def is_ancestor(commit: Commit) -> bool:
+            return commit.chain_id is not None and reach.get(commit.chain_id, -1) >= commit.chain_pos
+
+        commits.sort(key=lambda c: (not is_ancestor(c), -(c.generation or 0)))
+        return commits[:settings.sync_max_haves]
+
+    def _files(self, wanted: Dict[str, uuid.UUID]) -> List[dict]:
+        """Download entries for {content_hash: file_id}, in the order given"""
+        sizes: Dict[uuid.UUID, int] = {}
+        file_ids = list(wanted.values())
+        for i in range(0, len(file_ids), _QUERY_BATCH):
+            rows = self.db.query(File.id, File.file_size).filter(File.id.in_(file_ids[i:i + _QUERY_BATCH]))
+            sizes.update((file_id, size or 0) for file_id, size in rows)
+        return [
+            {"file_id": file_id, "content_hash": content_hash, "file_size": sizes.get(file_id, 0)}
+            for content_hash, file_id in wanted.items()
+        ]
@@ -0,0 +1,277 @@
+"""Content-addressed file trees for commits.
+
+A commit's files are stored as one Tree per directory of ``file_path``,
+keyed by the SHA256 of its sorted entries, the same scheme git uses. A
+subdirectory that did not change between two commits hashes the same and
+is stored once; the new commit only writes the trees along the paths that
+changed. Diffing two commits compares root hashes and descends only into
+subtrees whose hashes differ.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import hashlib
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database import insert_ignore
+from app.models.project import Commit, CommitFile, File, Tree, TreeEntry
+
+TREE = "tree"
+BLOB = "blob"
+
+_QUERY_BATCH = 500
+
+
+class TreeFile(NamedTuple):
+    path: str
+    file_id: uuid.UUID
+    content_hash: str
+    is_main_assembly: bool
+
+
+class TreeChange(NamedTuple):
+    path: str
+    status: str  # added, deleted, modified
+    old: Optional[TreeFile]
+    new: Optional[TreeFile]
+
+
+# (name, kind, object_hash, file_id, is_main_assembly)
+_Entry = Tuple[str, str, str, Optional[uuid.UUID], bool]
+
+
+def normalize_path(path: str) -> str:
+    """Forward-slash path without empty or ``.`` components"""
+    parts = [p for p in path.replace("\\", "/").split("/") if p and p != "."]
+    if not parts:
+        raise ValueError(f"Invalid file path '{path}'")
+    return "/".join(parts)
+
+
+def tree_hash(entries: List[_Entry]) -> str:
+    hasher = hashlib.sha256()
+    for name, kind, object_hash, _, is_main in sorted(entries):
+        hasher.update(f"{kind} {int(is_main)} {object_hash} {name}\0".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class TreeStore:
+    def __init__(self, db: Session):
+        self.db = db
+
+    # -- Write path ------------------------------------------------------
+
+    def write_files(self, files: Iterable[Tuple[str, File, bool]]) -> str:
+        """Store the tree for ``(path, file, is_main_assembly)`` entries.
+
+        Returns the root hash. A path given twice keeps its last entry.
+        """
+        root: dict = {}
+        for path, file, is_main in files:
+            parts = normalize_path(path).split("/")
+            node = root
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"'{path}' is inside a file, not a directory")
+            if isinstance(node.get(parts[-1]), dict):
+                raise ValueError(f"'{path}' is a directory")
+            node[parts[-1]] = (file, bool(is_main))
+
+        objects: Dict[str, List[_Entry]] = {}
+        root_hash = self._hash_node(root, objects)
+        self._store(root_hash, objects)
+        return root_hash
+
+    def ensure_tree(self, commit: Commit) -> str:
+        """The commit's root tree, building it from CommitFile rows for older commits"""
+        if commit.tree_hash is None:
+            rows = self.db.query(CommitFile.file_path, File, CommitFile.is_main_assembly).join(
+                File, File.id == CommitFile.file_id
+            ).filter(CommitFile.commit_id == commit.id)
+            commit.tree_hash = self.write_files(
+                (path or file.file_path, file, bool(is_main)) for path, file, is_main in rows
+            )
+        return commit.tree_hash
+
+    def _hash_node(self, node: dict, objects: Dict[str, List[_Entry]]) -> str:
+        entries: List[_Entry] = []
+        for name, value in node.items():
+            if isinstance(value, dict):
+                entries.append((name, TREE, self._hash_node(value, objects), None, False))
+            else:
+                file, is_main = value
+                entries.append((name, BLOB, file.content_hash, file.id, is_main))
+        digest = tree_hash(entries)
+        objects[digest] = entries
+        return digest
+
+    def _store(self, root_hash: str, objects: Dict[str, List[_Entry]]) -> None:
+        # Top down: a tree that already exists has all of its subtrees
+        # stored too, so only the changed paths are ever inserted
+        level = [root_hash]
+        while level:
+            # Touch before looking: a touched tree is safe from a concurrent
+            # garbage collection, and one it already removed is rewritten
+            self._touch(level)
+            existing = self._existing(level)
+            new = [h for h in dict.fromkeys(level) if h not in existing]
+            self._insert(new, objects)
+            level = [
+                object_hash
+                for h in new
+                for _, kind, object_hash, _, _ in objects[h]
+                if kind == TREE
+            ]
+
+    def store_objects(self, objects: Dict[str, List[_Entry]]) -> None:
+        """Store trees hashed by the caller, e.g. a bulk import, skipping those already present"""
+        hashes = list(objects)
+        self._touch(hashes)
+        existing = self._existing(hashes)
+        self._insert([h for h in hashes if h not in existing], objects)
+
+    def _insert(self, hashes: List[str], objects: Dict[str, List[_Entry]]) -> None:
+        insert_ignore(self.db, Tree, [
+            {"hash": h, "entry_count": len(objects[h]), "touched_at": datetime.now(timezone.utc)} for h in hashes
+        ])
+        insert_ignore(self.db, TreeEntry, [
+            {
+                "tree_hash": h,
+                "name": name,
+                "kind": kind,
+                "object_hash": object_hash,
+                "file_id": file_id,
+                "is_main_assembly": is_main,
+            }
+            for h in hashes
+            for name, kind, object_hash, file_id, is_main in objects[h]
+        ])
+
+    def _touch(self, hashes: List[str]) -> None:
+        now = datetime.now(timezone.utc)
+        for i in range(0, len(hashes), _QUERY_BATCH):
+            self.db.query(Tree).filter(Tree.hash.in_(hashes[i:i + _QUERY_BATCH])).update(
+                {Tree.touched_at: now}, synchronize_session=False
+            )
+
+    def _existing(self, hashes: List[str]) -> set:
+        found = set()
+        for i in range(0, len(hashes), _QUERY_BATCH):
+            found.update(h for (h,) in self.db.query(Tree.hash).filter(Tree.hash.in_(hashes[i:i + _QUERY_BATCH])))
+        return found
+
+    # -- Read path -------------------------------------------------------
+
+    def list_files(self, commit: Commit) -> List[TreeFile]:
+        """Every file of a commit in path order"""
+        if commit.tree_hash is None:
+            rows = self.db.query(
+                CommitFile.file_path, File.file_path, File.id, File.content_hash, CommitFile.is_main_assembly
+            ).join(File, File.id == CommitFile.file_id).filter(CommitFile.commit_id == commit.id)
+            files = {}
+            for path, original_path, file_id, content_hash, is_main in rows:
+                path = normalize_path(path or original_path)
+                files[path] = TreeFile(path, file_id, content_hash, bool(is_main))
+            return [files[path] for path in sorted(files)]
+        return sorted(self._expand({commit.tree_hash: ""}), key=lambda f: f.path)
+
+    def diff(self, old_hash: str, new_hash: str) -> Tuple[List[TreeChange], int]:
+        """Changed files between two root trees, and how many tree pairs were compared"""
+        changes: List[TreeChange] = []
+        # Whole subtrees that appeared or disappeared: tree hash -> path prefixes
+        removed_trees: Dict[str, List[str]] = {}
+        added_trees: Dict[str, List[str]] = {}
+        compared = 0
+
+        pairs = [("", old_hash, new_hash)] if old_hash != new_hash else []
+        while pairs:
+            compared += len(pairs)
+            entries = self._entries({h for _, old, new in pairs for h in (old, new)})
+            next_pairs = []
+            for prefix, old, new in pairs:
+                old_entries = {e[0]: e for e in entries.get(old, [])}
+                new_entries = {e[0]: e for e in entries.get(new, [])}
+                for name in old_entries.keys() | new_entries.keys():
+                    path = prefix + name
+                    a, b = old_entries.get(name), new_entries.get(name)
+                    if a and b and a[1:] == b[1:]:
+                        continue
+                    if a and b and a[1] == b[1] == TREE:
+                        next_pairs.append((path + "/", a[2], b[2]))
+                    elif a and b and a[1] == b[1] == BLOB:
+                        changes.append(TreeChange(path, "modified", _file(path, a), _file(path, b)))
+                    else:
+                        # Added, removed, or replaced by an entry of the other kind
+                        if a and a[1] == TREE:
+                            removed_trees.setdefault(a[2], []).append(path + "/")
+                        elif a:
+                            changes.append(TreeChange(path, "deleted", _file(path, a), None))
+                        if b and b[1] == TREE:
+                            added_trees.setdefault(b[2], []).append(path + "/")
+                        elif b:
+                            changes.append(TreeChange(path, "added", None, _file(path, b)))
+            pairs = next_pairs
+
+        changes.extend(TreeChange(f.path, "deleted", f, None) for f in self._expand_many(removed_trees))
+        changes.extend(TreeChange(f.path, "added", None, f) for f in self._expand_many(added_trees))
+        changes.sort(key=lambda c: c.path)
+        return changes, compared
+
+    def contained(self, roots: Iterable[str], content_hashes: Iterable[str]) -> set:
+        """Which of ``content_hashes`` are stored at any path below the trees ``roots``"""
+        roots, content_hashes = list(set(roots)), list(set(content_hashes))
+        if not roots or not content_hashes:
+            return set()
+        # Every tree below the roots, subtrees shared between them walked once
+        below = select(Tree.hash).where(Tree.hash.in_(roots)).cte("below", recursive=True)
+        below = below.union(
+            select(TreeEntry.object_hash).join(below, TreeEntry.tree_hash == below.c.hash).where(TreeEntry.kind == TREE)
+        )
+        found = set()
+        for i in range(0, len(content_hashes), _QUERY_BATCH):
+            found.update(h for (h,) in self.db.query(TreeEntry.object_hash).filter(
+                TreeEntry.tree_hash.in_(select(below.c.hash)),
+                TreeEntry.kind == BLOB,
+                TreeEntry.object_hash.in_(content_hashes[i:i + _QUERY_BATCH])
+            ).distinct())
+        return found
+
+    def _expand(self, roots: Dict[str, str]) -> List[TreeFile]:
+        return self._expand_many({h: [prefix] for h, prefix in roots.items()})
+
+    def _expand_many(self, roots: Dict[str, List[str]]) -> List[TreeFile]:
+        """All files below each tree, one query per directory level"""
+        files: List[TreeFile] = []
+        level = roots
+        while level:
+            entries = self._entries(set(level))
+            next_level: Dict[str, List[str]] = {}
+            for h, prefixes in level.items():
+                for entry in entries.get(h, []):
+                    for prefix in prefixes:
+                        path = prefix + entry[0]
+                        if entry[1] == TREE:
+                            next_level.setdefault(entry[2], []).append(path + "/")
+                        else:
+                            files.append(_file(path, entry))
+            level = next_level
+        return files
+
+    def _entries(self, hashes: set) -> Dict[str, List[_Entry]]:
+        hashes = list(hashes)
+        entries: Dict[str, List[_Entry]] = {}
+        for i in range(0, len(hashes), _QUERY_BATCH):
+            rows = self.db.query(
+                TreeEntry.tree_hash, TreeEntry.name, TreeEntry.kind, TreeEntry.object_hash,
+                TreeEntry.file_id, TreeEntry.is_main_assembly
+            ).filter(TreeEntry.tree_hash.in_(hashes[i:i + _QUERY_BATCH]))
+            for h, name, kind, object_hash, file_id, is_main in rows:
+                entries.setdefault(h, []).append((name, kind, object_hash, file_id, bool(is_main)))
+        return entries
+
+
+def _file(path: str, entry: _Entry) -> TreeFile:
+    return TreeFile(path, entry[3], entry[2], entry[4])
@@ -0,0 +1,372 @@
+"""Resumable, streaming uploads of file bodies.
+
+Bodies are appended straight to a part file under
+``<storage_path>/uploads`` while being hashed, so memory stays bounded by
+the size of one network read plus one chunk. The confirmed offset is
+persisted on the UploadSession, letting a client that lost its connection
+continue from ``received_bytes`` instead of starting over.
+
+Bodies are chunked into the chunk store as they arrive, so completing an
+upload in the process that received it only cuts the last chunk. A part
+received elsewhere (another process, or before a restart) is chunked from
+the part file when completed, either while the client waits or, once the
+part is durable on disk, by an ``ingest_upload`` job.
+"""
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import os
+import uuid
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import File, Job, UploadSession
+from app.services.chunk_store import ChunkStore, ChunkWriter, StoredBlob
+from app.services.jobs import JobQueue, PermanentJobError
+from app.services.references import ReferenceIndex, ReferenceScanner, ScanningReader, is_scannable
+
+_REHASH_BLOCK = 1024 * 1024
+
+
+class _Progress(NamedTuple):
+    """What a session's bytes have been fed into, up to ``offset``"""
+    offset: int
+    writer: ChunkWriter  # Hashes as well as chunks
+    scanner: Optional[ReferenceScanner]
+
+
+# Per session, so it can continue hashing and chunking across requests
+# without rereading the part file; after a restart the prefix is read
+# from disk once instead.
+_progress: Dict[uuid.UUID, _Progress] = {}
+
+# Sessions receiving a body in this process. A second body for the same
+# session is refused rather than interleaved with the first.
+_receiving: Set[uuid.UUID] = set()
+
+
+class UploadError(Exception):
+    """Base class for upload failures reported back to the client"""
+
+
+class UploadOffsetMismatch(UploadError):
+    def __init__(self, expected: int):
+        super().__init__(f"Upload must resume at offset {expected}")
+        self.expected = expected
+
+
+class UploadConflict(UploadError):
+    """Another request is writing the same upload"""
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class UploadHashMismatch(UploadError):
+    pass
+
+
+def part_path(session: UploadSession) -> str:
+    return os.path.join(settings.storage_path, "uploads", f"{session.id}.part")
+
+
+async def receive_body(
+    session: UploadSession,
+    offset: int,
+    body: AsyncIterator[bytes],
+    confirm: Callable[[int, int], Awaitable[bool]]
+) -> int:
+    """Append a request body at ``offset``, hashing and chunking it as it arrives.
+
+    ``confirm(expected, position)`` persists the resume offset if it is
+    still ``expected`` and returns whether it was; it is awaited every
+    ``upload_confirm_interval`` bytes and again when the body ends or the
+    client disconnects, after the bytes up to ``position`` are fsynced.
+    One body is received per session at a time: a concurrent request in
+    this process is refused up front, and one in another process is caught
+    by the offset having moved (both UploadConflict). Blocking disk work
+    runs in the threadpool so the event loop keeps serving other uploads.
+    Returns the new confirmed offset.
+    """
+    if session.status != "pending":
+        raise UploadError(f"Upload is {session.status}")
+    if session.id in _receiving:
+        raise UploadConflict("Upload is already receiving a body")
+    if offset != session.received_bytes:
+        raise UploadOffsetMismatch(session.received_bytes)
+
+    _receiving.add(session.id)
+    try:
+        return await _receive(session, offset, body, confirm)
+    finally:
+        _receiving.discard(session.id)
+
+
+async def _receive(
+    session: UploadSession,
+    offset: int,
+    body: AsyncIterator[bytes],
+    confirm: Callable[[int, int], Awaitable[bool]]
+) -> int:
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    progress = await run_in_threadpool(_resume, session, path)
+    if progress is None:
+        # Part file is shorter than the confirmed offset; restart it
+        await confirm(offset, 0)
+        raise UploadOffsetMismatch(0)
+
+    limit = session.expected_size
+    position = confirmed = offset
+    f = await run_in_threadpool(_open_part, path, offset)
+    try:
+        async for piece in body:
+            if not piece:
+                continue
+            if position + len(piece) > limit:
+                raise UploadTooLarge(f"Body exceeds announced size of {limit} bytes")
+            try:
+                await run_in_threadpool(_write_piece, f, progress, piece)
+            except BaseException:
+                # Part of the piece may have been fed; rebuild from the part file next time
+                progress = None
+                raise
+            position += len(piece)
+            if position - confirmed >= settings.upload_confirm_interval:
+                await run_in_threadpool(_sync_part, f)
+                if not await confirm(confirmed, position):
+                    progress = None
+                    raise UploadConflict("Upload was written by another request")
+                _progress[session.id] = progress._replace(offset=position)
+                confirmed = position
+    finally:
+        await run_in_threadpool(_sync_part, f)
+        f.close()
+        confirmed_now = await confirm(confirmed, position)
+        if progress is not None and confirmed_now:
+            _progress[session.id] = progress._replace(offset=position)
+        else:
+            forget_progress(session.id)
+        if not confirmed_now:
+            raise UploadConflict("Upload was written by another request")
+    return position
+
+
+def _open_part(path: str, offset: int):
+    f = open(path, "r+b" if os.path.exists(path) else "wb")
+    # Drop anything written past the last confirmed offset
+    f.seek(offset)
+    f.truncate()
+    return f
+
+
+def _write_piece(f, progress: _Progress, piece: bytes) -> None:
+    f.write(piece)
+    _feed(progress, piece)
+
+
+def _feed(progress: _Progress, piece: bytes) -> None:
+    progress.writer.update(piece)
+    if progress.scanner:
+        progress.scanner.feed(piece)
+
+
+def _sync_part(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _resume(session: UploadSession, path: str) -> Optional[_Progress]:
+    """Progress at the confirmed offset, or None if the part file is short"""
+    cached = _progress.get(session.id)
+    if cached and cached.offset == session.received_bytes:
+        return cached
+
+    scanner = ReferenceScanner(session.filename) if is_scannable(session.filename) else None
+    progress = _Progress(0, ChunkWriter(ChunkStore()), scanner)
+    remaining = session.received_bytes
+    if remaining and os.path.exists(path):
+        with open(path, "rb") as f:
+            while remaining:
+                block = f.read(min(_REHASH_BLOCK, remaining))
+                if not block:
+                    break
+                _feed(progress, block)
+                remaining -= len(block)
+    return None if remaining else progress._replace(offset=session.received_bytes)
+
+
+def forget_progress(upload_id: uuid.UUID) -> None:
+    """Drop a finished or abandoned session's in-memory progress"""
+    _progress.pop(upload_id, None)
+
+
+class UploadService:
+    def __init__(self, db: Session, store: Optional[ChunkStore] = None):
+        self.db = db
+        self.store = store or ChunkStore()
+
+    def existing_hashes(self, hashes: List[str]) -> set:
+        """The subset of ``hashes`` already stored as Files"""
+        if not hashes:
+            return set()
+        return {
+            h for (h,) in self.db.query(File.content_hash).filter(File.content_hash.in_(set(hashes)))
+        }
+
+    def negotiate(self, manifest: List[dict]) -> Tuple[List[dict], List[str]]:
+        """Split a manifest into entries that need uploading and hashes already stored"""
+        present = self.existing_hashes([e["content_hash"] for e in manifest if e.get("content_hash")])
+        missing = [e for e in manifest if e.get("content_hash") not in present]
+        return missing, sorted(present)
+
+    def start(
+        self,
+        project_id: Optional[uuid.UUID],
+        filename: str,
+        file_path: str,
+        file_size: int,
+        content_hash: Optional[str] = None,
+        file_type: Optional[str] = None,
+        client_id: Optional[str] = None
+    ) -> Tuple[Optional[UploadSession], Optional[File]]:
+        """Open an upload session, or return the stored File if the content exists.
+
+        A client that names itself with ``client_id`` gets back its own
+        unfinished session for the same content, to resume it; sessions are
+        never handed to another client.
+        """
+        if file_size > settings.max_file_size:
+            raise UploadTooLarge(f"File exceeds max size of {settings.max_file_size} bytes")
+
+        if content_hash:
+            existing = self.db.query(File).filter(File.content_hash == content_hash).first()
+            if existing:
+                return None, existing
+
+        if content_hash and client_id:
+            pending = self.db.query(UploadSession).filter(
+                UploadSession.expected_hash == content_hash,
+                UploadSession.client_id == client_id,
+                UploadSession.status.in_(("pending", "processing"))
+            ).first()
+            if pending:
+                return pending, None
+
+        session = UploadSession(
+            project_id=project_id,
+            filename=filename,
+            file_path=file_path,
+            file_type=file_type,
+            expected_size=file_size,
+            expected_hash=content_hash,
+            client_id=client_id,
+            received_bytes=0,
+            status="pending"
+        )
+        self.db.add(session)
+        self.db.commit()
+        return session, None
+
+    def get(self, upload_id: uuid.UUID) -> Optional[UploadSession]:
+        return self.db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+
+    def complete(self, session: UploadSession) -> File:
+        """Verify a fully received upload and move it into the chunk store"""
+        blob, references = self.ingest(session)
+        return self.record(session, blob, references)
+
+    def defer(self, session: UploadSession) -> Job:
+        """Leave a fully received upload to an ingest job instead of the request"""
+        if session.status not in ("pending", "processing"):
+            raise UploadError(f"Upload is {session.status}")
+        if session.received_bytes != session.expected_size:
+            raise UploadOffsetMismatch(session.received_bytes)
+        session.status = "processing"
+        job = JobQueue(self.db).enqueue(
+            "ingest_upload", {"upload_id": str(session.id)}, idempotency_key=ingest_job_key(session.id)
+        )
+        self.db.commit()
+        return job
+
+    def ingest(self, session: UploadSession) -> Tuple[StoredBlob, Optional[Set[str]]]:
+        """Finish chunking the received part into storage (disk only, safe to run off-thread).
+
+        Document references are extracted in the same pass; they are None
+        for file types that are not scanned.
+        """
+        if session.received_bytes != session.expected_size:
+            raise UploadOffsetMismatch(session.received_bytes)
+
+        path = part_path(session)
+        cached = _progress.get(session.id)
+        if cached and cached.offset == session.received_bytes:
+            if session.expected_hash and cached.writer.hexdigest() != session.expected_hash:
+                raise UploadHashMismatch("Received content does not match content_hash")
+            blob = cached.writer.finish()
+            # Chunks cut early in a long-paused upload may since have been
+            # collected as orphans; chunk the part file again if so
+            if all(os.path.exists(self.store.chunk_path(c.hash)) for c in blob.chunks):
+                return blob, cached.scanner.names if cached.scanner else None
+
+        scanner = ReferenceScanner(session.filename) if is_scannable(session.filename) else None
+        with open(path, "rb") as f:
+            blob = self.store.write_stream(ScanningReader(f, scanner) if scanner else f)
+        if session.expected_hash and blob.content_hash != session.expected_hash:
+            raise UploadHashMismatch("Received content does not match content_hash")
+        return blob, scanner.names if scanner else None
+
+    def record(self, session: UploadSession, blob: StoredBlob, references: Optional[Set[str]] = None) -> File:
+        """Create the File for an ingested upload and close the session"""
+        file = self.store.record_file(
+            self.db, blob, session.filename, session.file_path, session.file_type
+        )
+        if references is not None or not is_scannable(session.filename):
+            ReferenceIndex(self.db).record_file_references(file, references or ())
+        session.status = "complete"
+        session.file_id = file.id
+        self.db.commit()
+        self.db.refresh(file)
+
+        forget_progress(session.id)
+        path = part_path(session)
+        if os.path.exists(path):
+            os.unlink(path)
+        return file
+
+    def fail(self, session: UploadSession) -> None:
+        session.status = "failed"
+        self.db.commit()
+        forget_progress(session.id)
+        path = part_path(session)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def ingest_job_key(upload_id: uuid.UUID) -> str:
+    return f"ingest_upload:{upload_id}"
+
+
+def ingest_upload(upload_id: str) -> dict:
+    """Job handler: ingest a deferred upload in a session of its own"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        service = UploadService(db)
+        session = service.get(uuid.UUID(upload_id))
+        if session is None:
+            raise PermanentJobError("Upload not found")
+        if session.status != "complete":
+            if session.status != "processing":
+                raise PermanentJobError(f"Upload is {session.status}")
+            try:
+                service.complete(session)
+            except UploadError as e:
+                # The bytes themselves are wrong; another attempt would find the same
+                service.fail(session)
+                raise PermanentJobError(str(e))
+        return {"file_id": str(session.file_id)}
+    finally:
+        db.close()
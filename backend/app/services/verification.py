@@ -0,0 +1,213 @@
+"""Parallel verification of stored content against commit manifests.
+
+Before a commit is recorded (or, with ``verify_in_background``, in a
+``verify_commit`` job just after), every File its manifest references is
+checked: the announced size must match, and content not yet verified is
+rehashed from storage and compared with ``content_hash``. Hashing runs in
+a process pool so a commit of hundreds of parts uses every core rather
+than one. Files whose stored bytes no longer match their hash are flagged
+``is_corrupt`` so no later commit can reference them silently.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.project import Commit, File
+from app.services.storage import Segment, file_segments
+from app.services.tree_store import TreeStore
+
+_READ_SIZE = 1024 * 1024
+
+FAILED_STATUSES = {"hash_mismatch", "size_mismatch", "corrupt", "unreadable"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def hash_segments(segments: Sequence[Segment]) -> Tuple[str, int, float]:
+    """SHA256, size and elapsed seconds for the concatenated segments"""
+    started = time.perf_counter()
+    hasher = hashlib.sha256()
+    size = 0
+    for source, offset, length in segments:
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                f.seek(offset)
+                remaining = length
+                while remaining:
+                    block = f.read(min(_READ_SIZE, remaining))
+                    if not block:
+                        raise IOError(f"{source} is shorter than expected")
+                    hasher.update(block)
+                    remaining -= len(block)
+        else:
+            hasher.update(memoryview(source)[offset:offset + length])
+        size += length
+    return hasher.hexdigest(), size, time.perf_counter() - started
+
+
+def hash_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all verifications"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.hash_workers or os.cpu_count() or 1
+            # spawn: forking a process that runs an event loop and threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+            _pool = None
+
+
+def _submit(segments: Sequence[Segment]) -> Future:
+    """Hash in the pool; a pool whose worker died while idle is replaced once"""
+    try:
+        return hash_pool().submit(hash_segments, segments)
+    except BrokenProcessPool:
+        _reset_pool()
+    try:
+        return hash_pool().submit(hash_segments, segments)
+    except BrokenProcessPool:
+        # Still broken: hash here rather than fail the commit
+        _reset_pool()
+        future = Future()
+        try:
+            future.set_result(hash_segments(segments))
+        except OSError as e:
+            future.set_exception(e)
+        return future
+
+
+class VerificationService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def verify_manifest(self, manifest: List[dict], full: bool = False) -> dict:
+        """Check each manifest entry against its stored File.
+
+        Files verified before are trusted unless ``full`` is set. Entries
+        whose content is not stored at all are left to the commit, which
+        reports them as missing.
+        """
+        started = time.perf_counter()
+        hashes = {entry.get("content_hash") for entry in manifest if entry.get("content_hash")}
+        files_by_hash = {
+            f.content_hash: f
+            for f in self.db.query(File).filter(File.content_hash.in_(hashes))
+        } if hashes else {}
+
+        pending: Dict[str, Tuple[Future, List[Segment]]] = {}
+        for content_hash, file in files_by_hash.items():
+            if file.is_corrupt or (file.verified_at is not None and not full):
+                continue
+            segments = file_segments(self.db, file)
+            if any(not isinstance(s.source, str) for s in segments):
+                # Rebuilt delta content is already in memory; shipping it to
+                # another process would cost more than hashing it here
+                future = Future()
+                future.set_result(hash_segments(segments))
+            else:
+                future = _submit(segments)
+            pending[content_hash] = (future, segments)
+
+        results: Dict[str, Tuple[str, float]] = {}
+        hashed_bytes = 0
+        now = datetime.now(timezone.utc)
+        for content_hash, (future, segments) in pending.items():
+            file = files_by_hash[content_hash]
+            try:
+                try:
+                    digest, size, seconds = future.result()
+                except BrokenProcessPool:
+                    # A worker died; finish here and start a fresh pool next time
+                    _reset_pool()
+                    digest, size, seconds = hash_segments(segments)
+            except OSError:
+                file.is_corrupt = True
+                results[content_hash] = ("unreadable", 0.0)
+                continue
+            hashed_bytes += size
+            if digest != content_hash or size != (file.file_size or 0):
+                file.is_corrupt = True
+                results[content_hash] = ("hash_mismatch", seconds)
+            else:
+                file.verified_at = now
+                results[content_hash] = ("verified", seconds)
+
+        report = []
+        for entry in manifest:
+            content_hash = entry.get("content_hash")
+            file = files_by_hash.get(content_hash)
+            if file is None:
+                continue
+            status, seconds = results.get(content_hash, ("corrupt" if file.is_corrupt else "cached", 0.0))
+            declared = entry.get("file_size")
+            if status in ("verified", "cached") and declared is not None and declared != file.file_size:
+                status = "size_mismatch"
+            report.append({
+                "file_path": entry.get("file_path"),
+                "content_hash": content_hash,
+                "status": status,
+                "seconds": round(seconds, 6),
+            })
+
+        return {
+            "files": report,
+            "failed": sum(1 for r in report if r["status"] in FAILED_STATUSES),
+            "hashed_bytes": hashed_bytes,
+            "seconds": round(time.perf_counter() - started, 6),
+        }
+
+
+def verify_manifest(manifest: List[dict], full: bool = False) -> dict:
+    """Verify a manifest in a session of its own and persist the outcome.
+
+    Blocks while the pool hashes, so async callers run it in the threadpool.
+    """
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        report = VerificationService(db).verify_manifest(manifest, full)
+        db.commit()
+        return report
+    finally:
+        db.close()
+
+
+def verify_commit(commit_id: str, full: bool = False) -> Optional[dict]:
+    """Job handler: verify the files of a recorded commit and persist the outcome"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        commit = db.get(Commit, uuid.UUID(commit_id))
+        if commit is None:
+            return None
+        manifest = [
+            {"file_path": f.path, "content_hash": f.content_hash}
+            for f in TreeStore(db).list_files(commit)
+        ]
+        report = VerificationService(db).verify_manifest(manifest, full)
+        db.commit()
+        # Only what went wrong; the full report of a large commit is mostly "cached"
+        report["files"] = [r for r in report["files"] if r["status"] in FAILED_STATUSES]
+        return report
+    finally:
+        db.close()
@@ -0,0 +1,11 @@
+"""Performance benchmarks against synthetic PDM vaults.
+
+Run from ``backend/``::
+
+    python -m benchmarks --projects 2 --commits 40 --files 200 --output results.json
+    python -m benchmarks --compare results.json
+
+A fresh database and storage directory are created for every run, filled
+through the API with deterministic content for the given seed, and the
+API is then driven in-process. See ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,301 @@
+"""Build a synthetic vault and benchmark the API against it.
+
+Settings are read from the environment when ``app`` is first imported, so
+the database and storage locations are set before any ``app`` import.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.vault import VaultBuilder, VaultProject, VaultSpec
+
+PREFIX = "/api/v1"
+# A scenario regressed when its p50 or p99 grew by more than this fraction
+DEFAULT_THRESHOLD = 0.2
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    # Nearest rank, so p99 of a short sample is an observed latency
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """Latencies, bytes and peak traced memory per scenario"""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.samples: Dict[str, List[float]] = {}
+        self.bytes: Dict[str, int] = {}
+        self.wall: Dict[str, float] = {}
+        self.peak_memory: Dict[str, int] = {}
+
+    def record(self, scenario: str, seconds: float, size: int = 0) -> None:
+        self.samples.setdefault(scenario, []).append(seconds)
+        self.bytes[scenario] = self.bytes.get(scenario, 0) + size
+
+    def measure(self, scenario: str, operation: Callable[[], int], iterations: int) -> None:
+        """Run ``operation`` (returning bytes transferred) ``iterations`` times"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        for _ in range(iterations):
+            op_started = time.perf_counter()
+            size = operation()
+            self.record(scenario, time.perf_counter() - op_started, size)
+        self.wall[scenario] = self.wall.get(scenario, 0.0) + time.perf_counter() - started
+        if self.trace_memory:
+            self.peak_memory[scenario] = max(
+                self.peak_memory.get(scenario, 0), tracemalloc.get_traced_memory()[1] - baseline
+            )
+
+    def summary(self) -> Dict[str, dict]:
+        results = {}
+        for scenario, samples in self.samples.items():
+            ordered = sorted(samples)
+            total = self.wall.get(scenario, sum(samples))
+            results[scenario] = {
+                "count": len(samples),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+                "p90_ms": round(_percentile(ordered, 0.90) * 1000, 3),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "ops_per_second": round(len(samples) / total, 3) if total else None,
+                "bytes": self.bytes.get(scenario, 0),
+                "bytes_per_second": round(self.bytes.get(scenario, 0) / total, 1) if total else None,
+                "peak_memory_bytes": self.peak_memory.get(scenario),
+            }
+        return results
+
+
+def _check(response, expected: int = 200):
+    if response.status_code != expected:
+        raise RuntimeError(f"{response.request.method} {response.request.url} returned {response.status_code}: {response.text}")
+    return response
+
+
+def run_scenarios(client, vault: List[VaultProject], recorder: Recorder, iterations: int, seed: int) -> None:
+    rng = random.Random(seed)
+    projects = [p.id for p in vault]
+    hashes = [h for p in vault for h in p.content_hashes]
+
+    def list_projects():
+        return len(_check(client.get(f"{PREFIX}/projects")).content)
+
+    def get_project():
+        return len(_check(client.get(f"{PREFIX}/projects/{rng.choice(projects)}")).content)
+
+    def history_page():
+        project = rng.choice(vault)
+        return len(_check(client.get(f"{PREFIX}/projects/{project.id}/commits?limit=50")).content)
+
+    def history_walk():
+        # Every page of a project's history, following the cursors
+        project = rng.choice(vault)
+        size, cursor = 0, None
+        while True:
+            url = f"{PREFIX}/projects/{project.id}/commits?limit=20" + (f"&cursor={cursor}" if cursor else "")
+            response = _check(client.get(url))
+            size += len(response.content)
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                return size
+
+    def history_not_modified():
+        project = rng.choice(vault)
+        url = f"{PREFIX}/projects/{project.id}/commits?limit=50"
+        etag = _check(client.get(url)).headers["etag"]
+        return len(_check(client.get(url, headers={"If-None-Match": etag}), 304).content)
+
+    def commit_graph():
+        return len(_check(client.get(f"{PREFIX}/projects/{rng.choice(projects)}/graph")).content)
+
+    def diff():
+        project = rng.choice(vault)
+        base, head = project.commit_ids[0], project.commit_ids[-1]
+        return len(_check(client.get(f"{PREFIX}/projects/{project.id}/diff?base={base}&head={head}")).content)
+
+    def download():
+        return len(_check(client.get(f"{PREFIX}/files/by-hash/{rng.choice(hashes)}/content")).content)
+
+    def download_range():
+        response = _check(client.get(
+            f"{PREFIX}/files/by-hash/{rng.choice(hashes)}/content", headers={"Range": "bytes=0-4095"}
+        ), 206)
+        return len(response.content)
+
+    def archive():
+        project = rng.choice(vault)
+        return len(_check(client.get(f"{PREFIX}/projects/{project.id}/commits/main/archive?format=zip&level=1")).content)
+
+    scenarios = [
+        ("list_projects", list_projects, iterations),
+        ("get_project", get_project, iterations),
+        ("history_page", history_page, iterations),
+        ("history_walk", history_walk, max(1, iterations // 5)),
+        ("history_not_modified", history_not_modified, iterations),
+        ("commit_graph", commit_graph, iterations),
+        ("diff", diff, iterations),
+        ("download", download, iterations),
+        ("download_range", download_range, iterations),
+        ("archive", archive, max(1, iterations // 10)),
+    ]
+    for name, operation, count in scenarios:
+        operation()  # Warm caches and connections outside the measurement
+        recorder.measure(name, operation, count)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Scenarios whose p50 or p99 grew by more than ``threshold`` over the baseline"""
+    regressions = []
+    for scenario, result in current["results"].items():
+        before = baseline.get("results", {}).get(scenario)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if before[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions.append(
+                    f"{scenario} {metric}: {before[metric]:.3f} -> {result[metric]:.3f} "
+                    f"(+{(result[metric] / before[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def _print_table(results: Dict[str, dict]) -> None:
+    print(f"{'scenario':<22}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'MB/s':>9}{'peak MB':>9}")
+    for scenario, r in results.items():
+        mb_per_second = (r["bytes_per_second"] or 0) / 1e6
+        peak = (r["peak_memory_bytes"] or 0) / 1e6
+        print(
+            f"{scenario:<22}{r['count']:>7}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['ops_per_second'] or 0:>10.1f}{mb_per_second:>9.2f}{peak:>9.2f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = VaultSpec()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--projects", type=int, default=defaults.projects)
+    parser.add_argument("--branches", type=int, default=defaults.branches)
+    parser.add_argument("--commits", type=int, default=defaults.commits, help="Commits per project")
+    parser.add_argument("--files", type=int, default=defaults.files, help="Files per commit")
+    parser.add_argument("--file-size", type=int, default=defaults.file_size, help="Mean file size in bytes")
+    parser.add_argument("--change-rate", type=float, default=defaults.change_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--database-url", help="Defaults to a SQLite file in the work directory")
+    parser.add_argument("--workdir", help="Kept after the run; a temporary directory by default")
+    parser.add_argument("--no-trace-memory", action="store_true", help="Skip tracemalloc, which slows Python code")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    spec = VaultSpec(
+        projects=args.projects,
+        branches=args.branches,
+        commits=args.commits,
+        files=args.files,
+        file_size=args.file_size,
+        change_rate=args.change_rate,
+        seed=args.seed,
+    )
+
+    workdir_context = tempfile.TemporaryDirectory(prefix="pdm-bench-") if not args.workdir else None
+    workdir = args.workdir or workdir_context.name
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["STORAGE_PATH"] = os.path.join(workdir, "storage")
+
+    from fastapi.testclient import TestClient
+
+    from app.application import create_app
+    from app.config import settings
+    from app.database import engine
+
+    app = create_app()
+
+    recorder = Recorder(trace_memory=not args.no_trace_memory)
+    if recorder.trace_memory:
+        tracemalloc.start()
+
+    try:
+        with TestClient(app) as client:
+            build_started = time.perf_counter()
+            if recorder.trace_memory:
+                tracemalloc.reset_peak()
+            vault = VaultBuilder(client, spec, recorder.record, PREFIX).build()
+            build_seconds = time.perf_counter() - build_started
+            if recorder.trace_memory:
+                build_peak = tracemalloc.get_traced_memory()[1]
+                for scenario in ("create_project", "upload", "upload_deduplicated", "commit"):
+                    if scenario in recorder.samples:
+                        recorder.peak_memory[scenario] = build_peak
+
+            run_scenarios(client, vault, recorder, args.iterations, args.seed)
+            stats = _check(client.get(f"{PREFIX}/storage/stats")).json()
+    finally:
+        if recorder.trace_memory:
+            tracemalloc.stop()
+        engine.dispose()
+        if workdir_context is not None:
+            workdir_context.cleanup()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "verify_commits": settings.verify_commits,
+            "delta_storage_enabled": settings.delta_storage_enabled,
+            "job_workers": settings.job_workers,
+            "trace_memory": recorder.trace_memory,
+            "spec": spec._asdict(),
+            "iterations": args.iterations,
+            "build_seconds": round(build_seconds, 3),
+        },
+        "storage": stats,
+        "results": recorder.summary(),
+    }
+
+    _print_table(report["results"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("spec") != report["meta"]["spec"]:
+            print("warning: baseline was run with a different vault spec", file=sys.stderr)
+        regressions = compare(baseline, report, args.threshold)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
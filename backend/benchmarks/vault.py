@@ -0,0 +1,153 @@
+"""Deterministic synthetic vaults built through the public API.
+
+Each project starts with a main assembly, subassemblies and parts spread
+over directories the way a real vault is laid out. Every later commit
+edits a fraction of the files in place, so chunk deduplication, delta
+storage and tree sharing see the same kind of history they would in use.
+Content depends only on the seed, so two runs store identical bytes.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+import random
+import time
+
+
+class VaultSpec(NamedTuple):
+    projects: int = 2
+    branches: int = 3  # Including main
+    commits: int = 20  # Per project, spread over the branches
+    files: int = 50  # Files in each commit
+    file_size: int = 64 * 1024  # Mean size; actual sizes vary by +-50%
+    change_rate: float = 0.1  # Fraction of files edited by each commit
+    files_per_directory: int = 20
+    seed: int = 1
+
+
+class VaultProject(NamedTuple):
+    id: str
+    branches: List[str]
+    commit_ids: List[str]
+    content_hashes: List[str]  # Everything uploaded, in upload order
+
+
+# Called with (operation, seconds, bytes) for every API call made while building
+Timer = Callable[[str, float, int], None]
+
+
+def _path(index: int, spec: VaultSpec) -> str:
+    directory = f"assemblies/sub-{index // spec.files_per_directory:03d}"
+    if index % spec.files_per_directory == 0:
+        return f"{directory}/sub-{index // spec.files_per_directory:03d}.sldasm"
+    return f"{directory}/part-{index:05d}.sldprt"
+
+
+def _content(rng: random.Random, spec: VaultSpec) -> bytes:
+    size = max(1, int(spec.file_size * rng.uniform(0.5, 1.5)))
+    return rng.randbytes(size)
+
+
+def _edit(rng: random.Random, content: bytes) -> bytes:
+    # Rewrite a region in place, as saving a changed feature does
+    length = max(1, len(content) // 20)
+    start = rng.randrange(0, max(1, len(content) - length))
+    return content[:start] + rng.randbytes(length) + content[start + length:]
+
+
+class VaultBuilder:
+    def __init__(self, client, spec: VaultSpec, timer: Optional[Timer] = None, prefix: str = "/api/v1"):
+        self.client = client
+        self.spec = spec
+        self.timer = timer or (lambda operation, seconds, size: None)
+        self.prefix = prefix
+        self.rng = random.Random(spec.seed)
+
+    def build(self) -> List[VaultProject]:
+        return [self._project(i) for i in range(self.spec.projects)]
+
+    def _call(self, operation: str, method: str, url: str, size: int = 0, **kwargs):
+        started = time.perf_counter()
+        response = self.client.request(method, self.prefix + url, **kwargs)
+        self.timer(operation, time.perf_counter() - started, size)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} failed with {response.status_code}: {response.text}")
+        return response.json()
+
+    def _project(self, number: int) -> VaultProject:
+        spec = self.spec
+        project_id = self._call("create_project", "POST", "/projects", json={
+            "name": f"Synthetic vault {number}",
+            "description": f"seed={spec.seed}"
+        })["id"]
+
+        top = "top.sldasm"
+        contents: Dict[str, bytes] = {top: _content(self.rng, spec)}
+        for i in range(spec.files - 1):
+            contents[_path(i, spec)] = _content(self.rng, spec)
+
+        branches = ["main"] + [f"feature-{b}" for b in range(1, spec.branches)]
+        heads: Dict[str, str] = {}
+        # Per branch: path -> (content, content_hash)
+        trees: Dict[str, Dict[str, Tuple[bytes, str]]] = {}
+        commit_ids: List[str] = []
+        hashes: List[str] = []
+
+        for c in range(spec.commits):
+            # main gets the first commit; after that the branches take turns
+            branch = branches[c % len(branches)] if c else "main"
+            if c == 0:
+                trees["main"] = {}
+                edited = sorted(contents)
+            else:
+                trees.setdefault(branch, dict(trees["main"]))
+                edited = self.rng.sample(sorted(trees[branch]), max(1, int(spec.files * spec.change_rate)))
+            files = trees[branch]
+            for path in edited:
+                body = contents[path] if c == 0 else _edit(self.rng, files[path][0])
+                content_hash = self._upload(project_id, path, body)
+                files[path] = (body, content_hash)
+                hashes.append(content_hash)
+
+            payload = {
+                "commit_message": f"Commit {c} on {branch}",
+                "author": f"engineer-{c % 4}",
+                "branch_name": branch,
+                "files": [
+                    {
+                        "file_path": path,
+                        "content_hash": content_hash,
+                        "file_size": len(body),
+                        "is_main_assembly": path == top,
+                    }
+                    for path, (body, content_hash) in sorted(files.items())
+                ],
+            }
+            if branch not in heads:
+                # A new branch forks from the current head of main
+                payload["parent_commit_id"] = heads.get("main")
+            commit_id = self._call(
+                "commit", "POST", f"/projects/{project_id}/commits", json=payload
+            )["commit_id"]
+            heads[branch] = commit_id
+            commit_ids.append(commit_id)
+
+        return VaultProject(project_id, branches, commit_ids, list(dict.fromkeys(hashes)))
+
+    def _upload(self, project_id: str, path: str, body: bytes) -> str:
+        """Upload one file body through a resumable session; returns its hash"""
+        content_hash = hashlib.sha256(body).hexdigest()
+        started = time.perf_counter()
+        session = self.client.post(f"{self.prefix}/projects/{project_id}/uploads", json={
+            "filename": path.rsplit("/", 1)[-1],
+            "file_path": path,
+            "file_size": len(body),
+            "content_hash": content_hash,
+        }).json()
+        if session["status"] != "complete":
+            self.client.put(f"{self.prefix}/uploads/{session['id']}?offset=0", content=body)
+            response = self.client.post(f"{self.prefix}/uploads/{session['id']}/complete")
+            if response.status_code >= 400:
+                raise RuntimeError(f"Upload of {path} failed with {response.status_code}: {response.text}")
+            self.timer("upload", time.perf_counter() - started, len(body))
+        else:
+            self.timer("upload_deduplicated", time.perf_counter() - started, 0)
+        return content_hash
@@ -0,0 +1,85 @@
+"""Fixtures for the behavior tests.
+
+The settings are read when ``app.config`` is first imported, so the
+database and storage are pointed at a scratch directory before anything
+from the application is. Each test gets empty tables; content-addressed
+blobs on disk are shared between tests.
+"""
+import os
+import tempfile
+import uuid
+from typing import Dict, List, Optional
+
+_WORKDIR = tempfile.mkdtemp(prefix="pdm-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_WORKDIR}/test.db"
+os.environ["STORAGE_PATH"] = os.path.join(_WORKDIR, "storage")
+os.environ["JOB_WORKERS"] = "0"  # Jobs stay queued; tests run what they need directly
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.application import API_PREFIX, create_app
+from app.database import Base, SessionLocal, engine
+import app.models.project  # noqa: F401  (registers the tables)
+from app.services.chunk_store import ChunkStore
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(create_app()) as client:
+        yield client
+
+
+@pytest.fixture
+def store_file(db):
+    """Chunk bytes into the store and record their File; returns the content hash"""
+    chunk_store = ChunkStore()
+
+    def store(data: bytes, path: str = "part.sldprt") -> str:
+        file = chunk_store.record_file(db, chunk_store.write_bytes(data), os.path.basename(path), path)
+        db.commit()
+        return file.content_hash
+
+    return store
+
+
+@pytest.fixture
+def project(client) -> uuid.UUID:
+    response = client.post(f"{API_PREFIX}/projects", json={"name": "Gearbox"})
+    assert response.status_code == 200, response.text
+    return uuid.UUID(response.json()["id"])
+
+
+@pytest.fixture
+def make_commit(client, project, store_file):
+    """Commit {path: bytes} to a branch of ``project``; returns the commit id"""
+    def commit(
+        files: Dict[str, bytes],
+        branch: str = "main",
+        parent: Optional[uuid.UUID] = None,
+        merge: List[uuid.UUID] = ()
+    ) -> uuid.UUID:
+        manifest = [{"file_path": path, "content_hash": store_file(data, path)} for path, data in files.items()]
+        response = client.post(f"{API_PREFIX}/projects/{project}/commits", json={
+            "commit_message": f"Update {branch}",
+            "author": "tester",
+            "branch_name": branch,
+            "parent_commit_id": str(parent) if parent else None,
+            "merge_parent_ids": [str(p) for p in merge],
+            "files": manifest,
+        })
+        assert response.status_code == 200, response.text
+        return uuid.UUID(response.json()["commit_id"])
+
+    return commit
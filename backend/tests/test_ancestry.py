@@ -0,0 +1,51 @@
+import pytest
+
+from app.models.project import Commit
+from app.services.ancestry import AncestryIndex
+
+
+@pytest.fixture(params=["indexed", "unindexed"])
+def history(request, db, make_commit):
+    """a - b - c - m on main, with dev (d - e) branching at a and merged into m"""
+    a = make_commit({"top.sldasm": b"v1"})
+    b = make_commit({"top.sldasm": b"v2"})
+    c = make_commit({"top.sldasm": b"v3"})
+    d = make_commit({"top.sldasm": b"dev 1"}, branch="dev", parent=a)
+    e = make_commit({"top.sldasm": b"dev 2"}, branch="dev")
+    m = make_commit({"top.sldasm": b"merged"}, parent=c, merge=[e])
+    if request.param == "unindexed":
+        # As left by commits recorded before the ancestry index existed
+        db.query(Commit).filter(Commit.id == d).update({Commit.chain_id: None, Commit.chain_pos: None})
+        db.commit()
+    commits = {commit.id: commit for commit in db.query(Commit)}
+    return {name: commits[commit_id] for name, commit_id in zip("abcdem", (a, b, c, d, e, m))}
+
+
+def test_is_ancestor(db, history):
+    index = AncestryIndex(db)
+    assert index.is_ancestor(history["a"], history["m"])
+    assert index.is_ancestor(history["e"], history["m"])
+    assert index.is_ancestor(history["c"], history["c"])
+    assert not index.is_ancestor(history["m"], history["c"])
+    assert not index.is_ancestor(history["d"], history["c"])
+    assert not index.is_ancestor(history["b"], history["e"])
+
+
+def test_merge_bases(db, history):
+    index = AncestryIndex(db)
+    assert index.merge_bases(history["c"], history["e"]) == [history["a"]]
+    assert index.merge_bases(history["m"], history["e"]) == [history["e"]]
+    assert index.merge_bases(history["b"], history["d"]) == [history["a"]]
+
+
+def test_range_query(db, history):
+    index = AncestryIndex(db)
+    names = {commit.id: name for name, commit in history.items()}
+
+    def range_names(base, head):
+        return [names[commit.id] for commit in index.range_query(base, head)]
+
+    assert range_names(history["c"], history["m"]) == ["m", "e", "d"]
+    assert range_names(history["e"], history["m"]) == ["m", "c", "b"]
+    assert range_names(None, history["b"]) == ["b", "a"]
+    assert range_names(history["m"], history["c"]) == []
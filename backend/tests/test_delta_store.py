@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from app.models.project import File, FileDelta
+from app.services import delta_store
+from app.services.delta_store import DeltaStore, apply_delta, encode_delta
+from app.services.storage import file_segments
+
+
+def _document(seed: int, size: int) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def _edited(data: bytes, seed: int) -> bytes:
+    """A few insertions, deletions and overwrites, as a saved part would have"""
+    rng = random.Random(seed)
+    out = bytearray(data)
+    for _ in range(8):
+        at = rng.randrange(len(out))
+        edit = rng.choice(("insert", "delete", "overwrite"))
+        if edit == "insert":
+            out[at:at] = rng.randbytes(rng.randrange(1, 200))
+        elif edit == "delete":
+            del out[at:at + rng.randrange(1, 200)]
+        else:
+            out[at:at + 50] = rng.randbytes(50)
+    return bytes(out)
+
+
+@pytest.mark.parametrize("base, target", [
+    (_document(1, 64 * 1024), _edited(_document(1, 64 * 1024), 2)),
+    (_document(3, 10_000), _document(3, 10_000)),
+    (_document(4, 10_000), b""),
+    (b"", _document(5, 1000)),
+    (b"short", b"shorter"),
+])
+def test_round_trip(base, target):
+    assert apply_delta(base, encode_delta(base, target)) == target
+
+
+def test_sampled_index_round_trip():
+    base = _document(6, 256 * 1024)
+    target = _edited(base, 7)
+    # Only every 16th block is indexed, so matches are found from fewer anchors
+    delta = encode_delta(base, target, block_size=32, max_blocks=len(base) // (32 * 16))
+    assert apply_delta(base, delta) == target
+    assert len(delta) < len(target) // 4
+
+
+def test_vectorized_search_finds_the_same_matches(monkeypatch):
+    base = _document(15, 512 * 1024)
+    target = _edited(base, 16)
+    vectorized = encode_delta(base, target, max_blocks=4096)
+    monkeypatch.setattr(delta_store, "numpy", None)
+    assert encode_delta(base, target, max_blocks=4096) == vectorized
+    # Block sizes the vectorized hashes do not cover use the loop as well
+    assert apply_delta(base, encode_delta(base, target, block_size=24)) == target
+
+
+def test_gives_up_past_max_literal():
+    assert encode_delta(_document(8, 10_000), _document(9, 10_000), max_literal=1000) is None
+
+
+def test_store_rebuilds_delta_chains(db, store_file, monkeypatch):
+    # Nothing cached, so every read replays the chain from the keyframe
+    monkeypatch.setattr(delta_store, "_cache", delta_store._VersionCache(0, 0))
+    versions = [_document(10, 128 * 1024)]
+    for seed in range(11, 14):
+        versions.append(_edited(versions[-1], seed))
+    files = [db.query(File).filter(File.content_hash == store_file(v, "gear.sldprt")).one() for v in versions]
+
+    store = DeltaStore(db)
+    for base, file in zip(files, files[1:]):
+        # One commit's deltas per job, each against a version encoded before
+        assert store.encode_file(file.id, base.id) is not None
+        db.commit()
+
+    assert [d.depth for d in db.query(FileDelta).order_by(FileDelta.depth)] == [1, 2, 3]
+    for file, content in zip(files, versions):
+        db.refresh(file)
+        assert store.read_file(file) == content
+
+
+def test_large_versions_are_rebuilt_once_to_disk(db, store_file, monkeypatch):
+    monkeypatch.setattr(delta_store, "_cache", delta_store._VersionCache(0, 0))
+    monkeypatch.setattr(delta_store.settings, "delta_cache_entry_bytes", 64 * 1024)
+    base = _document(20, 128 * 1024)
+    target = _edited(base, 21)
+    base_file, file = [db.query(File).filter(File.content_hash == store_file(v)).one() for v in (base, target)]
+    assert DeltaStore(db).encode_file(file.id, base_file.id) is not None
+    db.commit()
+
+    replays = []
+    monkeypatch.setattr(delta_store, "apply_delta", lambda *args: replays.append(1) or apply_delta(*args))
+    ranges = [(0, 1000), (50_000, 90_000), (len(target) - 10, len(target))]
+    for start, end in ranges:
+        (segment,) = file_segments(db, file, start, end)
+        assert isinstance(segment.source, str)
+        with open(segment.source, "rb") as f:
+            f.seek(segment.offset)
+            assert f.read(segment.length) == target[start:end]
+    assert len(replays) == 1
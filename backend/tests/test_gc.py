@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+import os
+
+import pytest
+
+from app.application import API_PREFIX
+from app.models.project import Chunk, File, FileChunk, ReferenceGraph, Tree
+from app.services.chunk_store import ChunkStore
+from app.services.delta_store import DeltaStore
+from app.services.gc import GarbageCollector
+from app.services.storage import read_file_content
+
+GRACE_SECONDS = 60 * 60
+
+
+@pytest.fixture
+def age(db):
+    """Backdate every row and chunk blob past the grace period"""
+    def backdate() -> None:
+        then = datetime.now(timezone.utc) - timedelta(days=3)
+        db.query(File).update({File.created_at: then})
+        db.query(Chunk).update({Chunk.created_at: then})
+        db.query(Tree).update({Tree.touched_at: then})
+        db.query(ReferenceGraph).update({ReferenceGraph.touched_at: then})
+        db.commit()
+        store = ChunkStore()
+        for (chunk_hash,) in db.query(Chunk.hash):
+            os.utime(store.chunk_path(chunk_hash), (then.timestamp(), then.timestamp()))
+
+    return backdate
+
+
+def _collect(db, **kwargs) -> dict:
+    return GarbageCollector(db, grace_seconds=GRACE_SECONDS, **kwargs).collect()
+
+
+def _content(db, content_hash: str) -> bytes:
+    file = db.query(File).filter(File.content_hash == content_hash).one()
+    return b"".join(ChunkStore().iter_file(db, file))
+
+
+def _chunks_on_disk(db, content_hash: str):
+    store = ChunkStore()
+    file = db.query(File).filter(File.content_hash == content_hash).one()
+    hashes = [h for (h,) in db.query(FileChunk.chunk_hash).filter(FileChunk.file_id == file.id)]
+    return [store.chunk_path(h) for h in hashes]
+
+
+def test_keeps_what_commits_reach(db, make_commit, store_file, age):
+    files = {
+        "assemblies/gearbox.sldasm": b"gearbox" * 5000,
+        "assemblies/shafts/input.sldprt": b"input shaft" * 5000,
+        "drawings/gearbox.slddrw": b"drawing" * 5000,
+    }
+    make_commit(files)
+    make_commit({**files, "drawings/gearbox.slddrw": b"drawing rev B" * 5000})
+    orphan = store_file(os.urandom(200 * 1024), "scrap.sldprt")
+    orphan_chunks = _chunks_on_disk(db, orphan)
+    trees = db.query(Tree).count()
+    age()
+
+    report = _collect(db)
+
+    assert report["files"] == 1
+    assert report["trees"] == 0
+    assert db.query(Tree).count() == trees
+    assert db.query(File).filter(File.content_hash == orphan).count() == 0
+    assert not any(os.path.exists(path) for path in orphan_chunks)
+    for path, data in files.items():
+        assert _content(db, store_file(data, path)) == data
+
+
+def test_deleted_project_frees_only_unshared_content(db, client, project, make_commit, store_file, age):
+    shared, unique = b"standard bolt" * 4000, b"custom bracket" * 4000
+    make_commit({"hardware/bolt.sldprt": shared, "bracket.sldprt": unique})
+    shared_hash, unique_hash = store_file(shared), store_file(unique)
+
+    other = client.post(f"{API_PREFIX}/projects", json={"name": "Conveyor"}).json()["id"]
+    response = client.post(f"{API_PREFIX}/projects/{other}/commits", json={
+        "commit_message": "Add bolt",
+        "author": "tester",
+        "files": [{"file_path": "bolt.sldprt", "content_hash": shared_hash}],
+    })
+    assert response.status_code == 200, response.text
+    assert client.delete(f"{API_PREFIX}/projects/{project}").status_code == 200
+    age()
+
+    report = _collect(db)
+
+    assert report["files"] == 1
+    assert report["trees"] > 0
+    assert _content(db, shared_hash) == shared
+    assert db.query(File).filter(File.content_hash == unique_hash).count() == 0
+    # The surviving project's tree and its entries are intact
+    changes = client.post(f"{API_PREFIX}/projects/{other}/sync", json={"want": "main"}).json()["changes"]
+    assert [(c["path"], c["content_hash"]) for c in changes] == [("bolt.sldprt", shared_hash)]
+
+
+def test_delta_chains_outlive_the_project_that_encoded_them(db, client, project, make_commit, store_file, age):
+    v1, v2 = b"gear housing " * 4000, b"gear housing " * 3000 + b"with ribs " * 1000
+    make_commit({"housing.sldprt": v1})
+    make_commit({"housing.sldprt": v2})
+    base, version = [db.query(File).filter(File.content_hash == store_file(v)).one() for v in (v1, v2)]
+    assert DeltaStore(db).encode_file(version.id, base.id) is not None
+    db.commit()
+
+    other = client.post(f"{API_PREFIX}/projects", json={"name": "Conveyor"}).json()["id"]
+    response = client.post(f"{API_PREFIX}/projects/{other}/commits", json={
+        "commit_message": "Reuse housing",
+        "author": "tester",
+        "files": [{"file_path": "housing.sldprt", "content_hash": version.content_hash}],
+    })
+    assert response.status_code == 200, response.text
+    assert client.delete(f"{API_PREFIX}/projects/{project}").status_code == 200
+    age()
+
+    assert _collect(db)["files"] == 0
+    db.expire_all()
+    assert read_file_content(db, db.get(File, version.id)) == v2
+
+    assert client.delete(f"{API_PREFIX}/projects/{other}").status_code == 200
+    assert _collect(db)["files"] == 2
+
+
+def test_grace_period_protects_new_content(db, make_commit, store_file):
+    make_commit({"part.sldprt": b"committed"})
+    orphan = store_file(b"uploaded for a commit still to come")
+
+    report = _collect(db)
+
+    assert report["files"] == report["chunks"] == report["trees"] == 0
+    assert _content(db, orphan) == b"uploaded for a commit still to come"
+
+
+def test_dry_run_reports_without_deleting(db, store_file, age):
+    orphan = store_file(os.urandom(100 * 1024))
+    age()
+
+    chunks = _chunks_on_disk(db, orphan)
+
+    assert _collect(db, dry_run=True)["files"] == 1
+    assert db.query(File).filter(File.content_hash == orphan).count() == 1
+    assert all(os.path.exists(path) for path in chunks)
+
+    assert _collect(db)["files"] == 1
+    assert not any(os.path.exists(path) for path in chunks)
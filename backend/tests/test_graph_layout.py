@@ -0,0 +1,32 @@
+from app.services import graph_layout
+from app.services.graph_layout import GraphLayout
+
+
+def test_new_commits_extend_the_cached_layout_in_place(db, project, make_commit):
+    first = make_commit({"top.sldasm": b"v1"})
+    make_commit({"top.sldasm": b"v2"})
+    before = GraphLayout(db).project_graph(project)
+    cached = graph_layout._cache[project]
+    nodes = cached.nodes
+
+    make_commit({"top.sldasm": b"dev"}, branch="dev", parent=first)
+    make_commit({"top.sldasm": b"v3"})
+    db.expire_all()
+    after = GraphLayout(db).project_graph(project)
+
+    assert graph_layout._cache[project] is cached and cached.nodes is nodes
+    assert after["nodes"][:1] == before["nodes"][:1]
+    assert after["total"] == 4
+    # Same as laying the project out from scratch
+    graph_layout._cache.clear()
+    assert GraphLayout(db).project_graph(project) == after
+
+
+def test_generation_window(db, project, make_commit):
+    for i in range(5):
+        make_commit({"top.sldasm": b"v%d" % i})
+
+    graph = GraphLayout(db).project_graph(project, from_generation=1, to_generation=3)
+
+    assert [node["generation"] for node in graph["nodes"]] == [1, 2, 3]
+    assert graph["total"] == 5 and graph["max_generation"] == 4
@@ -0,0 +1,113 @@
+import uuid
+
+import pytest
+
+from app.application import API_PREFIX
+
+
+@pytest.fixture
+def sync(client, project):
+    def negotiate(want, have=()) -> dict:
+        response = client.post(f"{API_PREFIX}/projects/{project}/sync", json={
+            "want": str(want),
+            "have": [str(commit_id) for commit_id in have],
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return negotiate
+
+
+def _changes(manifest: dict):
+    return sorted((change["path"], change["status"]) for change in manifest["changes"])
+
+
+VERSION_1 = {
+    "gearbox.sldasm": b"assembly v1",
+    "parts/housing.sldprt": b"housing" * 1000,
+    "parts/shaft.sldprt": b"shaft" * 1000,
+    "drawings/gearbox.slddrw": b"drawing v1",
+}
+
+
+def test_full_checkout_without_haves(make_commit, sync):
+    head = make_commit(VERSION_1)
+
+    manifest = sync("main")
+
+    assert manifest["want"] == str(head)
+    assert manifest["base"] is None
+    assert _changes(manifest) == sorted((path, "added") for path in VERSION_1)
+    assert len(manifest["files"]) == len(VERSION_1)
+    assert manifest["transfer_bytes"] == sum(len(data) for data in VERSION_1.values())
+
+
+def test_only_changed_bodies_since_held_commit(make_commit, sync):
+    first = make_commit(VERSION_1)
+    make_commit({**VERSION_1, "gearbox.sldasm": b"assembly v2"})
+    head = make_commit({**VERSION_1, "gearbox.sldasm": b"assembly v2", "parts/gear.sldprt": b"gear"})
+
+    manifest = sync(head, [first])
+
+    assert manifest["base"] == str(first)
+    assert _changes(manifest) == [("gearbox.sldasm", "modified"), ("parts/gear.sldprt", "added")]
+    assert manifest["transfer_bytes"] == len(b"assembly v2") + len(b"gear")
+    assert sync(head, [head])["changes"] == []
+
+
+def test_prefers_ancestor_and_reuses_moved_bodies(make_commit, sync):
+    first = make_commit(VERSION_1)
+    moved = dict(VERSION_1)
+    moved["parts/input_shaft.sldprt"] = moved.pop("parts/shaft.sldprt")
+    head = make_commit(moved)
+    side = make_commit({"gearbox.sldasm": b"experiment"}, branch="experiment", parent=first)
+
+    manifest = sync(head, [side, first])
+
+    assert manifest["base"] == str(first)
+    assert _changes(manifest) == [("parts/input_shaft.sldprt", "added"), ("parts/shaft.sldprt", "deleted")]
+    assert manifest["files"] == []  # The body is already on disk at its old path
+
+
+def test_copies_of_held_bodies_at_new_paths(make_commit, sync):
+    first = make_commit(VERSION_1)
+    head = make_commit({**VERSION_1, "parts/spare_shaft.sldprt": VERSION_1["parts/shaft.sldprt"]})
+
+    manifest = sync(head, [first])
+
+    assert _changes(manifest) == [("parts/spare_shaft.sldprt", "added")]
+    assert manifest["files"] == []
+    assert manifest["transfer_bytes"] == 0
+
+
+def test_bodies_held_by_other_commits_at_same_path(make_commit, sync):
+    first = make_commit(VERSION_1)
+    main = make_commit({**VERSION_1, "gearbox.sldasm": b"assembly v2"})
+    side = make_commit({**VERSION_1, "drawings/gearbox.slddrw": b"drawing v2"}, branch="drawings", parent=first)
+
+    # Whichever is the base, the other holds the wanted body at the changed path
+    manifest = sync(first, [main, side])
+
+    assert manifest["base"] in (str(main), str(side))
+    assert len(manifest["changes"]) == 1
+    assert manifest["files"] == []
+
+
+def test_ignores_haves_from_other_projects(client, make_commit, sync, store_file):
+    head = make_commit(VERSION_1)
+    other = client.post(f"{API_PREFIX}/projects", json={"name": "Conveyor"}).json()["id"]
+    foreign = client.post(f"{API_PREFIX}/projects/{other}/commits", json={
+        "commit_message": "Import",
+        "author": "tester",
+        "files": [{"file_path": path, "content_hash": store_file(data)} for path, data in VERSION_1.items()],
+    }).json()["commit_id"]
+
+    manifest = sync(head, [foreign, uuid.uuid4()])
+
+    assert manifest["base"] is None
+    assert len(manifest["files"]) == len(VERSION_1)
+
+
+def test_unknown_want(client, project):
+    response = client.post(f"{API_PREFIX}/projects/{project}/sync", json={"want": "no-such-branch"})
+    assert response.status_code == 404
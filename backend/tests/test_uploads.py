@@ -0,0 +1,66 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.models.project import UploadSession
+from app.services import upload_service
+from app.services.upload_service import UploadConflict, receive_body
+
+
+def _session(size: int = 100) -> UploadSession:
+    return UploadSession(
+        id=uuid.uuid4(), filename="bracket.sldprt", file_path="bracket.sldprt",
+        expected_size=size, received_bytes=0, status="pending"
+    )
+
+
+def _confirmer(session: UploadSession, moved_elsewhere: bool = False):
+    """confirm() over an in-memory offset, optionally moved by another process"""
+    async def confirm(expected: int, position: int) -> bool:
+        if moved_elsewhere or session.received_bytes != expected:
+            return False
+        session.received_bytes = position
+        return True
+
+    return confirm
+
+
+def test_second_body_for_a_receiving_session_is_refused():
+    session = _session()
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_body():
+            yield b"a" * 10
+            started.set()
+            await release.wait()
+            yield b"b" * 10
+
+        async def other_body():
+            yield b"c" * 10
+
+        first = asyncio.create_task(receive_body(session, 0, slow_body(), _confirmer(session)))
+        await started.wait()
+        with pytest.raises(UploadConflict):
+            await receive_body(session, 0, other_body(), _confirmer(session))
+        release.set()
+        return await first
+
+    assert asyncio.run(scenario()) == 20
+    assert session.received_bytes == 20
+    with open(upload_service.part_path(session), "rb") as f:
+        assert f.read() == b"a" * 10 + b"b" * 10
+
+
+def test_offset_moved_by_another_process_is_a_conflict():
+    session = _session()
+
+    async def body():
+        yield b"a" * 10
+
+    with pytest.raises(UploadConflict):
+        asyncio.run(receive_body(session, 0, body(), _confirmer(session, moved_elsewhere=True)))
+    assert session.id not in upload_service._progress
+    assert session.id not in upload_service._receiving